@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# Completion backend of the shell completion scripts. It only imports modules of the standard library so
+# that it can be run with python3 -S, which starts faster, and imports the slower ones such as re only
+# when they are needed
+import marshal
+import mmap
+import os
+import sys
+
+from alias_registry import CONFIG_ENVIRONMENT, DEFAULT_CONFIG_FILE, AliasRegistry, ConfigError
+
+
+class AliasCompletion:
+    """
+    Completes aliases with an index persisted next to the config file (config.yaml.complete).
+
+    The index is the sorted list of the lower case aliases and servers, one "key<TAB>alias" line each,
+    which is read with mmap. The lines starting with a prefix are next to each other, like the leaves
+    under a node of a prefix trie, and are found with a binary search without loading the file. Servers
+    complete to their first alias.
+
+    After the lines the file has the fuzzy index: the set of characters used by every block of lines.
+    Fuzzy searches only scan the blocks that have all the characters of the word.
+
+    The index is rebuilt when the config file changes. The lines that did not change are kept and merged
+    with the new ones instead of sorting everything again.
+    """
+    INDEX_SUFFIX = '.complete'
+    INDEX_VERSION = 1
+    HEADER = b'server-automation-complete'
+
+    # Lines per block of the fuzzy index
+    BLOCK_LINES = 64
+
+    LIMIT = 100
+
+    def __init__(self, config_file):
+        self.config_file = config_file
+        self.index_file = config_file + self.INDEX_SUFFIX
+        self.index = None
+        self.start = 0
+        self.end = 0
+        self.blocks = None
+
+    def open(self):
+        """
+        Map the index file, rebuilding it first if the config file changed
+        :return: the completion
+        """
+        signature = AliasRegistry(self.config_file).config_signature()
+
+        if not self.open_index(signature):
+            self.build(signature)
+
+            if not self.open_index(signature):
+                raise ConfigError('The completion index {} could not be written'.format(self.index_file))
+
+        return self
+
+    def open_index(self, signature):
+        try:
+            with open(self.index_file, 'rb') as file:
+                index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+
+        header = index[:index.find(b'\n') + 1].split()
+
+        if header[:4] != [self.HEADER, str(self.INDEX_VERSION).encode(), str(signature[0]).encode(),
+                          str(signature[1]).encode()]:
+            index.close()
+            return False
+
+        self.index = index
+        self.start = index.find(b'\n') + 1
+        self.end = int(header[4])
+
+        return True
+
+    def lines(self):
+        """Get the lines of the current index file"""
+        try:
+            with open(self.index_file, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return []
+
+        header = data[:data.find(b'\n') + 1]
+
+        try:
+            end = int(header.split()[4])
+        except (IndexError, ValueError):
+            return []
+
+        return data[len(header):end].decode('utf-8', 'replace').splitlines()
+
+    @staticmethod
+    def candidates(servers):
+        """
+        Get the index lines of the servers
+        :return: set of key<TAB>alias lines
+        """
+        lines = set()
+
+        for server_item in servers:
+            aliases = [''.join(str(alias).split()) for alias in server_item['aliases']]
+
+            for alias in aliases:
+                lines.add('%s\t%s' % (alias.lower(), alias))
+
+            server = ''.join(str(server_item.get('server', '')).split())
+
+            if server and server not in aliases:
+                lines.add('%s\t%s' % (server.lower(), aliases[0]))
+
+        return lines
+
+    def build(self, signature):
+        """Write the index of the current config file, reusing the lines of the previous index"""
+        if sys.flags.no_site:
+            # Parsing the config needs the yaml module from the site packages
+            import site
+
+            site.main()
+
+        import heapq
+
+        new_lines = self.candidates(AliasRegistry(self.config_file).load().servers)
+        old_lines = self.lines()
+        kept = set(old_lines) & new_lines
+
+        lines = [(line + '\n').encode()
+                 for line in heapq.merge([line for line in old_lines if line in kept], sorted(new_lines - kept))]
+
+        header = ('%s %d %d %d %012d\n' % (self.HEADER.decode(), self.INDEX_VERSION, signature[0], signature[1], 0))
+        offset = len(header)
+        blocks = []
+
+        for number in range(0, len(lines), self.BLOCK_LINES):
+            block = lines[number:number + self.BLOCK_LINES]
+            size = sum(map(len, block))
+            blocks.append((offset, offset + size, self.character_mask(b''.join(line.split(b'\t', 1)[0]
+                                                                                for line in block))))
+            offset += size
+
+        header = header[:-13] + '%012d\n' % offset
+        temp_file = '%s.%d.tmp' % (self.index_file, os.getpid())
+
+        try:
+            with open(temp_file, 'wb') as file:
+                file.write(header.encode())
+                file.writelines(lines)
+                file.write(marshal.dumps(blocks))
+
+            os.replace(temp_file, self.index_file)
+        except OSError:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+
+    @staticmethod
+    def character_mask(data):
+        """Get an integer with a bit set for every byte value in data"""
+        mask = 0
+
+        for value in set(data):
+            mask |= 1 << value
+
+        return mask
+
+    def line_start(self, offset):
+        """Get the offset of the line containing an offset"""
+        return self.index.rfind(b'\n', self.start - 1, offset) + 1
+
+    def prefix_start(self, prefix):
+        """
+        Binary search the first line whose key is not before the prefix
+        :return: the offset of the line
+        """
+        index = self.index
+        low, high = self.start, self.end
+
+        while low < high:
+            middle = (low + high) // 2
+            line_start = self.line_start(middle)
+            line_end = index.find(b'\n', middle)
+
+            if index[line_start:index.find(b'\t', line_start, line_end)] < prefix:
+                low = line_end + 1
+            else:
+                high = line_start
+
+        return low
+
+    def prefix_matches(self, prefix, limit):
+        """
+        Get the lines whose key starts with the prefix
+        :return: list of line offsets
+        """
+        matches = []
+        offset = self.prefix_start(prefix)
+
+        while offset < self.end and len(matches) < limit and self.index[offset:offset + len(prefix)] == prefix:
+            matches.append(offset)
+            offset = self.index.find(b'\n', offset) + 1
+
+        return matches
+
+    def block_ranges(self, word):
+        """
+        Get the ranges of the index made of blocks of lines having all the characters of the word
+        :return: list of [start, end] offsets
+        """
+        if self.blocks is None:
+            self.blocks = marshal.loads(self.index[self.end:])
+
+        mask = self.character_mask(word)
+        ranges = []
+
+        for start, end, block_mask in self.blocks:
+            if block_mask & mask == mask:
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1][1] = end
+                else:
+                    ranges.append([start, end])
+
+        return ranges
+
+    def substring_matches(self, word, ranges, limit, seen):
+        """
+        Get the lines whose key contains the word, shorter keys first
+        :return: list of line offsets
+        """
+        index = self.index
+        found = []
+
+        for start, end in ranges:
+            position = start
+
+            while len(found) < limit:
+                position = index.find(word, position, end)
+
+                if position < 0:
+                    break
+
+                line_start = self.line_start(position)
+                line_end = index.find(b'\n', position)
+
+                # Matches in the alias column of server lines are skipped
+                if position < index.find(b'\t', line_start, line_end) and line_start not in seen:
+                    seen.add(line_start)
+                    found.append((line_end - line_start, line_start))
+
+                position = line_end + 1
+
+        return [line_start for _, line_start in sorted(found)]
+
+    def subsequence_matches(self, word, ranges, limit):
+        """
+        Get the lines whose key contains the characters of the word in order, tighter matches first
+        :return: list of line offsets
+        """
+        # Imported here, importing re takes longer than the other completions
+        import re
+
+        # Every character is looked for after the previous one, the class excludes the character so the match
+        # cannot backtrack past it
+        escaped = [re.escape(bytes([character])) for character in word]
+        pattern = re.compile(escaped[0] + b''.join(b'[^\\t\\n' + character + b']*' + character
+                                                   for character in escaped[1:]) + rb'[^\t\n]*\t')
+        found = []
+
+        for start, end in ranges:
+            position = start
+
+            while len(found) < limit:
+                match = pattern.search(self.index, position, end)
+
+                if match is None:
+                    break
+
+                line_start = self.line_start(match.start())
+                position = self.index.find(b'\n', match.end()) + 1
+                found.append((match.end() - match.start(), match.end() - line_start, line_start))
+
+        return [line_start for _, _, line_start in sorted(found)]
+
+    def complete(self, word, limit=LIMIT):
+        """
+        Get the aliases completing a word: the ones starting with it, then the ones containing it and if there
+        are none, the ones containing its characters in order
+        :param word: The word typed so far
+        :param limit: Maximum number of aliases returned
+        :return: list of aliases
+        """
+        if self.index is None:
+            self.open()
+
+        word = word.lower().encode()
+        matches = self.prefix_matches(word, limit)
+
+        if len(matches) < limit and word:
+            ranges = self.block_ranges(word)
+            matches += self.substring_matches(word, ranges, limit - len(matches), set(matches))
+
+            if not matches and len(word) > 1:
+                matches = self.subsequence_matches(word, ranges, limit)
+
+        aliases = []
+
+        for offset in matches:
+            line_end = self.index.find(b'\n', offset)
+            alias = self.index[self.index.find(b'\t', offset, line_end) + 1:line_end]
+            aliases.append(alias.decode('utf-8', 'replace'))
+
+        # Servers and aliases of the same server complete to the same alias
+        return list(dict.fromkeys(aliases))
+
+
+def main():
+    word = sys.argv[1] if len(sys.argv) > 1 else ''
+
+    try:
+        aliases = AliasCompletion(os.environ.get(CONFIG_ENVIRONMENT, DEFAULT_CONFIG_FILE)).complete(word)
+    except ConfigError:
+        return
+
+    sys.stdout.write(''.join(alias + '\n' for alias in aliases))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import marshal
+import os
+
+# The config file is named by this environment variable, or is the default one
+CONFIG_ENVIRONMENT = 'SERVER_AUTOMATION_CONFIG'
+DEFAULT_CONFIG_FILE = '/Users/maxwellnderitu/Programs/server-automation/config.yaml'
+
+
+class ConfigError(Exception):
+    """Raised when the config file cannot be read or is not valid"""
+
+
+class AliasRegistry:
+    """
+    Parses the config file once and keeps an alias -> server index in memory.
+
+    The compiled index is persisted next to the config file (config.yaml.index) and is reused as
+    long as the size and modification time of the config file have not changed, so warm runs do
+    not parse any YAML at all. The index is written with marshal, which loads faster than pickle
+    and does not pull in extra modules at startup. It holds the passwords of the config file, so it is
+    only readable by its owner and an index other users can read or write is ignored and rebuilt.
+    """
+    INDEX_SUFFIX = '.index'
+    INDEX_VERSION = 2
+
+    def __init__(self, config_file):
+        self.config_file = config_file
+        self.index_file = config_file + self.INDEX_SUFFIX
+        self.config = None
+        self.servers = []
+        self.aliases = {}
+        self.positions = {}
+
+    def config_signature(self):
+        """
+        Get the values used to decide if the persisted index is still valid
+        :return: tuple of the config file mtime and size
+        """
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            raise ConfigError('Config file: {} does not exist'.format(self.config_file))
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        """
+        Load the index, from the persisted index file when it is fresh or from the config file otherwise
+        :return: the registry
+        """
+        signature = self.config_signature()
+
+        if not self.load_index(signature):
+            self.build(self.parse_config())
+            self.save_index(signature)
+
+        return self
+
+    def load_index(self, signature):
+        """
+        Load the persisted index if it was compiled from the current version of the config file
+        :param signature: the current config file signature
+        :return: True if the index was loaded
+        """
+        try:
+            with open(self.index_file, 'rb') as file:
+                stat = os.fstat(file.fileno())
+
+                if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+                    return False
+
+                index = marshal.load(file)
+        except Exception:
+            return False
+
+        if not isinstance(index, dict) or index.get('version') != self.INDEX_VERSION \
+                or index.get('signature') != signature:
+            return False
+
+        self.config = index['config']
+        self.servers = self.config['servers']
+        self.positions = index['positions']
+        self.aliases = {alias: self.servers[position] for alias, position in self.positions.items()}
+
+        return True
+
+    def save_index(self, signature):
+        """
+        Persist the compiled index next to the config file. Failing to write it is not fatal.
+        :param signature: the config file signature the index was compiled from
+        """
+        index = {
+            'version': self.INDEX_VERSION,
+            'signature': signature,
+            'config': self.config,
+            'positions': self.positions,
+        }
+        temp_file = '%s.%d.tmp' % (self.index_file, os.getpid())
+
+        try:
+            data = marshal.dumps(index)
+        except ValueError:
+            # The config has values such as dates that marshal does not support
+            return
+
+        try:
+            with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as file:
+                file.write(data)
+
+            os.replace(temp_file, self.index_file)
+        except OSError:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+
+    def parse_config(self):
+        """
+        Parse the YAML config file
+        :return: the config dictionary
+        """
+        import yaml
+
+        # The C loader is an order of magnitude faster on big inventories
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+        try:
+            with open(self.config_file, 'r') as file:
+                config = yaml.load(file, Loader=loader)
+        except OSError:
+            raise ConfigError('Config file: {} does not exist'.format(self.config_file))
+        except yaml.YAMLError as error:
+            raise ConfigError('Config file: {} is not valid YAML: {}'.format(self.config_file, error))
+
+        if not isinstance(config, dict) or not isinstance(config.get('servers'), list):
+            raise ConfigError('Config file: {} does not exist or is empty.'.format(self.config_file))
+
+        return config
+
+    def build(self, config):
+        """
+        Build the alias -> server dictionary and validate that every alias is unique
+        :param config: the parsed config
+        """
+        aliases = {}
+        positions = {}
+
+        for position, server_item in enumerate(config['servers']):
+            if not isinstance(server_item, dict) or not server_item.get('aliases'):
+                raise ConfigError('Server entry number {} has no aliases'.format(position + 1))
+
+            for alias in server_item['aliases']:
+                if alias in aliases:
+                    raise ConfigError('The alias \'{alias}\' is used by both {first} and {second}'.format(
+                        alias=alias, first=aliases[alias]['server'], second=server_item.get('server')))
+
+                aliases[alias] = server_item
+                positions[alias] = position
+
+        self.config = config
+        self.servers = config['servers']
+        self.aliases = aliases
+        self.positions = positions
+
+    def get(self, alias):
+        """
+        Get the server details for an alias
+        :param alias: String used to identify a server in the config file
+        :return: the server details or None
+        """
+        return self.aliases.get(alias)
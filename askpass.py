@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# Askpass program of the ssh processes started by the push and pull commands. ssh runs it with the prompt and
+# reads the answer from its output. The answer is asked to the process that started ssh over the unix socket
+# named by SERVER_AUTOMATION_ASKPASS, so that passwords are not put in the environment or on a command line
+import os
+import socket
+import sys
+
+
+def main():
+    prompt = sys.argv[1] if len(sys.argv) > 1 else ''
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(os.environ['SERVER_AUTOMATION_ASKPASS'])
+            client.sendall(prompt.encode('utf-8', 'replace') + b'\n')
+            answer = b''.join(iter(lambda: client.recv(4096), b''))
+    except (KeyError, OSError):
+        sys.exit(1)
+
+    # An empty answer means that the prompt is not known
+    if not answer:
+        sys.exit(1)
+
+    sys.stdout.write(answer.decode('utf-8', 'replace') + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Measures the peak memory of the run command with --aggregate against the fake ssh in benchmarks/fake_ssh, with
+every server printing the same large output except ten servers printing one more line, for a tenth of the
+servers and for all of them, and of the run command without --aggregate for the tenth of the servers. The
+peak resident memory of the run process is sampled from /proc while it runs.
+
+Usage: ./benchmarks/aggregate_benchmark.py [servers] [megabytes] [parallel]
+Example: ./benchmarks/aggregate_benchmark.py 1000 10 20
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FAKE_SSH = os.path.join(ROOT, 'benchmarks', 'fake_ssh')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+# Every server prints the same lines, the servers h10 to h19 print one more
+COMMAND = "yes 'request handled path=/api/v1/items status=200 took=12ms' 2>/dev/null | head -c %d; " \
+          "case \"$PS1\" in *@h1[0-9].*) echo changed;; esac"
+
+
+def write_config(directory, servers):
+    config = [{'aliases': ['h%d' % number], 'server': 'h%d.example.net' % number, 'username': 'demo',
+               'password': 'password', 'port': 22} for number in range(1, servers + 1)]
+    config_file = os.path.join(directory, 'config.yaml')
+
+    with open(config_file, 'w') as file:
+        yaml.safe_dump({'servers': config}, file)
+
+    fake_config = os.path.join(directory, 'fake_ssh.json')
+
+    with open(fake_config, 'w') as file:
+        json.dump({'default': {'latency': 0}}, file)
+
+    os.environ['FAKE_SSH_CONFIG'] = fake_config
+    os.environ['SERVER_AUTOMATION_CONFIG'] = config_file
+    os.environ['PATH'] = FAKE_SSH + os.pathsep + os.environ['PATH']
+
+
+def run(servers, size, parallel, aggregate):
+    """
+    Run the command on the servers h1 to h<servers>
+    :return: the peak resident memory in bytes, the seconds taken, the bytes printed and the last line printed
+    """
+    arguments = [sys.executable, os.path.join(ROOT, 'server_automation.py'), 'run',
+                 *['h%d' % number for number in range(1, servers + 1)], '--command=%s' % (COMMAND % size),
+                 '--parallel=%d' % parallel]
+
+    if aggregate:
+        arguments.append('--aggregate')
+
+    start = time.perf_counter()
+    process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    peak = [0]
+
+    def sample():
+        while process.poll() is None:
+            try:
+                with open('/proc/%d/statm' % process.pid) as file:
+                    peak[0] = max(peak[0], int(file.read().split()[1]) * PAGE_SIZE)
+            except (OSError, IndexError):
+                break
+
+            time.sleep(0.05)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+
+    printed = 0
+    last = b''
+
+    # The output is read and thrown away like a terminal would show it
+    while True:
+        data = process.stdout.read(1048576)
+
+        if not data:
+            break
+
+        printed += len(data)
+        last = (last + data)[-4096:]
+
+    process.wait()
+    sampler.join()
+
+    lines = [line for line in last.decode('utf-8', 'replace').splitlines() if line.startswith('✨')]
+
+    return peak[0], time.perf_counter() - start, printed, lines[-1] if lines else ''
+
+
+if __name__ == '__main__':
+    servers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    megabytes = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    parallel = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    size = int(megabytes * 1048576)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['HOME'] = directory
+        write_config(directory, servers)
+
+        print('%.1f MB of output per server, %d servers at a time\n' % (megabytes, parallel))
+
+        for count, aggregate in ((max(1, servers // 10), False), (max(1, servers // 10), True), (servers, True)):
+            peak, seconds, printed, summary = run(count, size, parallel, aggregate)
+
+            print('{count:>6} servers {mode:>11}: {peak:7.1f} MB peak resident, {printed:9.1f} MB printed, '
+                  '{seconds:6.1f}s {summary}'.format(count=count, mode='--aggregate' if aggregate else 'plain',
+                                                     peak=peak / 1048576, printed=printed / 1048576,
+                                                     seconds=seconds, summary=summary))
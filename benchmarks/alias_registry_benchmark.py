@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Compares the old alias lookup (parse the whole YAML file and scan the servers on every call) with the
+AliasRegistry (parse once, dictionary lookups, persisted index on warm runs).
+
+Usage: ./benchmarks/alias_registry_benchmark.py [sizes...]
+Example: ./benchmarks/alias_registry_benchmark.py 10 1000 100000
+"""
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from alias_registry import AliasRegistry  # noqa: E402
+
+DEFAULT_SIZES = [10, 1000, 100000]
+LOOKUPS = 4
+
+
+def write_config(path, size):
+    servers = []
+
+    for number in range(size):
+        server = {
+            'aliases': ['host%d' % number, 'host%d.example.net' % number],
+            'server': 'host%d.example.net' % number,
+            'username': 'demo',
+            'password': 'password',
+            'port': 22,
+        }
+
+        if number:
+            server['requiredServerLogIn'] = 'host%d' % (number - 1)
+
+        servers.append(server)
+
+    with open(path, 'w') as file:
+        yaml.dump({'servers': servers}, file, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper))
+
+
+def old_lookup(config_file, alias):
+    with open(config_file, 'r') as file:
+        config = yaml.safe_load(file)
+
+    for server_item in config['servers']:
+        if alias in server_item['aliases']:
+            return server_item
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def benchmark(size, directory):
+    config_file = os.path.join(directory, 'config_%d.yaml' % size)
+    write_config(config_file, size)
+    alias = 'host%d' % (size - 1)
+
+    # A 4 hop chain used to parse the config 4 times before the first ssh spawn
+    old_chain = timed(lambda: [old_lookup(config_file, alias) for _ in range(LOOKUPS)])
+
+    cold = timed(lambda: AliasRegistry(config_file).load())
+    warm = timed(lambda: AliasRegistry(config_file).load())
+
+    registry = AliasRegistry(config_file).load()
+    start = time.perf_counter()
+    for _ in range(100000):
+        registry.get(alias)
+    lookup = (time.perf_counter() - start) / 100000
+
+    print('{size:>8} servers | old {hops}-hop chain: {old:9.4f}s | registry cold: {cold:9.4f}s | '
+          'registry warm: {warm:9.4f}s | lookup: {lookup:8.1f}ns'
+          .format(size=size, hops=LOOKUPS, old=old_chain, cold=cold, warm=warm, lookup=lookup * 1e9))
+
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in sys.argv[1:]] or DEFAULT_SIZES
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            benchmark(size, temp_dir)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Measures the check command on a large inventory of local servers: most of them send an SSH banner, some
+accept the connection without sending anything, some refuse it and some are behind proxy servers.
+
+Usage: ./benchmarks/check_benchmark.py [servers] [timeout_seconds] [parallel]
+Example: ./benchmarks/check_benchmark.py 5000 1 512
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+SCRIPT = os.path.join(ROOT, 'server_automation.py')
+
+BANNER_PORT = 18822
+SILENT_PORT = 18824
+CLOSED_PORT = 18823
+
+
+def address(number):
+    """Every server gets its own loopback address so that they are all probed"""
+    return '127.%d.%d.%d' % (1 + number // 62500, number // 250 % 250, number % 250 + 1)
+
+
+def write_config(path, size):
+    servers = []
+
+    for number in range(size):
+        server = {'aliases': ['host%d' % number], 'server': address(number), 'username': 'demo',
+                  'password': 'password', 'port': BANNER_PORT}
+
+        if number % 10 == 8:
+            server['port'] = SILENT_PORT
+        elif number % 10 == 9:
+            server['port'] = CLOSED_PORT
+        elif number % 10 == 7 and number > 10:
+            server['requiredServerLogIn'] = 'host%d' % (number - 7)
+
+        servers.append(server)
+
+    with open(path, 'w') as file:
+        yaml.safe_dump({'servers': servers}, file)
+
+
+def serve_forever():
+    async def banner(reader, writer):
+        writer.write(b'SSH-2.0-OpenSSH_9.2\r\n')
+        await writer.drain()
+        writer.close()
+
+    async def silent(reader, writer):
+        await reader.read()
+        writer.close()
+
+    async def main():
+        await asyncio.start_server(banner, '0.0.0.0', BANNER_PORT, backlog=4096)
+        await asyncio.start_server(silent, '0.0.0.0', SILENT_PORT, backlog=4096)
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    timeout = sys.argv[2] if len(sys.argv) > 2 else '1'
+    parallel = sys.argv[3] if len(sys.argv) > 3 else '512'
+
+    threading.Thread(target=serve_forever, daemon=True).start()
+    time.sleep(0.5)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_file = os.path.join(temp_dir, 'config.yaml')
+        write_config(config_file, size)
+
+        environment = dict(os.environ, SERVER_AUTOMATION_CONFIG=config_file, HOME=temp_dir)
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, SCRIPT, 'check', '--timeout=' + timeout, '--parallel=' + parallel],
+                                env=environment, stdout=subprocess.PIPE, universal_newlines=True)
+        elapsed = time.perf_counter() - start
+
+        print(result.stdout.strip().splitlines()[-1])
+        print('%d servers checked in %.2fs with a %ss timeout and %s at the same time' % (
+            size, elapsed, timeout, parallel))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Measures the alias completion on a large inventory: building the index, rebuilding it after a small change
+of the config file, the latency of prefix and fuzzy queries in process and the latency of the completion
+process run by the shell scripts compared to a bare python -S.
+
+Usage: ./benchmarks/completion_benchmark.py [servers] [runs]
+Example: ./benchmarks/completion_benchmark.py 100000 200
+"""
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+BACKEND = os.path.join(ROOT, 'alias_completion.py')
+sys.path.insert(0, ROOT)
+
+from alias_completion import AliasCompletion  # noqa: E402
+from alias_registry import AliasRegistry  # noqa: E402
+
+REGIONS = ['eu-west', 'us-east', 'ap-south', 'sa-east']
+ROLES = ['web', 'db', 'cache', 'queue', 'worker', 'bastion']
+PROCESS_RUNS = 20
+
+
+def write_config(path, size, extra=()):
+    servers = [{
+        'aliases': ['%s-%s-%d' % (ROLES[number % len(ROLES)], REGIONS[number // 7 % len(REGIONS)], number)],
+        'server': '10.%d.%d.%d' % (number // 65536, number // 256 % 256, number % 256),
+        'username': 'demo',
+        'password': 'password',
+        'port': 22,
+    } for number in range(size)]
+    servers += [{'aliases': [alias], 'server': alias + '.example.net', 'username': 'demo', 'port': 22}
+                for alias in extra]
+
+    with open(path, 'w') as file:
+        yaml.dump({'servers': servers}, file, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper))
+
+
+def report(name, results):
+    print('{name:>36}: p50 {p50:7.3f}ms, p95 {p95:7.3f}ms'.format(
+        name=name, p50=statistics.median(results) * 1000,
+        p95=sorted(results)[int(len(results) * 0.95) - 1] * 1000))
+
+
+def query_timings(config_file, words):
+    completion = AliasCompletion(config_file).open()
+    results = []
+
+    for word in words:
+        start = time.perf_counter()
+        completion.complete(word)
+        results.append(time.perf_counter() - start)
+
+    return results
+
+
+def process_timings(command):
+    results = []
+
+    for _ in range(PROCESS_RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        results.append(time.perf_counter() - start)
+
+    return results
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    random.seed(1)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_file = os.path.join(temp_dir, 'config.yaml')
+        write_config(config_file, size)
+
+        # The config is parsed by the alias registry, which the completion index is built from
+        start = time.perf_counter()
+        AliasRegistry(config_file).load()
+        parsed = time.perf_counter()
+        AliasCompletion(config_file).open()
+        print('%d servers, config parsed in %.0fms, completion index built in %.0fms' % (
+            size, (parsed - start) * 1000, (time.perf_counter() - parsed) * 1000))
+
+        # Add a few servers, only the new lines are sorted and merged with the kept ones
+        write_config(config_file, size, ['new-host-%d' % number for number in range(10)])
+
+        start = time.perf_counter()
+        AliasRegistry(config_file).load()
+        parsed = time.perf_counter()
+        AliasCompletion(config_file).open()
+        print('10 servers added, config parsed in %.0fms, completion index rebuilt in %.0fms\n' % (
+            (parsed - start) * 1000, (time.perf_counter() - parsed) * 1000))
+
+        numbers = [random.randrange(size) for _ in range(runs)]
+        report('prefix (web-eu)', query_timings(config_file, ['web-eu'] * runs))
+        report('prefix (db-us-east-%d...)', query_timings(config_file, [
+            'db-us-east-%d' % number for number in numbers]))
+        report('server (10.1.2)', query_timings(config_file, ['10.1.2'] * runs))
+        report('fuzzy substring (east-%d...)', query_timings(config_file, ['east-%d' % number for number in numbers]))
+        report('fuzzy in order (wbeu1)', query_timings(config_file, ['wbeu1'] * runs))
+        report('fuzzy in order (qspth)', query_timings(config_file, ['qspth'] * runs))
+        report('no match (zzz)', query_timings(config_file, ['zzz'] * runs))
+        report('no match (web-xx)', query_timings(config_file, ['web-xx'] * runs))
+
+        os.environ['SERVER_AUTOMATION_CONFIG'] = config_file
+        print('')
+        report('python -S -c pass', process_timings([sys.executable, '-S', '-c', 'pass']))
+        report('python -S alias_completion.py web-eu', process_timings([sys.executable, '-S', BACKEND, 'web-eu']))
+        report('python -S alias_completion.py wbeu1', process_timings([sys.executable, '-S', BACKEND, 'wbeu1']))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Feeds a large login banner followed by a shell prompt through pexpect's expect (the old path of
+ServerManagement.expected) and through the ExpectEngine, reporting the time, CPU time and size of the
+output kept in controller.before.
+
+Usage: ./benchmarks/expect_benchmark.py [banner_megabytes] [old_path_time_limit]
+Example: ./benchmarks/expect_benchmark.py 50 120
+"""
+import os
+import resource
+import sys
+import time
+
+import pexpect
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from expect_engine import ExpectEngine  # noqa: E402
+
+LOGIN_STRINGS = ['demo@', 'demo:', 'bash', 'successful login', 'Last login', 'Welcome to lshell']
+
+PRODUCER = '''
+import sys
+line = b"*" * 79 + b"\\n"
+out = sys.stdout.buffer
+for _ in range(%d):
+    out.write(line)
+out.write(b"demo@host:~$ ")
+out.flush()
+sys.stdin.read()
+'''
+
+
+def spawn(megabytes):
+    lines = megabytes * 1024 * 1024 // 80
+    return pexpect.spawn(sys.executable, ['-c', PRODUCER % lines])
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def old_path(megabytes, limit):
+    controller = spawn(megabytes)
+
+    try:
+        controller.expect(LOGIN_STRINGS, timeout=limit)
+        return len(controller.before)
+    except pexpect.TIMEOUT:
+        return None
+    finally:
+        controller.close(force=True)
+
+
+def new_path(megabytes, limit):
+    controller = spawn(megabytes)
+
+    try:
+        ExpectEngine().expect(controller, LOGIN_STRINGS, limit)
+        return len(controller.before)
+    finally:
+        controller.close(force=True)
+
+
+def measure(name, function, megabytes, limit):
+    wall = time.perf_counter()
+    cpu = cpu_time()
+    kept = function(megabytes, limit)
+    wall = time.perf_counter() - wall
+    cpu = cpu_time() - cpu
+
+    if kept is None:
+        print('{name:>6}: did not match within {limit}s ({cpu:.2f}s CPU)'.format(name=name, limit=limit, cpu=cpu))
+    else:
+        print('{name:>6}: {wall:8.2f}s wall, {cpu:8.2f}s CPU, {rate:8.1f} MB/s, {kept:>10} bytes kept in before'
+              .format(name=name, wall=wall, cpu=cpu, rate=megabytes / wall, kept=kept))
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    old_limit = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+
+    print('Banner of %d MB' % size)
+    measure('new', new_path, size, 600)
+    measure('old', old_path, size, old_limit)
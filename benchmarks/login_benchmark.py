@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Measures the login code against the fake ssh in benchmarks/fake_ssh, without any real server:
+the latency of a single login, of chains of proxy servers logged into with ssh -J and nested, and
+the throughput of the run command over many servers.
+
+Usage: ./benchmarks/login_benchmark.py [prompt_latency_seconds] [fan_out_servers] [parallel]
+Example: ./benchmarks/login_benchmark.py 0.02 100 20
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FAKE_SSH = os.path.join(ROOT, 'benchmarks', 'fake_ssh')
+sys.path.insert(0, ROOT)
+
+from server_management import ServerManagement  # noqa: E402
+
+CHAIN_LENGTH = 4
+RUNS = 5
+
+
+def write_config(directory, fan_out, latency):
+    servers = []
+
+    for number in range(CHAIN_LENGTH):
+        server = {'aliases': ['hop%d' % number], 'server': 'hop%d.example.net' % number,
+                  'username': 'demo', 'password': 'password', 'port': 22}
+
+        if number:
+            server['requiredServerLogIn'] = 'hop%d' % (number - 1)
+
+        servers.append(server)
+
+    for number in range(fan_out):
+        servers.append({'aliases': ['fan%d' % number], 'server': 'fan%d.example.net' % number,
+                        'username': 'demo', 'password': 'password', 'port': 22})
+
+    config_file = os.path.join(directory, 'config.yaml')
+
+    with open(config_file, 'w') as file:
+        yaml.safe_dump({'servers': servers}, file)
+
+    fake_config = os.path.join(directory, 'fake_ssh.json')
+
+    with open(fake_config, 'w') as file:
+        json.dump({'default': {'latency': latency}}, file)
+
+    os.environ['FAKE_SSH_CONFIG'] = fake_config
+    os.environ['PATH'] = FAKE_SSH + os.pathsep + os.environ['PATH']
+
+    return config_file
+
+
+def new_management(config_file, login_mode=ServerManagement.JUMP_LOGIN):
+    management = ServerManagement()
+    management.CONFIG_FILE = config_file
+    management.PROMPT_FINGERPRINTS = os.path.join(os.path.dirname(config_file), 'prompt_fingerprints.json')
+    management.LOGIN_MODE = login_mode
+    management.INTERACTIVE = False
+    management.QUIET = True
+
+    return management
+
+
+def login_latency(config_file, alias, login_mode):
+    results = []
+
+    for _ in range(RUNS):
+        management = new_management(config_file, login_mode)
+        start = time.perf_counter()
+        management.server_login(management.get_server_details(alias))
+        results.append(time.perf_counter() - start)
+        management.controller.close(force=True)
+
+    return statistics.median(results)
+
+
+def fan_out_throughput(config_file, servers, parallel):
+    management = new_management(config_file)
+    start = time.perf_counter()
+    results = list(management.run_on_servers(['fan*'], 'true', parallel))
+    elapsed = time.perf_counter() - start
+    failed = len([result for result in results if result['exit_status'] != 0])
+
+    return elapsed, failed
+
+
+if __name__ == '__main__':
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.02
+    fan_out = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    parallel = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_file = write_config(temp_dir, fan_out, latency)
+
+        print('Prompt latency %.3fs, median of %d runs' % (latency, RUNS))
+
+        for hops in range(1, CHAIN_LENGTH + 1):
+            alias = 'hop%d' % (hops - 1)
+            jump = login_latency(config_file, alias, ServerManagement.JUMP_LOGIN)
+            nested = login_latency(config_file, alias, ServerManagement.NESTED_LOGIN)
+
+            print('{hops} hop(s): jump {jump:7.3f}s ({per_jump:.3f}s per hop), nested {nested:7.3f}s '
+                  '({per_nested:.3f}s per hop)'.format(hops=hops, jump=jump, nested=nested,
+                                                       per_jump=jump / hops, per_nested=nested / hops))
+
+        elapsed, failed = fan_out_throughput(config_file, fan_out, parallel)
+        print('run on {servers} servers, --parallel={parallel}: {elapsed:.2f}s, {rate:.1f} servers/s, '
+              '{failed} failed'.format(servers=fan_out, parallel=parallel, elapsed=elapsed,
+                                       rate=fan_out / elapsed, failed=failed))
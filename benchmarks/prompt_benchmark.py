@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Measures the login latency against the fake ssh in benchmarks/fake_ssh with the prompts of the servers not
+learned yet and learned at an earlier login, for servers with a usual prompt, a large banner, a verification
+code asked first and a prompt none of the broad patterns matches, which is only taken as the prompt once the
+timeout of the server passed. Also measures how long a login with a rejected password takes to fail and a
+login to a server whose prompt changed since it was learned.
+
+Usage: ./benchmarks/prompt_benchmark.py [prompt_latency_seconds] [timeout_seconds]
+Example: ./benchmarks/prompt_benchmark.py 0.02 3
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FAKE_SSH = os.path.join(ROOT, 'benchmarks', 'fake_ssh')
+sys.path.insert(0, ROOT)
+
+from server_management import ServerManagement, ServerManagementError  # noqa: E402
+
+RUNS = 5
+
+# Settings of the fake ssh for every kind of server
+SERVERS = {
+    'usual': {},
+    'banner': {'last_login': True, 'banner_bytes': 256 * 1024},
+    'code-first': {'verification_code': '123456', 'verification_first': True},
+    'unusual-prompt': {'prompt': '{host}> ', 'last_login': True},
+}
+
+
+def write_config(directory, latency, timeout):
+    servers = []
+    hosts = {}
+
+    for name, settings in SERVERS.items():
+        server = '%s.example.net' % name
+        servers.append({'aliases': [name], 'server': server, 'username': 'demo', 'password': 'password',
+                        'port': 22, 'timeout': timeout,
+                        'requireVerificationCode': 'verification_code' in settings})
+        hosts[server] = settings
+
+    # A server whose password is not accepted and one whose prompt is changed after it was learned
+    servers.append({'aliases': ['denied'], 'server': 'denied.example.net', 'username': 'demo',
+                    'password': 'wrong', 'port': 22, 'timeout': timeout})
+    servers.append({'aliases': ['changed'], 'server': 'changed.example.net', 'username': 'demo',
+                    'password': 'password', 'port': 22, 'timeout': timeout})
+
+    config_file = os.path.join(directory, 'config.yaml')
+
+    with open(config_file, 'w') as file:
+        yaml.safe_dump({'servers': servers}, file)
+
+    fake_config = os.path.join(directory, 'fake_ssh.json')
+
+    with open(fake_config, 'w') as file:
+        json.dump({'default': {'latency': latency}, 'hosts': hosts}, file)
+
+    os.environ['FAKE_SSH_CONFIG'] = fake_config
+    os.environ['PATH'] = FAKE_SSH + os.pathsep + os.environ['PATH']
+
+    return config_file, fake_config
+
+
+def login(config_file, fingerprints_file, alias):
+    """
+    Log into a server and run a command, the session is only usable once the shell waits for it
+    :return: the seconds taken and the error if any
+    """
+    management = ServerManagement()
+    management.CONFIG_FILE = config_file
+    management.PROMPT_FINGERPRINTS = fingerprints_file
+    management.VERIFICATION_CODE = '123456'
+    management.INTERACTIVE = False
+    management.QUIET = True
+    start = time.perf_counter()
+    error = None
+
+    try:
+        server_details = management.get_server_details(alias)
+        management.server_login(server_details)
+        management.run_command_with_status('true', server_details['timeout'])
+    except ServerManagementError as failure:
+        error = str(failure)
+
+    seconds = time.perf_counter() - start
+
+    if management.controller is not None:
+        management.controller.close(force=True)
+
+    return seconds, error
+
+
+def latency(config_file, fingerprints_file, alias, learned):
+    results = []
+
+    for _ in range(RUNS):
+        if not learned and os.path.exists(fingerprints_file):
+            os.remove(fingerprints_file)
+
+        seconds, error = login(config_file, fingerprints_file, alias)
+
+        if error is not None:
+            sys.exit('%s: %s' % (alias, error))
+
+        results.append(seconds)
+
+    return statistics.median(results)
+
+
+if __name__ == '__main__':
+    prompt_latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.02
+    timeout = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_file, fake_config = write_config(temp_dir, prompt_latency, timeout)
+        fingerprints_file = os.path.join(temp_dir, 'prompt_fingerprints.json')
+
+        print('Prompt latency %.3fs, timeout %ds, login and a command, median of %d runs\n' % (
+            prompt_latency, timeout, RUNS))
+
+        totals = {False: [], True: []}
+
+        for alias in SERVERS:
+            cold = latency(config_file, fingerprints_file, alias, learned=False)
+            warm = latency(config_file, fingerprints_file, alias, learned=True)
+            totals[False].append(cold)
+            totals[True].append(warm)
+
+            print('{alias:>16}: not learned {cold:7.3f}s, learned {warm:7.3f}s'.format(
+                alias=alias, cold=cold, warm=warm))
+
+        print('{:>16}: not learned {:7.3f}s, learned {:7.3f}s\n'.format(
+            'average', statistics.mean(totals[False]), statistics.mean(totals[True])))
+
+        seconds, error = login(config_file, fingerprints_file, 'denied')
+        print('{:>16}: {:7.3f}s, {}'.format('denied', seconds, error))
+
+        # Learn the usual prompt of a server, then change it so that the learned one never comes
+        login(config_file, fingerprints_file, 'changed')
+
+        with open(fake_config) as file:
+            fake = json.load(file)
+
+        fake['hosts']['changed.example.net'] = {'prompt': '[{user}@{host} ~]$ '}
+
+        with open(fake_config, 'w') as file:
+            json.dump(fake, file)
+
+        seconds, error = login(config_file, fingerprints_file, 'changed')
+        relearned, _ = login(config_file, fingerprints_file, 'changed')
+
+        print('{:>16}: {:7.3f}s after the prompt changed, {:7.3f}s once learned again{}'.format(
+            'changed', seconds, relearned, '' if error is None else ', ' + error))
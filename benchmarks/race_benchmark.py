@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Measures the login latency against the fake ssh in benchmarks/fake_ssh of a server behind a proxy server that
+never answers, a slow one and a fast one: with the dead proxy server as its only requiredServerLogIn, which
+waits out the login timeout, and with the three proxy servers as candidates raced against each other
+before and after the time of every route is learned.
+
+Usage: ./benchmarks/race_benchmark.py [timeout_seconds] [runs]
+Example: ./benchmarks/race_benchmark.py 5 5
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FAKE_SSH = os.path.join(ROOT, 'benchmarks', 'fake_ssh')
+sys.path.insert(0, ROOT)
+
+from server_management import ServerManagement, ServerManagementError  # noqa: E402
+
+# Settings of the fake ssh for every proxy server
+PROXIES = {
+    'dead': {'fail': 'hang'},
+    'slow': {'latency': 0.3},
+    'fast': {'latency': 0.02},
+}
+
+
+def write_config(directory, timeout):
+    servers = [{'aliases': [name], 'server': '%s.example.net' % name, 'username': 'ops', 'password': 'password',
+                'port': 22} for name in PROXIES]
+
+    for alias, required in (('single', 'dead'), ('raced', ['dead', 'slow', 'fast'])):
+        servers.append({'aliases': [alias], 'server': '%s.example.net' % alias, 'username': 'demo',
+                        'password': 'password', 'port': 22, 'timeout': timeout, 'requiredServerLogIn': required})
+
+    config_file = os.path.join(directory, 'config.yaml')
+
+    with open(config_file, 'w') as file:
+        yaml.safe_dump({'servers': servers}, file)
+
+    fake_config = os.path.join(directory, 'fake_ssh.json')
+    hosts = {'%s.example.net' % name: settings for name, settings in PROXIES.items()}
+
+    with open(fake_config, 'w') as file:
+        json.dump({'default': {'latency': 0.02}, 'hosts': hosts}, file)
+
+    os.environ['FAKE_SSH_CONFIG'] = fake_config
+    os.environ['PATH'] = FAKE_SSH + os.pathsep + os.environ['PATH']
+
+    return config_file
+
+
+def login(config_file, state_dir, alias):
+    """
+    Log into a server and run a command
+    :return: the seconds taken, the route logged in through and the error if any
+    """
+    management = ServerManagement()
+    management.CONFIG_FILE = config_file
+    management.ROUTE_HISTORY = os.path.join(state_dir, 'route_history.json')
+    management.PROMPT_FINGERPRINTS = os.path.join(state_dir, 'prompt_fingerprints.json')
+    management.INTERACTIVE = False
+    management.QUIET = True
+    start = time.perf_counter()
+    error = None
+
+    try:
+        server_details = management.get_server_details(alias)
+        management.server_login(server_details)
+        management.run_command_with_status('true', server_details['timeout'])
+    except ServerManagementError as failure:
+        error = str(failure)
+
+    seconds = time.perf_counter() - start
+
+    if management.controller is not None:
+        management.controller.close(force=True)
+
+    route = ' -> '.join(management.route.servers[:-1]) if management.route is not None else '-'
+
+    return seconds, route, error
+
+
+if __name__ == '__main__':
+    timeout = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_file = write_config(temp_dir, timeout)
+
+        print('Timeout %ds, login and a command, median of %d runs\n' % (timeout, runs))
+
+        seconds, route, error = login(config_file, temp_dir, 'single')
+        print('{:>24}: {:7.3f}s, {}'.format('dead proxy only', seconds, 'failed' if error else 'logged in'))
+
+        # The first login does not know any route, the dead one is tried first in the order of the config file
+        seconds, route, error = login(config_file, temp_dir, 'raced')
+        print('{:>24}: {:7.3f}s through {}'.format('raced, not learned', seconds, route))
+
+        results = []
+
+        for _ in range(runs):
+            seconds, route, error = login(config_file, temp_dir, 'raced')
+
+            if error is not None:
+                sys.exit('raced: %s' % error)
+
+            results.append(seconds)
+
+        print('{:>24}: {:7.3f}s through {}'.format('raced, learned', statistics.median(results), route))
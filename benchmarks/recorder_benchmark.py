@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Measures the keystroke echo latency of an interactive session handed over with interact() to a local cat,
+without recording, with the session recorder and with pexpect's logfile, writing to a file or to a disk that
+stalls on every write. Every mode runs in its own process on a pseudo terminal like the connect command.
+
+Usage: ./benchmarks/recorder_benchmark.py [keystrokes] [stall_seconds]
+Example: ./benchmarks/recorder_benchmark.py 300 0.05
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pexpect
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from session_recorder import SessionRecorder  # noqa: E402
+
+MODES = ['plain', 'recorder', 'logfile', 'recorder-stalled', 'logfile-stalled']
+
+
+class StalledFile:
+    """A file on a disk that takes stall seconds to complete every write"""
+
+    def __init__(self, path, stall):
+        self.file = open(path, 'wb')
+        self.stall = stall
+
+    def write(self, data):
+        time.sleep(self.stall)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def child(mode, path, stall):
+    """Hand a cat over to the terminal of the benchmark in the given mode"""
+    # The terminal of cat echoes the keys like the shell of a server
+    session = pexpect.spawn('cat')
+    file = StalledFile(path, stall if mode.endswith('stalled') else 0)
+
+    if mode.startswith('recorder'):
+        recorder = SessionRecorder(path, 80, 24, file=file)
+
+        def record(data):
+            recorder.output(data)
+            return data
+
+        session.interact(output_filter=record)
+        recorder.close()
+    elif mode.startswith('logfile'):
+        session.logfile_read = file
+        session.interact()
+    else:
+        session.interact()
+
+
+def echo_latencies(mode, keystrokes, stall, directory):
+    session = pexpect.spawn(sys.executable, [os.path.realpath(__file__), '--child', mode,
+                                             os.path.join(directory, mode + '.cast'), str(stall)], echo=False)
+    session.delaybeforesend = None
+    time.sleep(0.5)
+    results = []
+
+    for number in range(keystrokes):
+        key = chr(ord('a') + number % 26)
+        start = time.perf_counter()
+        session.send(key)
+        session.expect_exact(key)
+        results.append(time.perf_counter() - start)
+
+        # Keys are typed one after the other, not in a burst
+        time.sleep(0.002)
+
+    # Leave interact() with its escape character
+    session.sendcontrol(']')
+    session.expect(pexpect.EOF)
+
+    return results
+
+
+def output_costs(runs):
+    """Time taken by a call of SessionRecorder.output for typical reads of an interactive session"""
+    recorder = SessionRecorder(os.devnull, 80, 24)
+    results = {}
+
+    for size in [1, 100, 1000]:
+        data = b'x' * size
+        start = time.perf_counter()
+
+        for _ in range(runs):
+            recorder.output(data)
+
+            # Stay below the size of the buffer so that the output is copied, not dropped
+            if recorder.written - recorder.read > recorder.size // 2:
+                recorder.read = recorder.written
+
+        results[size] = (time.perf_counter() - start) / runs
+
+    recorder.close()
+
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3], float(sys.argv[4]))
+        sys.exit(0)
+
+    keystrokes = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    stall = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+    for size, seconds in output_costs(100000).items():
+        print('{:>20}: {:6.2f}us per call'.format('output() %d bytes' % size, seconds * 1e6))
+
+    print('\nEcho latency of %d keystrokes, stalled disks take %.0fms per write\n' % (keystrokes, stall * 1000))
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = None
+
+        for mode in MODES:
+            results = sorted(echo_latencies(mode, keystrokes, stall, directory))
+            p50, p99 = statistics.median(results), results[int(len(results) * 0.99) - 1]
+            baseline = baseline or p50
+
+            print('{mode:>20}: p50 {p50:7.3f}ms, p99 {p99:7.3f}ms, max {max:7.3f}ms, p50 overhead {extra:+.3f}ms'.format(
+                mode=mode, p50=p50 * 1000, p99=p99 * 1000, max=results[-1] * 1000, extra=(p50 - baseline) * 1000))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Measures the throughput and the CPU taken by pexpect's interact() and by PtyRelay while copying the output of a
+local pty producer, a cat of a log file, to a terminal and to a pipe. Every copy runs in its own process with a
+pseudo terminal as its terminal like in a terminal window, the CPU is the one of that process only.
+
+Usage: ./benchmarks/relay_benchmark.py [megabytes]
+Example: ./benchmarks/relay_benchmark.py 200
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pexpect
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pty_relay import PtyRelay  # noqa: E402
+
+LINE = b'2024-05-01T12:00:00.000Z INFO  [worker-7] request handled path=/api/v1/items status=200 took=12ms\n'
+
+
+def write_log(path, megabytes):
+    chunk = LINE * (1048576 // len(LINE))
+
+    with open(path, 'wb') as file:
+        for _ in range(megabytes):
+            file.write(chunk)
+
+    return os.path.getsize(path)
+
+
+def copy(mode, target, log_file, result_file):
+    """Copy the output of cat to stdout with interact() or the relay, in the process measured"""
+    if target == 'pipe':
+        drain = subprocess.Popen(['cat'], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        os.dup2(drain.stdin.fileno(), sys.stdout.fileno())
+
+    producer = pexpect.spawn('cat', [log_file])
+    start = time.perf_counter()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    if mode == 'relay':
+        PtyRelay(producer).run()
+    else:
+        producer.interact()
+
+    end = resource.getrusage(resource.RUSAGE_SELF)
+    seconds = time.perf_counter() - start
+
+    with open(result_file, 'w') as file:
+        json.dump({'seconds': seconds, 'cpu': end.ru_utime - usage.ru_utime + end.ru_stime - usage.ru_stime},
+                  file)
+
+
+def measure(mode, target, log_file, result_file):
+    """Run a copy on a pseudo terminal whose output is read and thrown away like a terminal window does"""
+    terminal = pexpect.spawn(sys.executable, [os.path.realpath(__file__), '--copy', mode, target, log_file,
+                                              result_file], timeout=600)
+
+    while True:
+        try:
+            terminal.read_nonblocking(1048576, timeout=600)
+        except pexpect.EOF:
+            break
+
+    terminal.close()
+
+    with open(result_file) as file:
+        return json.load(file)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--copy']:
+        copy(*sys.argv[2:6])
+        sys.exit(0)
+
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    with tempfile.TemporaryDirectory() as directory:
+        log_file = os.path.join(directory, 'service.log')
+        result_file = os.path.join(directory, 'result.json')
+        size = write_log(log_file, megabytes)
+
+        print('Copying %.0f MB of log lines from cat on a pty\n' % (size / 1048576))
+
+        for target in ['terminal', 'pipe']:
+            for mode in ['interact', 'relay']:
+                result = measure(mode, target, log_file, result_file)
+
+                print('{target:>8} {mode:>8}: {speed:7.1f} MB/s, {cpu:5.1f}% CPU, {seconds:6.2f}s'.format(
+                    target=target, mode=mode, speed=size / 1048576 / result['seconds'],
+                    cpu=result['cpu'] / result['seconds'] * 100, seconds=result['seconds']))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measures the startup time of the list command against a bare python interpreter and shows the slowest
+imports reported by python -X importtime.
+
+Usage: ./benchmarks/startup_benchmark.py [servers] [runs]
+Example: ./benchmarks/startup_benchmark.py 1000 20
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+SCRIPT = os.path.join(ROOT, 'server_automation.py')
+IMPORTS_SHOWN = 15
+
+
+def write_config(path, size):
+    servers = [{
+        'aliases': ['host%d' % number],
+        'server': 'host%d.example.net' % number,
+        'username': 'demo',
+        'password': 'password',
+        'port': 22,
+    } for number in range(size)]
+
+    with open(path, 'w') as file:
+        yaml.safe_dump({'servers': servers}, file)
+
+
+def timings(command, environment, runs):
+    results = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=environment, stdout=subprocess.DEVNULL, check=True)
+        results.append(time.perf_counter() - start)
+
+    return results
+
+
+def report(name, results):
+    print('{name:>20}: p50 {p50:6.1f}ms, min {min:6.1f}ms, max {max:6.1f}ms'.format(
+        name=name, p50=statistics.median(results) * 1000, min=min(results) * 1000, max=max(results) * 1000))
+
+
+def slowest_imports(environment):
+    result = subprocess.run([sys.executable, '-X', 'importtime', SCRIPT, 'list'], env=environment,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    rows = []
+
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), int(self_time), name.rstrip()))
+
+    print('\nSlowest imports of list (cumulative us, self us, module):')
+
+    for cumulative, self_time, name in sorted(rows, reverse=True)[:IMPORTS_SHOWN]:
+        print('{:>10} {:>10} {}'.format(cumulative, self_time, name))
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_file = os.path.join(temp_dir, 'config.yaml')
+        write_config(config_file, size)
+
+        environment = dict(os.environ, SERVER_AUTOMATION_CONFIG=config_file)
+        environment.pop('PYTHONDONTWRITEBYTECODE', None)
+
+        # The first run compiles the modules and the alias index
+        subprocess.run([sys.executable, SCRIPT, 'list'], env=environment, stdout=subprocess.DEVNULL, check=True)
+
+        print('%d servers, %d runs' % (size, runs))
+        report('python -c pass', timings([sys.executable, '-c', 'pass'], environment, runs))
+        report('list', timings([sys.executable, SCRIPT, 'list'], environment, runs))
+
+        slowest_imports(environment)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Measures logins to servers asking for TOTP verification codes against the fake ssh in benchmarks/fake_ssh.
+The fake checks a code a round trip after it was sent, so a code sent right before the end of its window has
+expired when it is checked. Many servers are logged into in parallel over many windows, once giving out codes
+up to the end of their window and once keeping the margin of TotpGenerator, and the failed logins and the
+login latency are compared. The codes generated are counted to show that the logins of a window share a code.
+
+Usage: ./benchmarks/totp_benchmark.py [logins] [period_seconds] [round_trip_seconds]
+Example: ./benchmarks/totp_benchmark.py 300 5 0.5
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FAKE_SSH = os.path.join(ROOT, 'benchmarks', 'fake_ssh')
+sys.path.insert(0, ROOT)
+
+from server_management import ServerManagement  # noqa: E402
+from totp import TotpGenerator  # noqa: E402
+
+SECRET = 'JBSWY3DPEHPK3PXP'
+SERVERS = 20
+
+
+def write_config(directory, period, round_trip):
+    servers = [{'aliases': ['totp%d' % number], 'server': 'totp%d.example.net' % number, 'username': 'demo',
+                'password': 'password', 'port': 22, 'requireVerificationCode': True, 'totpSecret': SECRET,
+                'totpPeriod': period} for number in range(SERVERS)]
+    config_file = os.path.join(directory, 'config.yaml')
+
+    with open(config_file, 'w') as file:
+        yaml.safe_dump({'servers': servers}, file)
+
+    fake_config = os.path.join(directory, 'fake_ssh.json')
+
+    with open(fake_config, 'w') as file:
+        json.dump({'default': {'latency': 0.01, 'totp_secret': SECRET, 'totp_period': period,
+                               'check_delay': round_trip}}, file)
+
+    os.environ['FAKE_SSH_CONFIG'] = fake_config
+    os.environ['PATH'] = FAKE_SSH + os.pathsep + os.environ['PATH']
+
+    return config_file
+
+
+class CountingGenerator(TotpGenerator):
+    """Counts the codes generated, the other codes given out were shared"""
+    generated = 0
+
+    def generate(self, key, counter, digits=TotpGenerator.DIGITS):
+        CountingGenerator.generated += 1
+
+        return TotpGenerator.generate(key, counter, digits)
+
+
+def run(config_file, logins, margin):
+    """
+    Log into the servers until the number of logins is reached, every login starting at a random time
+    :return: the failed logins, the seconds of every login and the codes generated
+    """
+    import concurrent.futures
+    import random
+
+    management = ServerManagement()
+    management.CONFIG_FILE = config_file
+    management.PROMPT_FINGERPRINTS = os.path.join(os.path.dirname(config_file), 'prompt_fingerprints.json')
+    management.INTERACTIVE = False
+    management.QUIET = True
+    management.totp = CountingGenerator(management.TOTP_KEYRING, margin)
+    CountingGenerator.generated = 0
+
+    def login(number):
+        time.sleep(random.random())
+        worker = management.new_worker()
+        start = time.perf_counter()
+
+        try:
+            worker.server_login(worker.get_server_details('totp%d' % (number % SERVERS)))
+            return time.perf_counter() - start, None
+        except Exception as error:
+            return time.perf_counter() - start, error
+        finally:
+            if worker.controller is not None:
+                worker.controller.close(force=True)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SERVERS) as executor:
+        results = list(executor.map(login, range(logins)))
+
+    return len([error for _, error in results if error is not None]), [seconds for seconds, _ in results], \
+        CountingGenerator.generated
+
+
+if __name__ == '__main__':
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    period = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    round_trip = float(sys.argv[3]) if len(sys.argv) > 3 else 0.5
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_file = write_config(directory, period, round_trip)
+
+        print('%d logins, %d in parallel, %ds windows, codes checked %.1fs after they are sent\n' % (
+            logins, SERVERS, period, round_trip))
+
+        for name, margin in [('no margin', 0), ('margin %.1fs' % (round_trip * 2), round_trip * 2)]:
+            start = time.perf_counter()
+            failed, seconds, generated = run(config_file, logins, margin)
+            elapsed = time.perf_counter() - start
+
+            print('{name:>14}: {failed} failed ({rate:.1f}%), login p50 {p50:.3f}s, max {max:.3f}s, {generated} codes '
+                  'generated in {elapsed:.0f}s'.format(
+                      name=name, failed=failed, rate=failed * 100 / logins, p50=statistics.median(seconds),
+                      max=max(seconds), generated=generated, elapsed=elapsed))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Measures the push and pull commands through a two server route of the fake ssh in benchmarks/fake_ssh: the
+throughput of pushing and pulling a large file compared to a plain local copy and checksum, resuming a push
+and a pull after half the file was lost, pushing a file that did not change and pushing to many servers at once.
+
+Usage: ./benchmarks/transfer_benchmark.py [megabytes] [servers]
+Example: ./benchmarks/transfer_benchmark.py 1024 4
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FAKE_SSH = os.path.join(ROOT, 'benchmarks', 'fake_ssh')
+sys.path.insert(0, ROOT)
+
+from server_management import ServerManagement  # noqa: E402
+
+BLOCK = 1024 * 1024
+
+
+def write_config(directory, servers):
+    hosts = [{'aliases': ['bastion'], 'server': 'bastion.example.net', 'username': 'demo', 'password': 'password',
+              'port': 22}]
+    hosts += [{'aliases': ['web%d' % number], 'server': 'web%d.example.net' % number, 'username': 'demo',
+               'password': 'password', 'port': 22, 'requiredServerLogIn': 'bastion'}
+              for number in range(1, servers + 1)]
+    config_file = os.path.join(directory, 'config.yaml')
+
+    with open(config_file, 'w') as file:
+        yaml.safe_dump({'servers': hosts}, file)
+
+    fake_config = os.path.join(directory, 'fake_ssh.json')
+
+    with open(fake_config, 'w') as file:
+        json.dump({'default': {'latency': 0.01}}, file)
+
+    os.environ['FAKE_SSH_CONFIG'] = fake_config
+    os.environ['PATH'] = FAKE_SSH + os.pathsep + os.environ['PATH']
+
+    return config_file
+
+
+def write_file(path, megabytes):
+    block = os.urandom(BLOCK)
+
+    with open(path, 'wb') as file:
+        for number in range(megabytes):
+            # Every block differs so that a wrong offset is found by the checksums
+            file.write(number.to_bytes(8, 'big') + block[8:])
+
+
+def sha256(path):
+    hasher = hashlib.sha256()
+
+    with open(path, 'rb') as file:
+        for data in iter(lambda: file.read(BLOCK), b''):
+            hasher.update(data)
+
+    return hasher.hexdigest()
+
+
+def report(name, size, seconds, sent=None):
+    print('{name:>32}: {seconds:7.2f}s, {rate:8.1f} MB/s{sent}'.format(
+        name=name, seconds=seconds, rate=size / BLOCK / seconds,
+        sent='' if sent is None else ', {:.0f} MB sent'.format(sent / BLOCK)))
+
+
+def timed(function, *arguments, **keywords):
+    start = time.perf_counter()
+    result = function(*arguments, **keywords)
+
+    return time.perf_counter() - start, result
+
+
+def check(result):
+    if result['error'] is not None:
+        sys.exit('{alias}: {error}'.format(**result))
+
+    return result
+
+
+if __name__ == '__main__':
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    servers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    directory = tempfile.mkdtemp(prefix='transfer-benchmark-')
+
+    try:
+        management = ServerManagement()
+        management.CONFIG_FILE = write_config(directory, servers)
+        management.INTERACTIVE = False
+        management.QUIET = True
+
+        from file_transfer import FileTransfer
+
+        def transfer(alias):
+            return FileTransfer(management.new_worker(), alias, management.get_server_details(alias))
+
+        source = os.path.join(directory, 'source.bin')
+        write_file(source, megabytes)
+        size = os.path.getsize(source)
+        checksum = sha256(source)
+        remote = os.path.join(directory, 'remote.bin')
+
+        print('%d MB file, route bastion -> web1\n' % megabytes)
+
+        report('local copy', size, timed(shutil.copyfile, source, remote)[0])
+        report('local sha256sum', size, timed(subprocess.run, ['sha256sum', source], stdout=subprocess.DEVNULL)[0])
+        os.remove(remote)
+
+        seconds, result = timed(transfer('web1').push, source, remote)
+        report('push', size, seconds, check(result)['bytes'])
+        assert sha256(remote) == checksum
+
+        # Half of the remote file is lost, the chunks before it are kept
+        os.truncate(remote, size // 2)
+        seconds, result = timed(transfer('web1').push, source, remote)
+        report('push resumed from half', size, seconds, check(result)['bytes'])
+        assert sha256(remote) == checksum
+
+        seconds, result = timed(transfer('web1').push, source, remote)
+        report('push unchanged', size, seconds, check(result)['bytes'])
+
+        pulled = os.path.join(directory, 'pulled.bin')
+        seconds, result = timed(transfer('web1').pull, remote, pulled)
+        report('pull', size, seconds, check(result)['bytes'])
+        assert sha256(pulled) == checksum
+
+        os.truncate(pulled, size // 2)
+        seconds, result = timed(transfer('web1').pull, remote, pulled)
+        report('pull resumed from half', size, seconds, check(result)['bytes'])
+        assert sha256(pulled) == checksum
+
+        os.remove(pulled)
+        os.remove(remote)
+
+        # Every server of the fake ssh writes to this machine, each one gets its own file
+        import concurrent.futures
+
+        def push(number):
+            return check(transfer('web%d' % number).push(source, '%s.%d' % (remote, number)))
+
+        start = time.perf_counter()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=servers) as executor:
+            list(executor.map(push, range(1, servers + 1)))
+
+        report('push to %d servers' % servers, size * servers, time.perf_counter() - start)
+
+        for number in range(1, servers + 1):
+            assert sha256('%s.%d' % (remote, number)) == checksum
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Measures the lazy port forward of pf --lazy against a local echo server, through the fake ssh in
+benchmarks/fake_ssh: the latency of the first connection which logs into the chain, the latency of the
+following connections, the throughput compared to connecting to the echo server directly, concurrent
+clients sharing one chain and the chain being closed when idle.
+
+Usage: ./benchmarks/tunnel_benchmark.py [prompt_latency_seconds] [megabytes] [clients]
+Example: ./benchmarks/tunnel_benchmark.py 0.02 64 50
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FAKE_SSH = os.path.join(ROOT, 'benchmarks', 'fake_ssh')
+sys.path.insert(0, ROOT)
+
+from lazy_tunnel import LazyTunnel  # noqa: E402
+from server_management import ServerManagement  # noqa: E402
+
+CONNECTIONS = 50
+CHUNK = 65536
+IDLE_TIMEOUT = 0.5
+
+
+def write_config(directory, latency):
+    servers = [
+        {'aliases': ['bastion'], 'server': 'bastion.example.net', 'username': 'demo', 'password': 'password',
+         'port': 22},
+        {'aliases': ['echo'], 'server': 'echo.example.net', 'username': 'demo', 'password': 'password',
+         'port': 22, 'requiredServerLogIn': 'bastion'},
+    ]
+    config_file = os.path.join(directory, 'config.yaml')
+
+    with open(config_file, 'w') as file:
+        yaml.safe_dump({'servers': servers}, file)
+
+    fake_config = os.path.join(directory, 'fake_ssh.json')
+
+    with open(fake_config, 'w') as file:
+        json.dump({'default': {'latency': latency}}, file)
+
+    os.environ['FAKE_SSH_CONFIG'] = fake_config
+    os.environ['PATH'] = FAKE_SSH + os.pathsep + os.environ['PATH']
+
+    return config_file
+
+
+async def echo(reader, writer):
+    while True:
+        data = await reader.read(CHUNK)
+
+        if not data:
+            break
+
+        writer.write(data)
+        await writer.drain()
+
+    writer.close()
+
+
+async def round_trip(port, size=64):
+    """Connect, send some bytes and wait for them to come back"""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('localhost', port)
+    writer.write(b'x' * size)
+    await reader.readexactly(size)
+    elapsed = time.perf_counter() - start
+    writer.close()
+
+    return elapsed
+
+
+async def throughput(port, megabytes):
+    """Send data and read the echo back at the same time"""
+    reader, writer = await asyncio.open_connection('localhost', port)
+    total = megabytes * 1024 * 1024
+    chunk = b'x' * CHUNK
+    start = time.perf_counter()
+
+    async def send():
+        for _ in range(total // CHUNK):
+            writer.write(chunk)
+            await writer.drain()
+
+    async def receive():
+        received = 0
+
+        while received < total:
+            data = await reader.read(CHUNK)
+
+            if not data:
+                raise RuntimeError('The connection closed after %d bytes' % received)
+
+            received += len(data)
+
+    await asyncio.gather(send(), receive())
+    elapsed = time.perf_counter() - start
+    writer.close()
+
+    return megabytes / elapsed
+
+
+def report(name, results):
+    print('{name:>32}: p50 {p50:7.2f}ms, p95 {p95:7.2f}ms'.format(
+        name=name, p50=statistics.median(results) * 1000,
+        p95=sorted(results)[int(len(results) * 0.95) - 1] * 1000))
+
+
+async def main(config_file, megabytes, clients):
+    echo_server = await asyncio.start_server(echo, 'localhost', 0)
+    echo_port = echo_server.sockets[0].getsockname()[1]
+
+    management = ServerManagement()
+    management.CONFIG_FILE = config_file
+    management.QUIET = True
+
+    tunnel_port = LazyTunnel.free_port()
+    tunnel = LazyTunnel(management, [(tunnel_port, 'echo', echo_port)], IDLE_TIMEOUT)
+    upstream = list(tunnel.upstreams.values())[0]
+    await tunnel.start()
+
+    print('First connection, logs into the chain: %.1fms' % (await round_trip(tunnel_port) * 1000))
+
+    report('direct connection', [await round_trip(echo_port) for _ in range(CONNECTIONS)])
+    report('connection through the tunnel', [await round_trip(tunnel_port) for _ in range(CONNECTIONS)])
+
+    print('{:>32}: {:7.1f}MB/s'.format('direct throughput', await throughput(echo_port, megabytes)))
+    print('{:>32}: {:7.1f}MB/s'.format('tunnel throughput', await throughput(tunnel_port, megabytes)))
+
+    # Wait for the chain to be closed, then connect many clients at once
+    await asyncio.sleep(IDLE_TIMEOUT * 2)
+    print('\nChain open after %.1fs idle: %s' % (IDLE_TIMEOUT, upstream.is_open()))
+
+    logins = upstream.logins
+    start = time.perf_counter()
+    await asyncio.gather(*[round_trip(tunnel_port) for _ in range(clients)])
+    print('%d concurrent clients on a closed chain: %.1fms, %d login(s)' % (
+        clients, (time.perf_counter() - start) * 1000, upstream.logins - logins))
+
+    await tunnel.stop()
+    echo_server.close()
+
+
+if __name__ == '__main__':
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.02
+    megabytes = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    clients = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        asyncio.run(main(write_config(temp_dir, latency), megabytes, clients))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Measures the workspace command against the fake ssh in benchmarks/fake_ssh: the memory and CPU taken by the
+workspace process with one session and with many idle sessions, the time to switch to another session and the
+keystroke echo latency of the session shown while the other sessions print output. The workspace runs on a
+pseudo terminal like in a terminal window.
+
+Usage: ./benchmarks/workspace_benchmark.py [sessions] [idle_seconds]
+Example: ./benchmarks/workspace_benchmark.py 60 10
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pexpect
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FAKE_SSH = os.path.join(ROOT, 'benchmarks', 'fake_ssh')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def write_config(directory, sessions):
+    servers = [{'aliases': ['ws%d' % number], 'server': 'ws%d.example.net' % number, 'username': 'demo',
+                'password': 'password', 'port': 22} for number in range(1, sessions + 1)]
+    config_file = os.path.join(directory, 'config.yaml')
+
+    with open(config_file, 'w') as file:
+        yaml.safe_dump({'servers': servers}, file)
+
+    fake_config = os.path.join(directory, 'fake_ssh.json')
+
+    with open(fake_config, 'w') as file:
+        json.dump({'default': {'latency': 0.01}}, file)
+
+    os.environ['FAKE_SSH_CONFIG'] = fake_config
+    os.environ['SERVER_AUTOMATION_CONFIG'] = config_file
+    os.environ['PATH'] = FAKE_SSH + os.pathsep + os.environ['PATH']
+
+
+def usage(pid):
+    """Get the resident memory in bytes and the CPU seconds of a process"""
+    with open('/proc/%d/statm' % pid) as file:
+        memory = int(file.read().split()[1]) * PAGE_SIZE
+
+    with open('/proc/%d/stat' % pid) as file:
+        fields = file.read().rsplit(')', 1)[1].split()
+
+    return memory, (int(fields[11]) + int(fields[12])) / TICKS
+
+
+def open_workspace():
+    workspace = pexpect.spawn(sys.executable, [os.path.join(ROOT, 'server_automation.py'), 'workspace', 'ws*',
+                                               '--parallel=20'], dimensions=(40, 160), timeout=120)
+    workspace.delaybeforesend = None
+    workspace.expect('n/p/1-9 switch')
+
+    # The output of the logins is read before measuring
+    time.sleep(1)
+    workspace.expect(pexpect.TIMEOUT, timeout=0.2)
+
+    return workspace
+
+
+def close_workspace(workspace):
+    workspace.send('\x1dd')
+    workspace.expect(pexpect.EOF)
+
+
+def echo_latencies(workspace, keystrokes):
+    results = []
+
+    for number in range(keystrokes):
+        key = chr(ord('a') + number % 26)
+        start = time.perf_counter()
+        workspace.send(key)
+        workspace.expect_exact(key)
+        results.append(time.perf_counter() - start)
+        time.sleep(0.002)
+
+    # Remove the keys typed
+    workspace.sendcontrol('u')
+
+    return results
+
+
+if __name__ == '__main__':
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    idle_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['HOME'] = directory
+
+        # One session, the base cost of the process
+        write_config(directory, 1)
+        workspace = open_workspace()
+        single_memory, _ = usage(workspace.pid)
+        close_workspace(workspace)
+
+        write_config(directory, sessions)
+        workspace = open_workspace()
+        memory, cpu = usage(workspace.pid)
+        time.sleep(idle_seconds)
+        _, idle_cpu = usage(workspace.pid)
+
+        print('{sessions} sessions: {memory:.1f} MB resident, {per:.0f} KB per session over one session, '
+              '{cpu:.3f}% CPU while idle for {idle:.0f}s'.format(
+                  sessions=sessions, memory=memory / 1e6, per=(memory - single_memory) / 1024 / max(1, sessions - 1),
+                  cpu=(idle_cpu - cpu) / idle_seconds * 100, idle=idle_seconds))
+
+        # Switch through all the sessions, every switch draws the output of the session and the status bar
+        switches = []
+
+        for number in range(2, sessions + 1):
+            start = time.perf_counter()
+            workspace.send('\x1dn')
+            workspace.expect_exact('%d*ws%d' % (number, number))
+            switches.append(time.perf_counter() - start)
+
+        switches.sort()
+        print('switch: p50 {:.2f}ms, max {:.2f}ms'.format(statistics.median(switches) * 1000, switches[-1] * 1000))
+
+        results = sorted(echo_latencies(workspace, 200))
+        print('echo with idle sessions: p50 {:.2f}ms, p99 {:.2f}ms'.format(
+            statistics.median(results) * 1000, results[int(len(results) * 0.99) - 1] * 1000))
+
+        # Every other session prints a line every 0.1 seconds
+        for number in range(1, sessions):
+            workspace.send('\x1dn')
+            workspace.expect_exact('%d*ws%d' % (number, number))
+            workspace.sendline('while true; do echo busy; sleep 0.1; done')
+
+        workspace.send('\x1dn')
+        workspace.expect_exact('%d*ws%d' % (sessions, sessions))
+        time.sleep(1)
+        workspace.expect(pexpect.TIMEOUT, timeout=0.2)
+
+        _, busy_start = usage(workspace.pid)
+        start = time.perf_counter()
+        results = sorted(echo_latencies(workspace, 200))
+        busy_memory, busy_end = usage(workspace.pid)
+
+        print('echo with {} busy sessions: p50 {:.2f}ms, p99 {:.2f}ms, {:.1f}% CPU, {:.1f} MB resident'.format(
+            sessions - 1, statistics.median(results) * 1000, results[int(len(results) * 0.99) - 1] * 1000,
+            (busy_end - busy_start) / (time.perf_counter() - start) * 100, busy_memory / 1e6))
+
+        close_workspace(workspace)
@@ -0,0 +1,75 @@
+# Bash completion of server_automation.py commands, options and aliases
+# Usage: source completion/server_automation.bash in ~/.bashrc
+#
+# Aliases are completed by alias_completion.py with python3 -S, set SERVER_AUTOMATION_PYTHON to use
+# another interpreter
+_server_automation_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+
+_server_automation_aliases() {
+    local IFS=$'\n'
+    COMPREPLY+=($("${SERVER_AUTOMATION_PYTHON:-python3}" -S "$_server_automation_dir/alias_completion.py" "$1" \
+        2>/dev/null))
+}
+
+_server_automation() {
+    local cur="${COMP_WORDS[COMP_CWORD]}"
+    local command="${COMP_WORDS[1]}"
+    COMPREPLY=()
+
+    if [[ $COMP_CWORD -eq 1 ]]; then
+        COMPREPLY=($(compgen -W "connect list pf run workspace pipeline push pull replay broker sessions check complete trace" -- "$cur"))
+        return
+    fi
+
+    if [[ $cur == -* ]]; then
+        local options
+        case "$command" in
+            connect) options="--timeout= --test= --command= --verification-code= -v --reuse --nested --trace= --reconnect
+                --keepalive= --record --record= --relay" ;;
+            run) options="--command= --parallel= --timeout= --verification-code= -v --reuse --nested --trace= --aggregate" ;;
+            pf) options="--timeout= --command= --verification-code= -v --reuse --nested --trace= --lazy --idle-timeout= --relay" ;;
+            workspace) options="--parallel= --timeout= --verification-code= -v --nested --trace=" ;;
+            push|pull) options="--parallel= --timeout= --verification-code= -v" ;;
+            pipeline) options="--parallel= --failure= --timeout= --verification-code= -v --reuse --nested --trace=" ;;
+            replay) options="--from= --speed= --idle-limit=" ;;
+            broker) options="--idle-timeout= --max-sessions=" ;;
+            check) options="--timeout= --parallel=" ;;
+        esac
+
+        COMPREPLY=($(compgen -W "$options" -- "$cur"))
+        [[ ${COMPREPLY[0]} == *= ]] && compopt -o nospace
+        return
+    fi
+
+    case "$command" in
+        connect|run|workspace|check|trace)
+            _server_automation_aliases "$cur"
+            ;;
+        pf)
+            # Forwards are local_port alias:port, the alias is completed after the local port
+            if [[ ${COMP_WORDS[COMP_CWORD-1]} =~ ^[0-9]+$ && $cur != *:* ]]; then
+                _server_automation_aliases "$cur"
+                COMPREPLY=("${COMPREPLY[@]/%/:}")
+                compopt -o nospace
+            fi
+            ;;
+        push|pull)
+            # push local_file remote_path alias... and pull remote_file local_dir alias...
+            if [[ $COMP_CWORD -ge 4 ]]; then
+                _server_automation_aliases "$cur"
+            elif [[ $COMP_CWORD -eq 2 && $command == push ]]; then
+                COMPREPLY=($(compgen -f -- "$cur"))
+            elif [[ $COMP_CWORD -eq 3 && $command == pull ]]; then
+                COMPREPLY=($(compgen -d -- "$cur"))
+            fi
+            ;;
+        replay)
+            COMPREPLY=($(compgen -f -- "$cur"))
+            ;;
+        sessions)
+            [[ $COMP_CWORD -eq 2 ]] && COMPREPLY=($(compgen -W "close stop" -- "$cur"))
+            ;;
+    esac
+}
+
+complete -F _server_automation server_automation.py ./server_automation.py server_automation
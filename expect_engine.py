@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+import functools
+import re
+import time
+
+import pexpect
+
+# A pattern is literal when it only has plain characters and escaped special characters
+LITERAL_PATTERN = re.compile(r'(?:\\[^A-Za-z0-9]|[^\\.^$*+?{}\[\]|()])*')
+ESCAPED_CHARACTER = re.compile(r'\\([^A-Za-z0-9])')
+
+
+class PatternSet:
+    """
+    A list of expected patterns compiled once. Sets made only of literal strings are searched with
+    bytes.find instead of regular expressions
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.literal = all(LITERAL_PATTERN.fullmatch(pattern) for pattern in self.patterns)
+
+        if self.literal:
+            self.needles = [ESCAPED_CHARACTER.sub(r'\1', pattern).encode() for pattern in self.patterns]
+            self.compiled = None
+
+            # A match can start at most this many bytes before the data that has not been searched yet
+            self.lookback = max(len(needle) for needle in self.needles) - 1
+        else:
+            self.needles = None
+            self.compiled = [re.compile(pattern.encode(), re.DOTALL) for pattern in self.patterns]
+            self.lookback = ExpectEngine.SEARCH_WINDOW
+
+    def search(self, data, position):
+        """
+        Find the earliest match in data starting from position. Ties go to the first pattern
+        :return: tuple of the pattern index, start, end and match object or None
+        """
+        best = None
+
+        if self.literal:
+            for index, needle in enumerate(self.needles):
+                start = data.find(needle, position)
+
+                if start >= 0 and (best is None or start < best[1]):
+                    best = (index, start, start + len(needle), bytes(needle))
+        else:
+            for index, pattern in enumerate(self.compiled):
+                match = pattern.search(data, position)
+
+                if match is not None and (best is None or match.start() < best[1]):
+                    best = (index, match.start(), match.end(), match)
+
+        return best
+
+
+@functools.lru_cache(maxsize=256)
+def compile_patterns(patterns):
+    """
+    Get the compiled version of a tuple of patterns
+    :param patterns: tuple of pattern strings
+    :return: PatternSet
+    """
+    return PatternSet(patterns)
+
+
+class ExpectEngine:
+    """
+    Replacement for pexpect's expect that only searches the data that has not been searched yet and
+    keeps a bounded amount of the output received before the match.
+
+    Only the public attributes of the controller are used: buffer, before, after, match and match_index are
+    updated like pexpect does, so the engine can be mixed with read_nonblocking, send and interact. The
+    private state pexpect's own expect keeps between calls is not updated, an engine should be the only
+    one waiting for output on a controller.
+    """
+    # Regular expressions must match within this many bytes
+    SEARCH_WINDOW = 8192
+
+    # Bytes of output kept in the before attribute. None keeps everything
+    RETAIN = 65536
+
+    READ_SIZE = 65536
+
+    def __init__(self, search_window=SEARCH_WINDOW, retain=RETAIN):
+        self.search_window = search_window
+        self.retain = retain
+        self.last_match_seconds = None
+        self.last_pattern = None
+
+    def expect(self, controller, patterns, timeout, retain=-1):
+        """
+        Wait for one of the patterns to be received
+        :param controller: pexpect spawn
+        :param patterns: list of pattern strings
+        :param timeout: Time in seconds to wait for a match
+        :param retain: Bytes of output to keep in before, -1 uses the engine default and None keeps everything
+        :return: the index of the pattern matched
+        """
+        pattern_set = compile_patterns(tuple(patterns))
+        lookback = pattern_set.lookback if pattern_set.literal else self.search_window
+        retain = self.retain if retain == -1 else retain
+
+        started = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # Start with the data pexpect already read but did not match
+        data = bytearray(controller.buffer)
+        controller.buffer = b''
+        before = bytearray()
+        scanned = 0
+
+        try:
+            while True:
+                found = pattern_set.search(data, max(0, scanned - lookback))
+
+                if found is not None:
+                    index, start, end, match = found
+
+                    before += data[:start]
+
+                    if retain is not None and len(before) > retain:
+                        del before[:len(before) - retain]
+
+                    controller.before = bytes(before)
+                    controller.after = bytes(data[start:end])
+                    controller.match = match
+                    controller.match_index = index
+
+                    # Keep what follows the match for the next expect
+                    controller.buffer = bytes(data[end:])
+
+                    self.last_pattern = patterns[index]
+                    return index
+
+                # Move the searched data out of the window
+                keep_from = max(0, len(data) - lookback)
+                before += data[:keep_from]
+                del data[:keep_from]
+
+                if retain is not None and len(before) > retain:
+                    del before[:len(before) - retain]
+
+                scanned = len(data)
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+
+                if remaining is not None and remaining <= 0:
+                    raise pexpect.TIMEOUT('Timeout exceeded.')
+
+                data += controller.read_nonblocking(self.READ_SIZE, remaining)
+        except (pexpect.EOF, pexpect.TIMEOUT) as error:
+            before += data
+            controller.before = bytes(before)
+            controller.after = type(error)
+            controller.match = None
+            self.last_pattern = None
+            raise
+        finally:
+            self.last_match_seconds = time.perf_counter() - started
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import re
+import shlex
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from server_management import ServerManagementError
+
+ASKPASS_PROGRAM = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'askpass.py')
+
+# Remote side of a push. It prints the size of the remote file and the checksum of every complete chunk,
+# reads the offset to resume from, truncates the file there and appends the data sent until the end of the
+# input. The checksum of the data appended, computed while writing it, and the size of the file are printed last
+PUSH_SCRIPT = """
+P=%(path)s
+C=%(chunk_size)d
+[ -d "$P" ] && P="$P"/%(name)s
+if command -v sha256sum >/dev/null 2>&1; then H=sha256sum; else H='shasum -a 256'; fi
+S=0
+[ -f "$P" ] && S=$(wc -c < "$P")
+echo "size $((S))"
+I=0
+while [ $(((I + 1) * C)) -le $((S)) ]; do
+    echo "chunk $I $(dd if="$P" bs=$C skip=$I count=1 2>/dev/null | $H | cut -c1-64)"
+    I=$((I + 1))
+done
+echo ready
+read O
+dd if=/dev/null of="$P" bs=1 seek="$O" 2>/dev/null || { echo "Cannot write $P" >&2; exit 1; }
+echo "done $(tee -a "$P" | $H | cut -c1-64) $(($(wc -c < "$P")))"
+"""
+
+# Remote side of a pull. It prints the size of the remote file, reads the size of the local file and prints
+# the checksum of every complete chunk of both, reads the offset to resume from and sends the file from
+# there up to the size printed. The data is read once and hashed through a fifo while it is sent, the
+# checksum of the data sent and the size of the file are printed last
+PULL_SCRIPT = """
+P=%(path)s
+C=%(chunk_size)d
+[ -f "$P" ] || { echo "No such file: $P" >&2; exit 1; }
+if command -v sha256sum >/dev/null 2>&1; then H=sha256sum; else H='shasum -a 256'; fi
+S=$(wc -c < "$P")
+echo "size $((S))"
+read L
+I=0
+while [ $(((I + 1) * C)) -le $((S)) ] && [ $(((I + 1) * C)) -le $L ]; do
+    echo "chunk $I $(dd if="$P" bs=$C skip=$I count=1 2>/dev/null | $H | cut -c1-64)"
+    I=$((I + 1))
+done
+echo ready
+read O
+D=$(mktemp -d) && mkfifo "$D/data" || { echo "Cannot create a fifo" >&2; exit 1; }
+trap 'rm -rf "$D"' EXIT
+$H < "$D/data" > "$D/checksum" &
+tail -c +$((O + 1)) "$P" | head -c $((S - O)) | tee "$D/data"
+wait
+echo "done $(cut -c1-64 "$D/checksum") $((S))"
+"""
+
+
+class AskpassServer:
+    """
+    Answers the password and verification code prompts of an ssh process started with SSH_ASKPASS=askpass.py,
+    over a unix socket only the current user can open
+    """
+
+    def __init__(self, management, route):
+        self.management = management
+        self.route = route
+        self.answered = set()
+        self.coded = set()
+        self.directory = tempfile.mkdtemp(prefix='server-automation-')
+        self.path = os.path.join(self.directory, 'askpass.sock')
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen(8)
+
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def answer(self, prompt):
+        """
+        Get the answer of a prompt
+        :return: the answer, None if the prompt is not known
+        """
+        for position, hop in enumerate(self.route.hops):
+            if re.search(self.route.password_prompt(hop), prompt):
+                self.answered.add(position)
+                return str(hop['password'])
+
+        # Verification code prompts do not name the server, they are for the first server not given one yet
+        if self.management.VERIFICATION_CODE_TEXT in prompt:
+            for position, hop in enumerate(self.route.hops):
+                if hop.get('requireVerificationCode') and position not in self.coded:
+                    self.coded.add(position)
+                    return self.management.verification_code(hop)
+
+            return self.management.VERIFICATION_CODE
+
+        # Prompts that do not name the server are for the first server not answered yet
+        if self.management.PASSWORD_TEXT in prompt:
+            for position, hop in enumerate(self.route.hops):
+                if position not in self.answered:
+                    self.answered.add(position)
+                    return str(hop['password'])
+
+        return None
+
+    def serve(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+
+            with client:
+                try:
+                    prompt = client.makefile('rb').readline().decode('utf-8', 'replace')
+                    answer = self.answer(prompt)
+
+                    if answer is not None:
+                        client.sendall(answer.encode())
+                except (OSError, ServerManagementError):
+                    pass
+
+    def close(self):
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        self.server.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class FileTransfer:
+    """
+    Streams a file to or from a server over one ssh -J command through its whole route, without copying it
+    to the proxy servers. Files are compared in chunks by checksum before the transfer so that a partial
+    file is resumed from its first chunk that differs. The checksum of the data sent is verified after it,
+    so that every byte of the file was either compared in a chunk or verified once sent.
+    """
+    CHUNK_SIZE = 32 * 1024 * 1024
+    READ_SIZE = 1024 * 1024
+
+    def __init__(self, management, alias, server_details, chunk_size=CHUNK_SIZE):
+        """
+        :param management: ServerManagement, non interactive
+        :param alias: The alias of the server
+        :param server_details: The server details from the config file
+        :param chunk_size: Bytes of the chunks compared to resume partial files
+        """
+        self.management = management
+        self.alias = alias
+        self.server_details = server_details
+        self.chunk_size = chunk_size
+        self.process = None
+        self.askpass = None
+        self.errors = []
+        self.error_reader = None
+
+    @staticmethod
+    def quote_remote_path(path):
+        """Quote a remote path for the shell, keeping the ~ of the home directory"""
+        if path == '~':
+            return '"$HOME"'
+
+        if path.startswith('~/'):
+            return '"$HOME"/' + shlex.quote(path[2:])
+
+        return shlex.quote(path)
+
+    def start(self, script, **values):
+        """
+        Log into the server with ssh and run a script, the passwords are answered by an askpass server
+        """
+        management = self.management
+        route = management.get_route(self.server_details)
+        management.check_reachable(route)
+
+        for hop in route.hops:
+            management.requires_verification_code(hop)
+
+        self.askpass = AskpassServer(management, route)
+
+        command = shlex.split(route.ssh_command(management.ssh_options('-T')))
+        command.append('sh -c %s' % shlex.quote(script % dict(values, chunk_size=self.chunk_size)))
+
+        environment = dict(os.environ, SSH_ASKPASS=ASKPASS_PROGRAM, SSH_ASKPASS_REQUIRE='force',
+                           SERVER_AUTOMATION_ASKPASS=self.askpass.path)
+        environment.setdefault('DISPLAY', ':0')
+
+        # Without a controlling terminal ssh asks the askpass program
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, env=environment, start_new_session=True)
+
+        self.error_reader = threading.Thread(target=self.read_errors, daemon=True)
+        self.error_reader.start()
+
+        # Stop if the login does not finish in time
+        timeout = sum(hop.get('timeout', management.APP_TIMEOUT) for hop in route.hops)
+        timer = threading.Timer(timeout, self.process.kill)
+        timer.start()
+
+        try:
+            size = int(self.read_line('size'))
+        finally:
+            timer.cancel()
+
+        return size
+
+    def read_errors(self):
+        for line in self.process.stderr:
+            self.errors.append(line.decode('utf-8', 'replace').strip())
+
+    def read_line(self, *names):
+        """
+        Read a line of the remote script
+        :param names: The accepted first words of the line
+        :return: the rest of the line
+        """
+        line = self.process.stdout.readline().decode('utf-8', 'replace').split()
+
+        if not line or line[0] not in names:
+            raise ServerManagementError(self.remote_error())
+
+        return ' '.join(line[1:])
+
+    def matching_prefix(self, file, size):
+        """
+        Read the checksums of the complete chunks of the remote file and compare them with the local file
+        :param file: The local file, read from its start
+        :param size: The size of the local file
+        :return: the offset of the first chunk that differs, where the transfer resumes
+        """
+        offset = 0
+        matching = True
+
+        while True:
+            line = self.read_line('chunk', 'ready').split()
+
+            if not line:
+                return offset
+
+            # Once a chunk differs the chunks after it are sent again
+            if not matching or offset + self.chunk_size > size:
+                matching = False
+                continue
+
+            data = file.read(self.chunk_size)
+
+            if hashlib.sha256(data).hexdigest() != line[1]:
+                matching = False
+                continue
+
+            offset += len(data)
+
+    def remote_error(self):
+        """
+        Stop ssh and get the last error it printed
+        :return: the error
+        """
+        if self.process.poll() is None:
+            self.process.kill()
+
+        self.process.wait()
+        self.error_reader.join(1)
+        error = next((error for error in reversed(self.errors) if error), None)
+
+        return error or 'The connection was closed, ssh exited with %s' % self.process.returncode
+
+    def finish(self, hasher, size, result):
+        """
+        Read the checksum of the data sent and the size of the remote file and compare them
+        :param hasher: Checksum of the data sent
+        :param size: The size of the file
+        """
+        checksum, remote_size = (self.read_line('done').split() + [None])[:2]
+        self.process.wait()
+
+        if checksum != hasher.hexdigest() or remote_size != str(size):
+            raise ServerManagementError('The checksum of the file does not match, run the transfer again to resend '
+                                        'the chunks that differ')
+
+        result['checksum'] = checksum
+
+    def transfer(self, method, *arguments):
+        """
+        Run a push or a pull
+        :return: dictionary with the alias, server, bytes sent, bytes skipped, seconds taken and error if any
+        """
+        result = {'alias': self.alias, 'server': self.server_details['server'], 'bytes': 0, 'skipped': 0,
+                  'seconds': None, 'checksum': None, 'error': None}
+        start = time.perf_counter()
+
+        try:
+            method(result, *arguments)
+        except ServerManagementError as error:
+            result['error'] = str(error)
+        except BrokenPipeError:
+            result['error'] = self.remote_error()
+        except OSError as error:
+            result['error'] = str(error)
+        except Exception as error:
+            result['error'] = repr(error)
+        finally:
+            self.close()
+
+        result['seconds'] = time.perf_counter() - start
+
+        return result
+
+    def push(self, local_path, remote_path):
+        return self.transfer(self.push_file, local_path, remote_path)
+
+    def pull(self, remote_path, local_path):
+        return self.transfer(self.pull_file, remote_path, local_path)
+
+    def push_file(self, result, local_path, remote_path):
+        name = os.path.basename(local_path)
+
+        if remote_path.endswith('/'):
+            remote_path += name
+
+        with open(local_path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            self.start(PUSH_SCRIPT, path=self.quote_remote_path(remote_path), name=shlex.quote(name))
+
+            offset = self.matching_prefix(file, size)
+
+            self.process.stdin.write(b'%d\n' % offset)
+            file.seek(offset)
+            hasher = hashlib.sha256()
+
+            while True:
+                data = file.read(self.READ_SIZE)
+
+                if not data:
+                    break
+
+                hasher.update(data)
+                self.process.stdin.write(data)
+
+            self.process.stdin.close()
+
+        result['bytes'], result['skipped'] = size - offset, offset
+        self.finish(hasher, size, result)
+
+    def pull_file(self, result, remote_path, local_path):
+        os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+
+        with open(local_path, 'a+b') as file:
+            local_size = os.fstat(file.fileno()).st_size
+            file.seek(0)
+
+            size = self.start(PULL_SCRIPT, path=self.quote_remote_path(remote_path))
+            self.process.stdin.write(b'%d\n' % local_size)
+            self.process.stdin.flush()
+
+            offset = self.matching_prefix(file, min(size, local_size))
+
+            self.process.stdin.write(b'%d\n' % offset)
+            self.process.stdin.close()
+
+            file.truncate(offset)
+            file.seek(offset)
+            hasher = hashlib.sha256()
+            remaining = size - offset
+
+            while remaining > 0:
+                data = self.process.stdout.read(min(self.READ_SIZE, remaining))
+
+                if not data:
+                    break
+
+                hasher.update(data)
+                file.write(data)
+                remaining -= len(data)
+
+        result['bytes'], result['skipped'] = size - offset, offset
+        self.finish(hasher, size, result)
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+        if self.askpass is not None:
+            self.askpass.close()
+            self.askpass = None
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+import asyncio
+import socket
+
+from server_management import ServerManagementError
+
+
+class Upstream:
+    """The chain of logins forwarding the ports of one server. It is opened when the first client connects"""
+
+    def __init__(self, alias, server_details, forwards):
+        self.alias = alias
+        self.server_details = server_details
+        self.forwards = forwards
+        self.internal_ports = {}
+        self.worker = None
+        self.opening = None
+        self.closing = None
+        self.connections = 0
+        self.logins = 0
+
+    def is_open(self):
+        return self.worker is not None and self.worker.controller is not None and self.worker.controller.isalive()
+
+
+class LazyTunnel:
+    """
+    Listens on the local ports of the port forwards itself and only logs into the servers when a client
+    connects. The chain of a server forwards its ports to internal local ports and the clients are relayed
+    to them, so all the clients of a server share one chain. The chain is closed once no client has been
+    connected for the idle timeout and opened again by the next client.
+    """
+    IDLE_TIMEOUT = 300
+    READ_SIZE = 65536
+
+    # Time in seconds to wait for the forwarded port of a new chain to accept connections
+    CONNECT_TIMEOUT = 2
+
+    def __init__(self, management, forwards, idle_timeout=IDLE_TIMEOUT, bind_address='localhost'):
+        """
+        :param management: ServerManagement used to create the sessions logging into the servers
+        :param forwards: list of (local_port, alias, destination_port) tuples
+        :param idle_timeout: Seconds without clients after which the chain of a server is closed
+        """
+        self.management = management
+        self.idle_timeout = idle_timeout
+        self.bind_address = bind_address
+        self.upstreams = {}
+        self.listeners = []
+        self.idle_handles = {}
+
+        for local_port, alias, destination_port in forwards:
+            details = management.get_server_details(alias)
+            upstream = self.upstreams.setdefault(id(details), Upstream(alias, details, []))
+            upstream.forwards.append((int(local_port), int(destination_port)))
+
+    @staticmethod
+    def free_port():
+        """Get a local port that is not in use"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+            probe.bind(('localhost', 0))
+            return probe.getsockname()[1]
+
+    async def start(self):
+        """Listen on the local port of every forward"""
+        for upstream in self.upstreams.values():
+            for local_port, _ in upstream.forwards:
+                self.listeners.append(await asyncio.start_server(
+                    lambda reader, writer, upstream=upstream, local_port=local_port:
+                    self.handle_client(reader, writer, upstream, local_port),
+                    self.bind_address, local_port))
+
+                self.management.log("🔥 Listening on localhost:{} for {}, the servers are logged into when a "
+                                    "client connects".format(local_port, upstream.alias))
+
+    async def serve(self):
+        """Serve the clients until cancelled"""
+        await self.start()
+
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Stop listening and close all the chains"""
+        for listener in self.listeners:
+            listener.close()
+
+        for upstream in self.upstreams.values():
+            await self.close(upstream)
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def handle_client(self, reader, writer, upstream, local_port):
+        upstream.connections += 1
+        handle = self.idle_handles.pop(id(upstream), None)
+
+        if handle is not None:
+            handle.cancel()
+
+        upstream_writer = None
+
+        try:
+            await self.open(upstream)
+            upstream_reader, upstream_writer = await self.connect(upstream.internal_ports[local_port])
+
+            await asyncio.gather(self.pipe(reader, upstream_writer), self.pipe(upstream_reader, writer))
+        except (ServerManagementError, OSError) as error:
+            self.management.log("🧊 {} (localhost:{}): {}".format(upstream.alias, local_port, error))
+        finally:
+            writer.close()
+
+            if upstream_writer is not None:
+                upstream_writer.close()
+
+            upstream.connections -= 1
+
+            if not upstream.connections:
+                self.idle_handles[id(upstream)] = asyncio.get_running_loop().call_later(
+                    self.idle_timeout, lambda: asyncio.ensure_future(self.close_idle(upstream)))
+
+    async def open(self, upstream):
+        """Log into the chain of a server unless it is open, the clients arriving meanwhile wait for the same login"""
+        if upstream.closing is not None:
+            await upstream.closing
+
+        if upstream.is_open():
+            return
+
+        if upstream.opening is None:
+            upstream.opening = asyncio.get_running_loop().run_in_executor(None, self.login, upstream)
+
+        try:
+            await asyncio.shield(upstream.opening)
+        finally:
+            if upstream.opening is not None and upstream.opening.done():
+                upstream.opening = None
+
+    def login(self, upstream):
+        """Log into the servers and forward the ports to new internal ports. Runs in a thread"""
+        upstream.internal_ports = {local_port: self.free_port() for local_port, _ in upstream.forwards}
+
+        worker = self.management.new_worker()
+
+        self.management.log("🥁 Logging into {} for a client".format(upstream.alias))
+
+        try:
+            worker.server_port_forwards(upstream.server_details, [
+                (upstream.internal_ports[local_port], destination_port)
+                for local_port, destination_port in upstream.forwards], control=False)
+        except Exception:
+            if worker.controller is not None:
+                worker.controller.close(force=True)
+            raise
+
+        upstream.worker = worker
+        upstream.logins += 1
+
+    async def connect(self, port):
+        """Connect to a forwarded port, waiting for ssh to start listening on it"""
+        deadline = asyncio.get_running_loop().time() + self.CONNECT_TIMEOUT
+
+        while True:
+            try:
+                return await asyncio.open_connection('localhost', port)
+            except OSError:
+                if asyncio.get_running_loop().time() > deadline:
+                    raise
+
+                await asyncio.sleep(0.02)
+
+    async def pipe(self, reader, writer):
+        """Copy the data of one side to the other until it is closed"""
+        try:
+            while True:
+                data = await reader.read(self.READ_SIZE)
+
+                if not data:
+                    break
+
+                writer.write(data)
+                await writer.drain()
+
+            if writer.can_write_eof():
+                writer.write_eof()
+        except OSError:
+            writer.close()
+
+    async def close_idle(self, upstream):
+        self.idle_handles.pop(id(upstream), None)
+
+        if not upstream.connections and upstream.is_open():
+            self.management.log("🧊 Closing the chain of {}, it has been idle for {}s".format(
+                upstream.alias, self.idle_timeout))
+
+            await self.close(upstream)
+
+    async def close(self, upstream):
+        """Close the chain of a server"""
+        worker, upstream.worker = upstream.worker, None
+
+        if worker is None or worker.controller is None:
+            return
+
+        upstream.closing = asyncio.get_running_loop().run_in_executor(None, worker.controller.close, True)
+
+        try:
+            await upstream.closing
+        finally:
+            upstream.closing = None
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+
+
+class Tracer:
+    """
+    Collects timing spans of the logins. A span has a name (hop, phase or expect), its start time,
+    its duration and attributes such as the alias, server, hop number and phase.
+
+    The spans can be written as JSON lines and the hop and phase spans are appended to a history file
+    used to report the p50 and p95 latency of every server across runs.
+    """
+    # Spans kept in the history file
+    HISTORY_SPANS = ('hop', 'phase')
+
+    # Lines kept in the history file
+    HISTORY_LIMIT = 20000
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def record(self, name, start, duration, keep=True, **attributes):
+        """
+        Record a span
+        :param name: The span name
+        :param start: Epoch time the span started
+        :param duration: Duration of the span in seconds
+        :param keep: Add the span to the spans collected, a span not kept can still be added with add
+        :param attributes: Other values describing the span
+        :return: the span, which can still be updated
+        """
+        span = {'name': name, 'start': round(start, 6), 'duration_ms': round(duration * 1000, 3)}
+        span.update(attributes)
+
+        if keep:
+            self.add(span)
+
+        return span
+
+    def add(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """
+        Record a span for the duration of a with block. The attributes can be updated inside the block
+        """
+        start = time.time()
+        started = time.perf_counter()
+
+        try:
+            yield attributes
+        finally:
+            self.record(name, start, time.perf_counter() - started, **attributes)
+
+    def write(self, path):
+        """Write all the spans as JSON lines"""
+        with self.lock:
+            spans = list(self.spans)
+
+        with open(path, 'a') as file:
+            for span in spans:
+                file.write(json.dumps(span) + '\n')
+
+    def append_history(self, path):
+        """Append the hop and phase spans to the history file, keeping the last HISTORY_LIMIT lines"""
+        with self.lock:
+            spans = [span for span in self.spans if span['name'] in self.HISTORY_SPANS]
+
+        if not spans:
+            return
+
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+
+        with open(path, 'a') as file:
+            for span in spans:
+                file.write(json.dumps(span) + '\n')
+
+        # Trim the history once it is well over the limit so that it is not rewritten on every run
+        if os.path.getsize(path) > self.HISTORY_LIMIT * 300:
+            with open(path) as file:
+                lines = file.readlines()[-self.HISTORY_LIMIT:]
+
+            with open(path, 'w') as file:
+                file.writelines(lines)
+
+    @staticmethod
+    def percentile(values, percent):
+        """Nearest rank percentile of a sorted list"""
+        rank = max(0, math.ceil(percent / 100.0 * len(values)) - 1)
+        return values[min(rank, len(values) - 1)]
+
+    @classmethod
+    def summary(cls, path):
+        """
+        Get the latency of every server and phase recorded in the history file
+        :return: list of dictionaries with the alias, server, phase, count, p50 and p95 in milliseconds
+        """
+        durations = {}
+        aliases = {}
+
+        with open(path) as file:
+            for line in file:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+
+                server = span.get('server')
+
+                if span.get('alias'):
+                    aliases[server] = span['alias']
+
+                phase = span.get('phase', 'total') if span['name'] == 'phase' else 'total'
+                durations.setdefault((server, phase), []).append(span['duration_ms'])
+
+        rows = []
+
+        for (server, phase), values in durations.items():
+            values.sort()
+            rows.append({'alias': aliases.get(server, ''), 'server': server, 'phase': phase, 'count': len(values),
+                         'p50': cls.percentile(values, 50), 'p95': cls.percentile(values, 95)})
+
+        # Slowest servers first
+        totals = {row['server']: row['p95'] for row in rows if row['phase'] == 'total'}
+
+        return sorted(rows, key=lambda row: (-totals.get(row['server'], 0), str(row['server']),
+                                             row['phase'] != 'total', row['phase']))
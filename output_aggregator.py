@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+
+class OutputGroup:
+    """
+    The servers whose command gave the same output and exit status, with one copy of the output until it is
+    released
+    """
+
+    def __init__(self, number, exit_status, error, size, data, path):
+        self.number = number
+        self.exit_status = exit_status
+        self.error = error
+        self.size = size
+        self.data = data
+        self.path = path
+        self.hosts = []
+
+    def chunks(self, size=65536):
+        """Get the output in parts, read from its file when it was spilled to disk"""
+        if self.path is None:
+            yield self.data.decode('utf-8', 'replace')
+            return
+
+        import codecs
+
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+        with open(self.path, 'rb') as file:
+            while True:
+                data = file.read(size)
+
+                if not data:
+                    break
+
+                yield decoder.decode(data)
+
+        yield decoder.decode(b'', final=True)
+
+    def release(self):
+        """Drop the output once it was shown, removing its file when it was spilled to disk"""
+        self.data = b''
+
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+            self.path = None
+
+
+class OutputCollector:
+    """
+    Receives the output of the command of one server, hashing it as it arrives. The output is kept in memory
+    up to the memory limit and written to a file in the spill folder after that
+    """
+
+    def __init__(self, alias, server, spill_dir, memory_limit):
+        self.alias = alias
+        self.server = server
+        self.spill_dir = spill_dir
+        self.memory_limit = memory_limit
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.data = bytearray()
+        self.file = None
+        self.path = None
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.hash.update(data)
+        self.size += len(data)
+
+        if self.file is not None:
+            self.file.write(data)
+            return
+
+        self.data += data
+
+        if len(self.data) > self.memory_limit:
+            descriptor, self.path = tempfile.mkstemp(prefix='output-', dir=self.spill_dir)
+            self.file = os.fdopen(descriptor, 'wb')
+            self.file.write(self.data)
+            self.data = bytearray()
+
+    def close(self, keep=False):
+        """
+        Stop receiving the output
+        :param keep: Keep the spilled file of the output, it is removed otherwise
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+            if not keep:
+                os.remove(self.path)
+                self.path = None
+
+
+class OutputAggregator:
+    """
+    Groups the servers a command was run on by the output and exit status of the command, so that an output
+    most servers share is shown once with the list of its servers. Every output is hashed while it arrives and
+    only the first output of every group is kept, in memory when it is small and in a file of a temporary
+    folder otherwise, until the group is shown and released. Only the hash, size and servers of every group
+    stay after that, so the memory and disk taken do not grow with the size of the outputs even when every
+    server gives a different one. Servers that failed before the command finished are grouped by their error.
+    """
+    # Bytes of an output kept in memory, larger outputs are written to the spill folder
+    MEMORY_LIMIT = 65536
+
+    def __init__(self, spill_dir=None, memory_limit=MEMORY_LIMIT):
+        """
+        :param spill_dir: Folder the temporary folder of the large outputs is created in, the system one if None
+        :param memory_limit: Bytes of an output kept in memory
+        """
+        self.spill_dir = tempfile.mkdtemp(prefix='server_automation-', dir=spill_dir)
+        self.memory_limit = memory_limit
+        self.groups = []
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    def collector(self, alias, server):
+        """Get the collector of the output of a server"""
+        return OutputCollector(alias, server, self.spill_dir, self.memory_limit)
+
+    def finish(self, collector, exit_status=None, error=None):
+        """
+        Add a server to the group of its output once its command finished or failed
+        :param collector: The collector the output of the server was written to
+        :param exit_status: The exit status of the command, None if it failed
+        :param error: The reason the command failed, the output of the server is not grouped then
+        :return: the group and True if the server is the first one of the group
+        """
+        key = ('error', error) if error is not None else (exit_status, collector.size, collector.hash.digest())
+
+        with self.lock:
+            group = self.keys.get(key)
+            first = group is None
+
+            if first:
+                collector.close(keep=error is None)
+                group = OutputGroup(len(self.groups) + 1, exit_status, error, collector.size,
+                                    bytes(collector.data) if error is None else b'', collector.path)
+                self.groups.append(group)
+                self.keys[key] = group
+            else:
+                collector.close()
+
+            group.hosts.append(collector.alias)
+
+        return group, first
+
+    def close(self):
+        """Remove the spilled outputs"""
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+import threading
+
+from alias_registry import ConfigError
+from server_management import ServerManagementError
+
+
+class SessionPool:
+    """
+    Logged in sessions shared by the steps of a pipeline. A session is used by one command at a time and is
+    kept after it so that the next step on the same server does not log in again
+    """
+
+    def __init__(self, management):
+        self.management = management
+        self.idle = {}
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def acquire(self, server_details):
+        """
+        Get an idle session logged into a server, logging in a new one when there is none
+        :return: ServerManagement
+        """
+        with self.lock:
+            idle = self.idle.get(id(server_details))
+
+            if idle:
+                return idle.pop()
+
+        worker = self.management.new_worker()
+
+        with self.lock:
+            self.sessions.append(worker)
+
+        worker.server_login(server_details)
+
+        return worker
+
+    def release(self, server_details, worker):
+        with self.lock:
+            self.idle.setdefault(id(server_details), []).append(worker)
+
+    def discard(self, worker):
+        """Close a session left in an unknown state, such as after a command timed out"""
+        if worker.controller is not None:
+            worker.controller.close(force=True)
+
+    def close(self):
+        for worker in self.sessions:
+            self.discard(worker)
+
+
+class Pipeline:
+    """
+    Runs the steps of a job from the jobs section of the config file. Every step runs a command on the servers
+    matching its aliases, at most concurrency of them at the same time, once all the steps it needs succeeded.
+    Steps that do not depend on each other run at the same time.
+
+    jobs:
+      deploy:
+        failure: fail-fast          # or continue
+        steps:
+          - name: drain
+            aliases: ['web*']
+            command: ./drain.sh
+            concurrency: 1
+          - name: migrate
+            aliases: [db1]
+            command: ./migrate.sh
+          - name: release
+            aliases: ['web*']
+            command: ./release.sh
+            needs: [drain, migrate]
+            concurrency: 2
+
+    With fail-fast no command is started once one fails, with continue only the steps that need a failed
+    step are skipped.
+    """
+    FAIL_FAST = 'fail-fast'
+    CONTINUE = 'continue'
+    FAILURE_POLICIES = [FAIL_FAST, CONTINUE]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STOPPED = 'stopped'
+    SKIPPED = 'skipped'
+
+    def __init__(self, management, name, steps, failure=FAIL_FAST):
+        """
+        :param management: ServerManagement
+        :param name: The name of the job
+        :param steps: list of validated steps
+        :param failure: The failure policy
+        """
+        self.management = management
+        self.name = name
+        self.steps = steps
+        self.failure = failure
+        self.states = {step['name']: self.PENDING for step in steps}
+        self.results = []
+
+    @classmethod
+    def load(cls, management, name):
+        """
+        Get the pipeline of a job from the config file
+        :raise ConfigError: if the job does not exist or is not valid
+        """
+        jobs = management.get_registry().config.get('jobs') or {}
+
+        if name not in jobs:
+            raise ConfigError('No job with the name: \'{}\' in the jobs section of the config file'.format(name))
+
+        job = jobs[name]
+
+        if not isinstance(job, dict) or not isinstance(job.get('steps'), list) or not job['steps']:
+            raise ConfigError('The job \'{}\' has no steps'.format(name))
+
+        failure = job.get('failure', cls.FAIL_FAST)
+
+        if failure not in cls.FAILURE_POLICIES:
+            raise ConfigError('The failure of the job \'{}\' must be one of: {}'.format(
+                name, ', '.join(cls.FAILURE_POLICIES)))
+
+        return cls(management, name, cls.validate(name, job['steps']), failure)
+
+    @staticmethod
+    def validate(job, items):
+        """
+        Check the steps of a job and that their needs do not create a cycle
+        :return: list of steps, every step needed by a step comes before it
+        """
+        steps = {}
+
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ConfigError('Step number {} of the job \'{}\' is not valid'.format(position + 1, job))
+
+            step = dict(item)
+            step['name'] = str(step.get('name', position + 1))
+            step['aliases'] = [str(alias) for alias in step.get('aliases') or []]
+            step['needs'] = [str(need) for need in step.get('needs') or []]
+
+            if step['name'] in steps:
+                raise ConfigError('The step \'{}\' of the job \'{}\' is defined twice'.format(step['name'], job))
+
+            if not step['aliases'] or not step.get('command'):
+                raise ConfigError('The step \'{}\' of the job \'{}\' needs aliases and a command'.format(
+                    step['name'], job))
+
+            try:
+                step['concurrency'] = max(1, int(step['concurrency'])) if step.get('concurrency') else None
+            except (TypeError, ValueError):
+                raise ConfigError('The concurrency of the step \'{}\' of the job \'{}\' must be a number'.format(
+                    step['name'], job))
+
+            steps[step['name']] = step
+
+        for step in steps.values():
+            for need in step['needs']:
+                if need not in steps:
+                    raise ConfigError('The step \'{}\' of the job \'{}\' needs the step \'{}\' which does not '
+                                      'exist'.format(step['name'], job, need))
+
+        # Order the steps so that the steps they need come first
+        ordered = []
+        done = set()
+
+        while len(ordered) < len(steps):
+            ready = [step for step in steps.values()
+                     if step['name'] not in done and all(need in done for need in step['needs'])]
+
+            if not ready:
+                raise ConfigError('The needs of the steps of the job \'{}\' create a cycle: {}'.format(
+                    job, ', '.join(name for name in steps if name not in done)))
+
+            for step in ready:
+                ordered.append(step)
+                done.add(step['name'])
+
+        return ordered
+
+    def run_step_on_server(self, pool, step, alias, server_details):
+        """
+        Run the command of a step on a server over a pooled session
+        :return: dictionary with the step, alias, server, exit status, output and error if any
+        """
+        management = self.management
+        timeout = step.get('timeout', server_details.get('timeout', management.APP_TIMEOUT))
+
+        if management.REUSE_SESSION:
+            result = management.run_on_broker(alias, dict(server_details, timeout=timeout), step['command'])
+            result['step'] = step['name']
+
+            return result
+
+        result = {'step': step['name'], 'alias': alias, 'server': server_details['server'], 'exit_status': None,
+                  'output': '', 'error': None}
+        worker = None
+
+        try:
+            worker = pool.acquire(server_details)
+            result['exit_status'], result['output'] = worker.run_command_with_status(step['command'], timeout)
+        except ServerManagementError as error:
+            result['error'] = str(error)
+        except Exception as error:
+            result['error'] = repr(error)
+
+        if worker is not None:
+            if result['error'] is None:
+                pool.release(server_details, worker)
+            else:
+                pool.discard(worker)
+
+        return result
+
+    def run(self, parallel):
+        """
+        Run the steps as their needs succeed
+        :param parallel: The number of servers handled at the same time across all the steps
+        :return: generator of results and of (step, state) tuples when a step finishes, in the order they happen
+        """
+        import concurrent.futures
+
+        management = self.management
+        servers = {step['name']: management.resolve_aliases(step['aliases']) for step in self.steps}
+        queued = {name: list(items) for name, items in servers.items()}
+        running = {step['name']: 0 for step in self.steps}
+        failed = {step['name']: 0 for step in self.steps}
+        stopping = False
+
+        # The workers share the tracer, create it before they start
+        management.get_tracer()
+        pool = SessionPool(management)
+        parallel = max(1, parallel)
+        futures = {}
+
+        def start():
+            """Start the servers of the running steps while there are free slots, steps defined first first"""
+            for step in self.steps:
+                name, concurrency = step['name'], step['concurrency']
+
+                while self.states[name] == self.RUNNING and queued[name] and len(futures) < parallel \
+                        and (concurrency is None or running[name] < concurrency) and not stopping:
+                    alias, server_details = queued[name].pop(0)
+                    running[name] += 1
+                    futures[executor.submit(self.run_step_on_server, pool, step, alias, server_details)] = name
+
+        try:
+            # The commands are only handed to the executor when a slot is free, so that none is waiting in it
+            # when fail-fast stops starting them
+            with concurrent.futures.ThreadPoolExecutor(max_workers=parallel) as executor:
+                while True:
+                    changed = True
+
+                    while changed:
+                        changed = False
+
+                        for step in self.steps:
+                            name = step['name']
+                            needs = [self.states[need] for need in step['needs']]
+
+                            # Start the steps whose needs succeeded and skip the ones whose needs did not
+                            if self.states[name] == self.PENDING:
+                                if stopping or any(state in (self.FAILED, self.STOPPED, self.SKIPPED)
+                                                   for state in needs):
+                                    self.states[name] = self.SKIPPED
+                                    yield name, self.SKIPPED
+                                    changed = True
+                                elif all(state == self.SUCCEEDED for state in needs):
+                                    self.states[name] = self.RUNNING
+                                    changed = True
+
+                            # Steps that ran on all their servers, or were stopped by fail-fast before
+                            elif self.states[name] == self.RUNNING and not running[name] \
+                                    and (not queued[name] or stopping):
+                                self.states[name] = self.FAILED if failed[name] else \
+                                    self.STOPPED if queued[name] else self.SUCCEEDED
+                                yield name, self.states[name]
+                                changed = True
+
+                        start()
+
+                    if not futures:
+                        break
+
+                    done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                    for future in done:
+                        name = futures.pop(future)
+                        result = future.result()
+                        running[name] -= 1
+
+                        if result['error'] is not None or result['exit_status'] != 0:
+                            failed[name] += 1
+                            stopping = stopping or self.failure == self.FAIL_FAST
+
+                        self.results.append(result)
+                        yield result
+        finally:
+            pool.close()
+
+    def failed(self):
+        return any(state != self.SUCCEEDED for state in self.states.values())
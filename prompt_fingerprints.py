@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import time
+
+from state_file import StateFile, hops_key
+
+
+class PromptFingerprints(StateFile):
+    """
+    Learns the exact shell prompt of every server, the order of its password and verification code prompts
+    and the time its prompt takes to appear, and keeps them in a cache file.
+
+    The first login to a server waits for broad patterns such as the username, which can match a banner before
+    the shell is ready, and then reads the output until it stops to learn the prompt. The following logins
+    wait for the exact prompt with a deadline of a few times the learned time and fail right away when ssh
+    reports that the password was not accepted. A prompt that does not come in time is forgotten and the broad
+    patterns are waited for again, servers whose prompt keeps changing are not learned anymore.
+    """
+    PASSWORD = 'password'
+    VERIFICATION_CODE = 'verification'
+
+    # Seconds without output after which the last line is taken as the prompt, and the longest wait for it
+    QUIET = 0.1
+    LEARN_TIMEOUT = 2
+
+    # The deadline of a learned prompt is this many times the learned time, at least MIN_DEADLINE seconds
+    DEADLINE_FACTOR = 3
+    MIN_DEADLINE = 1
+
+    # Mismatches after which a server is not learned anymore
+    MAX_MISMATCHES = 3
+
+    PROMPT_SIZE = 256
+
+    # Line breaks, and the sequences readline sends before every prompt when the terminal supports them, the
+    # prompt starts after the last of them
+    LINE_STARTS = [b'\n', b'\r', b'\x1b[?2004h', b'\x1b[?2004l']
+
+    # Characters the prompts of shells end with, a line is only learned as a prompt after a timeout if it ends
+    # with one of them
+    PROMPT_ENDINGS = '$#>%]:'
+
+    # The cache key of a list of servers logged into with one ssh command
+    key = staticmethod(hops_key)
+
+    def get(self, key, auth):
+        """
+        Get the learned fingerprint of servers that asked for the given prompts
+        :param key: The cache key of the servers
+        :param auth: The prompts answered in order, such as ['password', 'verification']
+        :return: the fingerprint or None when none is learned or the prompts changed
+        """
+        with self.lock:
+            entry = self.load().get(key)
+
+        if entry is None or entry.get('prompt') is None:
+            return None
+
+        if entry['auth'] != auth:
+            self.forget(key)
+            return None
+
+        return entry
+
+    def learns(self, key):
+        """Check if the prompt of servers is learned, servers whose prompt keeps changing are not"""
+        with self.lock:
+            entry = self.load().get(key)
+
+        return entry is None or entry.get('mismatches', 0) < self.MAX_MISMATCHES
+
+    def deadline(self, entry, timeout):
+        """
+        Get the time to wait for a learned prompt
+        :param timeout: The timeout of the server, which the deadline is never longer than
+        """
+        if entry['seconds'] is None:
+            return timeout
+
+        return min(timeout, max(self.MIN_DEADLINE, entry['seconds'] * self.DEADLINE_FACTOR))
+
+    def learn(self, key, prompt, seconds, auth):
+        """
+        Keep the prompt of servers
+        :param prompt: The last line of output after the login
+        :param seconds: The time from the last answer to the prompt, None if it is not known
+        :param auth: The prompts answered in order
+        """
+        with self.lock:
+            previous = self.load().get(key) or {}
+            entry = {'prompt': prompt, 'seconds': None if seconds is None else round(seconds, 3), 'auth': auth,
+                     'learned': int(time.time()), 'mismatches': previous.get('mismatches', 0)}
+
+            self.entries[key] = self.changed[key] = entry
+
+        self.save()
+
+    def forget(self, key):
+        """Forget the prompt of servers after it did not come, counting the mismatch"""
+        with self.lock:
+            entry = self.load().get(key)
+
+            if entry is None:
+                return
+
+            entry = dict(entry, prompt=None, mismatches=entry.get('mismatches', 0) + 1)
+            self.entries[key] = self.changed[key] = entry
+
+        self.save()
+
+    @classmethod
+    def last_line(cls, data):
+        """
+        Get the last line of output
+        :param data: bytes received
+        :return: the line or None if it is empty, too long or not text
+        """
+        start = max(data.rfind(line_start) + len(line_start) if line_start in data else 0
+                    for line_start in cls.LINE_STARTS)
+        line = data[start:]
+
+        # The start of a longer line was not received
+        if len(line) > cls.PROMPT_SIZE:
+            return None
+
+        try:
+            line = line.decode('utf-8')
+        except UnicodeDecodeError:
+            return None
+
+        return line if line.strip() else None
+
+    @classmethod
+    def looks_like_prompt(cls, line):
+        return line is not None and line.rstrip()[-1:] in cls.PROMPT_ENDINGS
+
+    @classmethod
+    def read_prompt(cls, controller, received):
+        """
+        Read the output until it stops and get its last line. The output read is put back into the buffer of
+        the controller so that an interactive session still shows it
+        :param controller: pexpect spawn whose prompts were answered
+        :param received: The output already taken out of the buffer, such as the match and the text before it
+        :return: the last line or None and the time.monotonic() the last output was received
+        """
+        import pexpect
+
+        data = bytearray(controller.buffer)
+        received_at = time.monotonic()
+        deadline = received_at + cls.LEARN_TIMEOUT
+
+        while received_at < deadline:
+            try:
+                data += controller.read_nonblocking(65536, cls.QUIET)
+            except (pexpect.TIMEOUT, pexpect.EOF):
+                break
+
+            received_at = time.monotonic()
+
+        controller.buffer = bytes(data)
+
+        return cls.last_line(bytes((received + data)[-cls.PROMPT_SIZE * 4:])), received_at
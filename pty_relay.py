@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+import errno
+import os
+import select
+import stat
+import sys
+
+
+class PtyRelay:
+    """
+    Copies an interactive session between the terminal and the pty of ssh like pexpect's interact(), made for
+    sessions printing a lot of output such as a cat of a large log or a tail -f of a busy service.
+
+    The output is read into one preallocated buffer that grows while the reads fill it and shrinks back when
+    the session is quiet, and everything the pty holds is read before it is written with one write, so a burst
+    of output takes a few large writes instead of one small read and write per 1000 bytes. When the output
+    goes to a pipe and is not filtered it is moved with os.splice without being copied through Python, a
+    terminal cannot be spliced to so it takes the buffer.
+
+    The signal handlers of the process still run while the relay waits, so sigwinch_pass_through keeps passing
+    the size of the terminal to the session. Typing the escape character, Ctrl-] by default, leaves the relay
+    without closing the session.
+    """
+    ESCAPE_CHARACTER = b'\x1d'
+
+    # Bytes read at once, doubled while the reads fill the buffer and halved while they use less than a quarter
+    MIN_READ_SIZE = 16384
+    MAX_READ_SIZE = 1048576
+
+    INPUT_READ_SIZE = 4096
+
+    def __init__(self, controller, output_filter=None, escape_character=ESCAPE_CHARACTER, stdin=None,
+                 stdout=None):
+        """
+        :param controller: pexpect spawn of the session
+        :param output_filter: Called with the output of the session before it is shown
+        :param escape_character: Key leaving the relay, None to pass every key to the session
+        :param stdin: File descriptor of the terminal keys are read from
+        :param stdout: File descriptor the output is written to
+        """
+        self.controller = controller
+        self.output_filter = output_filter
+        self.escape_character = escape_character
+        self.stdin = sys.stdin.fileno() if stdin is None else stdin
+        self.stdout = sys.stdout.fileno() if stdout is None else stdout
+        self.child_fd = controller.child_fd
+        self.buffer = bytearray(self.MAX_READ_SIZE)
+        self.view = memoryview(self.buffer)
+        self.read_size = self.MIN_READ_SIZE
+        self.splice = (output_filter is None and hasattr(os, 'splice')
+                       and stat.S_ISFIFO(os.fstat(self.stdout).st_mode))
+
+    @staticmethod
+    def write(fd, data):
+        """Write all the data to a file descriptor, waiting while a non blocking one is full"""
+        while data:
+            try:
+                data = data[os.write(fd, data):]
+            except BlockingIOError:
+                select.select([], [fd], [])
+
+    def splice_output(self):
+        """
+        Move the output of the session to the pipe without copying it
+        :return: False when the session ended
+        """
+        moved = 0
+
+        while moved < self.read_size:
+            try:
+                count = os.splice(self.child_fd, self.stdout, self.read_size - moved)
+            except BlockingIOError:
+                break
+            except OSError as error:
+                if error.errno == errno.EINVAL:
+                    # The kernel cannot splice from this pty, copy through the buffer instead
+                    self.splice = False
+                    return self.copy_output()
+
+                return False
+
+            if not count:
+                return False
+
+            moved += count
+
+        self.adapt(moved)
+
+        return True
+
+    def copy_output(self):
+        """
+        Read everything the pty holds up to the read size and write it at once
+        :return: False when the session ended
+        """
+        filled = 0
+        alive = True
+
+        while filled < self.read_size:
+            try:
+                count = os.readv(self.child_fd, [self.view[filled:self.read_size]])
+            except BlockingIOError:
+                break
+            except OSError:
+                # EIO once the session ended on Linux
+                alive = False
+                break
+
+            if not count:
+                alive = False
+                break
+
+            filled += count
+
+        if filled:
+            self.adapt(filled)
+            data = self.view[:filled]
+
+            if self.output_filter is not None:
+                data = self.output_filter(bytes(data))
+
+            self.write(self.stdout, data)
+
+        return alive
+
+    def adapt(self, count):
+        """Grow or shrink the read size from the bytes the last read got"""
+        if count >= self.read_size and self.read_size < self.MAX_READ_SIZE:
+            self.read_size *= 2
+        elif count < self.read_size // 4 and self.read_size > self.MIN_READ_SIZE:
+            self.read_size //= 2
+
+    def keys(self, data):
+        """
+        Send the keys typed to the session
+        :return: False when the escape character was typed
+        """
+        position = data.find(self.escape_character) if self.escape_character else -1
+
+        if position >= 0:
+            self.write(self.child_fd, data[:position])
+            return False
+
+        self.write(self.child_fd, data)
+
+        return True
+
+    def run(self):
+        """Hand the session over to the user until it ends or the escape character is typed"""
+        import termios
+        import tty
+
+        # The output received while logging in is shown first
+        if self.controller.buffer:
+            self.write(self.stdout, self.controller.buffer)
+            self.controller.buffer = b''
+
+        attributes = termios.tcgetattr(self.stdin) if os.isatty(self.stdin) else None
+        blocking = os.get_blocking(self.child_fd)
+
+        poller = select.poll()
+        poller.register(self.child_fd, select.POLLIN)
+        poller.register(self.stdin, select.POLLIN)
+
+        try:
+            if attributes is not None:
+                tty.setraw(self.stdin)
+
+            # The pty is read until it is empty
+            os.set_blocking(self.child_fd, False)
+
+            while True:
+                for fd, event in poller.poll():
+                    if fd == self.child_fd:
+                        if not (self.splice_output() if self.splice else self.copy_output()):
+                            return
+                    else:
+                        data = os.read(self.stdin, self.INPUT_READ_SIZE)
+
+                        # The output is still shown after the input ended
+                        if not data:
+                            poller.unregister(self.stdin)
+                        elif not self.keys(data):
+                            return
+        finally:
+            os.set_blocking(self.child_fd, blocking)
+
+            if attributes is not None:
+                termios.tcsetattr(self.stdin, termios.TCSAFLUSH, attributes)
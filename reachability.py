@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import socket
+import time
+
+from state_file import StateFile
+
+
+class Reachability(StateFile):
+    """
+    Probes servers with TCP connects and SSH banner reads, all at the same time, and keeps the results in a
+    cache file with a time to live so that logins can stop early on servers that are known to be down.
+
+    Only servers without a requiredServerLogIn are probed, the others cannot be reached directly. They are
+    unreachable when a server of their route is down and unverified otherwise.
+
+    Names that cannot be resolved here are unresolved rather than down, ssh may still resolve them with its
+    own config, such as a Host of ~/.ssh/config, so logins are not stopped for them.
+    """
+    UP = 'up'
+    DOWN = 'down'
+    NOT_SSH = 'not ssh'
+    UNRESOLVED = 'unresolved'
+    UNREACHABLE = 'unreachable'
+    UNVERIFIED = 'unverified'
+
+    # States that stop the logins to a server until they expire
+    FAILED = (DOWN, NOT_SSH)
+
+    TTL = 300
+    TIMEOUT = 3
+    CONCURRENCY = 512
+
+    def __init__(self, cache_file, ttl=TTL):
+        super().__init__(cache_file)
+        self.ttl = ttl
+
+    @staticmethod
+    def key(server_details):
+        return '%s:%s' % (server_details['server'], server_details.get('port', 22))
+
+    def add(self, results):
+        """
+        Add results to the cache file, dropping the expired ones
+        :param results: dictionary of server:port -> result
+        """
+        with self.lock:
+            self.load().update(results)
+            self.changed.update(results)
+
+        self.save(self.fresh)
+
+    def fresh(self, result):
+        return time.time() - result['checked'] < self.ttl
+
+    def get(self, server_details):
+        """
+        Get the cached result of a server if it has not expired
+        :return: the result or None
+        """
+        result = self.load().get(self.key(server_details))
+
+        if result is None or time.time() - result['checked'] >= self.ttl:
+            return None
+
+        return result
+
+    def forget(self, server_details):
+        """Remove the cached result of a server that was not up, once it was logged into"""
+        key = self.key(server_details)
+        result = self.load().get(key)
+
+        if result is None or result['state'] == self.UP:
+            return
+
+        with self.lock:
+            del self.entries[key]
+            self.changed[key] = None
+
+        self.save(self.fresh)
+
+    @staticmethod
+    async def probe(server_details, timeout, semaphore):
+        """
+        Connect to a server and read its SSH banner
+        :return: dictionary with the state, the time taken in milliseconds, the banner and the error if any
+        """
+        async with semaphore:
+            result = {'state': Reachability.DOWN, 'ms': None, 'banner': None, 'error': None, 'checked': time.time()}
+            start = time.perf_counter()
+            writer = None
+
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(server_details['server'], int(server_details.get('port', 22))), timeout)
+                result['ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+                banner = await asyncio.wait_for(reader.readline(), max(0.1, start + timeout - time.perf_counter()))
+                result['banner'] = banner.decode('utf-8', 'replace').strip()[:255]
+                result['state'] = Reachability.UP if banner.startswith(b'SSH-') else Reachability.NOT_SSH
+
+                if result['state'] == Reachability.NOT_SSH:
+                    result['error'] = 'No SSH banner was received'
+            except asyncio.TimeoutError:
+                if result['ms'] is None:
+                    result['error'] = 'Timed out after %ss' % timeout
+                else:
+                    result.update(state=Reachability.NOT_SSH, error='No SSH banner within %ss' % timeout)
+            except socket.gaierror as error:
+                result.update(state=Reachability.UNRESOLVED, error=error.strerror or str(error))
+            except (OSError, UnicodeError, ValueError) as error:
+                result['error'] = os.strerror(error.errno) if getattr(error, 'errno', None) else str(error)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+            return result
+
+    async def probe_all(self, servers, timeout, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        results = await asyncio.gather(*[self.probe(server, timeout, semaphore) for server in servers])
+
+        return {self.key(server): result for server, result in zip(servers, results)}
+
+    def check(self, routes, timeout=TIMEOUT, concurrency=CONCURRENCY):
+        """
+        Probe the servers that are reached directly and work out the state of the servers behind them
+        :param routes: list of (alias, route) tuples
+        :return: list of (alias, server details, result) tuples in the order of the routes
+        """
+        raise_open_files_limit(concurrency)
+
+        entries = {}
+
+        for _, route in routes:
+            entries.setdefault(self.key(route.hops[0]), route.hops[0])
+
+        probed = asyncio.run(self.probe_all(list(entries.values()), timeout, concurrency))
+        self.add(probed)
+
+        checked = []
+
+        for alias, route in routes:
+            result = dict(probed[self.key(route.hops[0])])
+
+            if len(route.hops) > 1:
+                if result['state'] in (self.UP, self.UNRESOLVED):
+                    result.update(state=self.UNVERIFIED, error='Reached through %s' % route.hops[-2]['server'])
+                else:
+                    result.update(state=self.UNREACHABLE, error='%s is %s: %s' % (
+                        route.hops[0]['server'], result['state'], result['error']))
+
+            checked.append((alias, route.target, result))
+
+        return checked
+
+
+def raise_open_files_limit(needed):
+    """Raise the limit of open files so that the probes running at the same time do not run out of them"""
+    try:
+        import resource
+    except ImportError:
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = needed + 64
+
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted if hard == resource.RLIM_INFINITY
+                                                        else min(wanted, hard), hard))
+        except (ValueError, OSError):
+            pass
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+import re
+import time
+
+from alias_registry import ConfigError
+from state_file import StateFile, hops_key
+
+
+class Route:
+    """
+    The list of servers that are logged into to reach a server, starting with the first proxy server
+    and ending with the server itself
+    """
+
+    def __init__(self, hops):
+        self.hops = hops
+
+    @property
+    def target(self):
+        return self.hops[-1]
+
+    @property
+    def jump_hops(self):
+        return self.hops[:-1]
+
+    @property
+    def servers(self):
+        return [hop['server'] for hop in self.hops]
+
+    def key(self):
+        """
+        Get the key of the route in the route history
+        :return: String such as demo@bastion:22,demo@web1:22
+        """
+        return hops_key(self.hops)
+
+    @staticmethod
+    def destination(hop):
+        return '%s@%s' % (hop['username'], hop['server'])
+
+    def jump_spec(self):
+        """
+        Get the value of the ssh -J option
+        :return: String such as user@bastion:22,user@inner:2222
+        """
+        return ','.join('%s:%d' % (self.destination(hop), int(hop.get('port', 22))) for hop in self.jump_hops)
+
+    def ssh_command(self, extra_options=''):
+        """
+        Get the single ssh command that reaches the target through all the proxy servers
+        :param extra_options: Other ssh options such as port forwards
+        :return: the ssh command
+        """
+        options = ['ssh']
+
+        if self.jump_hops:
+            options.append('-J %s' % self.jump_spec())
+
+        if extra_options:
+            options.append(extra_options)
+
+        options.append('-p%d %s' % (int(self.target.get('port', 22)), self.destination(self.target)))
+
+        return ' '.join(options)
+
+    def password_prompt(self, hop):
+        """
+        Get the pattern of the password prompt ssh shows for a hop. ssh truncates the user to 30 and the
+        host to 128 characters
+        """
+        return re.escape("%s@%s's password:" % (str(hop['username'])[:30], str(hop['server'])[:128]))
+
+
+class RoutePlanner:
+    """
+    Resolves the requiredServerLogIn graph of a server into a route and caches the result. A requiredServerLogIn
+    can be a list of aliases, every one of them is a candidate proxy server the server can be reached through
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.candidates = {}
+
+    def plan(self, server_details):
+        """
+        Get the route to a server, through the first candidate proxy servers
+        :param server_details: the server details from the config file
+        :return: Route
+        """
+        return self.plan_candidates(server_details)[0]
+
+    def plan_candidates(self, server_details):
+        """
+        Get all the routes to a server through its candidate proxy servers
+        :param server_details: the server details from the config file
+        :return: list of Route, in the order of the requiredServerLogIn aliases
+        """
+        key = id(server_details)
+
+        if key not in self.candidates:
+            self.candidates[key] = [Route(hops) for hops in self.resolve_candidates(server_details)]
+
+        return self.candidates[key]
+
+    def plan_alias(self, alias):
+        server_details = self.registry.get(alias)
+
+        if server_details is None:
+            raise ConfigError('No alias with the name: \'{}\' does not exist'.format(alias))
+
+        return self.plan(server_details)
+
+    def resolve(self, server_details):
+        """
+        Follow the first requiredServerLogIn aliases up to a server that is reached directly
+        :return: list of server details, first proxy server first
+        """
+        return self.resolve_candidates(server_details)[0]
+
+    def resolve_candidates(self, server_details, hops=()):
+        """
+        Follow every requiredServerLogIn alias up to the servers that are reached directly
+        :param hops: The servers after this one, last server last
+        :return: list of lists of server details, first proxy server first
+        """
+        hops = (server_details,) + tuple(hops)
+        aliases = server_details.get('requiredServerLogIn')
+
+        if not aliases:
+            return [list(hops)]
+
+        candidates = []
+
+        for alias in aliases if isinstance(aliases, list) else [aliases]:
+            required = self.registry.get(alias)
+
+            if required is None:
+                raise ConfigError('The requiredServerLogIn alias \'{}\' of {} does not exist'.format(
+                    alias, server_details['server']))
+
+            if any(required is hop for hop in hops):
+                raise ConfigError('The requiredServerLogIn of {} creates a cycle: {}'.format(
+                    hops[-1]['server'], ' -> '.join([required['server']] + [hop['server'] for hop in hops])))
+
+            candidates += self.resolve_candidates(required, hops)
+
+        return candidates
+
+
+class RouteHistory(StateFile):
+    """
+    Keeps the time logins through every route took and the failed ones in a cache file, so that the routes of
+    a server with candidate proxy servers are tried fastest first
+    """
+    # Weight of the last login in the average time of a route
+    SMOOTHING = 0.3
+
+    def get(self, route):
+        with self.lock:
+            return self.load().get(route.key())
+
+    def order(self, routes):
+        """
+        Sort routes fastest first. Routes not logged in through yet come after the known ones and routes whose
+        last login failed come last, the order of the config file is kept otherwise
+        :param routes: list of Route
+        """
+        def rank(route):
+            entry = self.get(route) or {}
+
+            return entry.get('failures', 0) > 0, entry.get('seconds', float('inf'))
+
+        return sorted(routes, key=rank)
+
+    def record(self, route, seconds=None, finished=True):
+        """
+        Keep the result of a login through a route
+        :param seconds: The time the login took, None if it failed
+        :param finished: False for a login cancelled after seconds, which only tells that the route is at least
+                         this slow
+        """
+        key = route.key()
+
+        with self.lock:
+            previous = self.load().get(key) or {}
+            entry = dict(previous, updated=int(time.time()))
+
+            if seconds is None:
+                entry['failures'] = previous.get('failures', 0) + 1
+            elif not finished:
+                entry['seconds'] = round(max(seconds, previous.get('seconds', 0)), 3)
+            else:
+                entry['failures'] = 0
+                entry['seconds'] = round(seconds if 'seconds' not in previous else
+                                         previous['seconds'] + (seconds - previous['seconds']) * self.SMOOTHING, 3)
+
+            self.entries[key] = self.changed[key] = entry
+
+        self.save()
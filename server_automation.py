@@ -1,12 +1,25 @@
 #!/usr/bin/env python3
-import re
+# Only the modules needed by every command are imported here, the others are imported by the commands
+# using them so that commands such as list start quickly
 import sys
-import shutil
-import signal
-import yaml
 
 from server_management import ServerManagement
 
+
+def is_option(arg, prefix):
+    """Check if an argument is an option, an option is the prefix followed by a lower case letter"""
+    return arg.startswith(prefix) and 'a' <= arg[len(prefix):len(prefix) + 1] <= 'z'
+
+
+def format_size(size):
+    """Format a number of bytes such as 1.5 MB"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024 or unit == 'GB':
+            return '{:.1f} {}'.format(size, unit) if unit != 'B' else '{} B'.format(int(size))
+
+        size /= 1024
+
+
 if __name__ == '__main__':
     automation = ServerManagement()
 
@@ -27,9 +40,9 @@ if __name__ == '__main__':
     # Get the options and arguments passed
     # Options have -- prefix and - prefix
     long_options = list(map(lambda x: x.strip(automation.ARGS_LONG_PREFIX),
-                            list(filter(lambda x: re.match(automation.ARGS_LONG_PREFIX + '[a-z]', x), args[1:]))))
+                            list(filter(lambda x: is_option(x, automation.ARGS_LONG_PREFIX), args[1:]))))
     short_options = list(map(lambda x: x.strip(automation.ARGS_SHORT_PREFIX),
-                             list(filter(lambda x: re.match(automation.ARGS_SHORT_PREFIX + '[a-z]', x), args[1:]))))
+                             list(filter(lambda x: is_option(x, automation.ARGS_SHORT_PREFIX), args[1:]))))
 
     # Arguments that dont have -- or - prefix mainly such as the server name
     other_args = list(filter(lambda x:
@@ -58,9 +71,12 @@ if __name__ == '__main__':
         for option in all_options:
             is_short_prefix = False
 
+            if option in automation.FLAG_OPTIONS and option in available_options:
+                continue
+
             try:
                 if '=' in option:
-                    option_name, option_value = option.split("=")
+                    option_name, option_value = option.split("=", 1)
                 else:
                     option_name, option_value = option[0], option[1:]
                     is_short_prefix = True
@@ -87,7 +103,7 @@ if __name__ == '__main__':
 
         # Separate the key and values
         # Create a list of dictionaries with the keys: name and value
-        options = list(map(lambda x: dict(zip(['name', 'value'], x.split("="))), long_options))
+        options = list(map(lambda x: dict(zip(['name', 'value'], x.split("=", 1))), long_options))
         options += list(map(lambda x: dict(zip(['name', 'value'], [x[0], x[1:]])), short_options))
 
         # Handle all the options
@@ -105,36 +121,67 @@ if __name__ == '__main__':
         details = automation.get_server_details(alias)
 
         # Set the verification code if its passed
-        if other_args[1]:
+        if len(other_args) > 1 and other_args[1]:
             automation.VERIFICATION_CODE = other_args[1]
 
-        automation.server_login(details)
+        # Attach to a session kept by the session broker
+        if automation.REUSE_SESSION:
+            from session_broker import BrokerClient
+            from server_management import ServerManagementError
+
+            try:
+                BrokerClient(automation.BROKER_SOCKET).attach(alias, automation.VERIFICATION_CODE,
+                                                              automation.COMMAND_TO_RUN)
+            except ServerManagementError as error:
+                automation.log("🧊 %s" % error)
+                sys.exit(1)
+
+            sys.exit(0)
+
+        # Record the output of the session
+        if automation.RECORD_FILE is not None:
+            automation.start_recording(alias)
+
+        # Log in again when a connection is lost
+        if automation.RECONNECT:
+            from session_supervisor import SessionSupervisor
+
+            try:
+                status = SessionSupervisor(automation, details).run()
+            finally:
+                automation.save_trace()
+                automation.stop_recording()
+
+            sys.exit(status)
+
+        try:
+            automation.server_login(details)
+        finally:
+            automation.save_trace()
 
         # Run command if any
         if automation.COMMAND_TO_RUN:
             automation.controller.sendline(automation.COMMAND_TO_RUN)
 
+        import shutil
+        import signal
+
         # Get the window size and update the app controller
         column, row = shutil.get_terminal_size((80, 20))
         automation.controller.setwinsize(row, column)
 
         # Notify incase of a window size change
         signal.signal(signal.SIGWINCH, automation.sigwinch_pass_through)
-        automation.controller.interact()
+
+        try:
+            automation.interact()
+        finally:
+            automation.stop_recording()
     elif first_arg == automation.LIST:
         # Get the list of all aliases
         all_aliases = []
 
-        with open(automation.CONFIG_FILE, 'r') as f:
-            data = yaml.load(f)
-
-            try:
-                assert len(args) >= 1
-            except AssertionError:
-                automation.log('🧊 Config file:{config} does not exist or is empty.'
-                               .format(config=automation.CONFIG_FILE))
-
-        for item in data['servers']:
+        for item in automation.get_registry().servers:
             all_aliases.append({
                 "server": item['server'],
                 "aliases": item['aliases']})
@@ -148,44 +195,539 @@ if __name__ == '__main__':
 
         sys.exit(0)
     elif first_arg == automation.PORT_FORWARD:
-        # Check if the alias was passed as an argument
-        try:
-            assert type(other_args[0]) is str
-            assert type(other_args[1]) is str
+        # Handle all the options
+        automation.handle_port_forward_options(short_options, long_options)
 
-            items = other_args[1].split(':')
-        except:
-            automation.log("🧊 No alias was passed, please pass an alias. "
-                           "Format \"./server_automation.py pf local_port alias_name:port\"")
+        arguments = [arg for arg in other_args if not is_option(arg, automation.ARGS_SHORT_PREFIX)]
+        forwards = automation.get_forwards(arguments)
+
+        if not forwards:
+            automation.log("🧊 No port forward was passed. Format \"./server_automation.py pf local_port alias_name:port "
+                           "[local_port alias_name:port...]\" or \"./server_automation.py pf forward_group\"")
             sys.exit(1)
 
-        local_port = other_args[0]
+        # Listen on the local ports and log in when the first client connects
+        if automation.LAZY_FORWARD:
+            from lazy_tunnel import LazyTunnel
 
-        alias = items[0]
-        destination_port = items[1]
+            for local_port, alias, destination_port in forwards:
+                for hop in automation.get_route(automation.get_server_details(alias)).hops:
+                    automation.requires_verification_code(hop)
 
-        # Set the verification code if its passed
-        if other_args[2]:
-            automation.VERIFICATION_CODE = other_args[2]
+            tunnel = LazyTunnel(automation, forwards, automation.FORWARD_IDLE_TIMEOUT)
 
-        # Handle all the options
-        automation.handle_port_forward_options(short_options, long_options)
+            try:
+                tunnel.run()
+            except OSError as error:
+                automation.log("🧊 Could not listen on the local ports: %s" % error)
+                sys.exit(1)
 
-        details = automation.get_server_details(alias)
+            sys.exit(0)
+
+        # The forwards of every server share one chain
+        destinations = {}
 
-        automation.server_port_forward(details, local_port, destination_port)
+        for local_port, alias, destination_port in forwards:
+            details = automation.get_server_details(alias)
+            destinations.setdefault(id(details), (alias, details, []))[2].append((local_port, destination_port))
+
+        # Servers already forwarded by a running pf get the new forwards without logging in again
+        pending = [(alias, details, ports) for alias, details, ports in destinations.values()
+                   if not automation.add_running_forwards(details, ports)]
+
+        # Hand the port forwards over to the session broker
+        if automation.REUSE_SESSION:
+            from session_broker import BrokerClient
+
+            for alias, details, ports in pending:
+                response = BrokerClient(automation.BROKER_SOCKET).request({
+                    'op': 'forward',
+                    'alias': alias,
+                    'forwards': ports,
+                    'verification_code': automation.VERIFICATION_CODE,
+                })
+
+                if not response.get('ok'):
+                    automation.log("🧊 %s" % response.get('error'))
+                    sys.exit(1)
+
+                automation.log("🔥 Port forwards to {} are running in session {}. Close them using: "
+                               "`./server_automation.py sessions close {}`".format(alias, response['session'],
+                                                                                    response['session']))
+
+            sys.exit(1 if automation.report_forwards(forwards) else 0)
+
+        if not pending:
+            sys.exit(1 if automation.report_forwards(forwards) else 0)
+
+        from server_management import ServerManagementError
+
+        # The chains of the other servers are kept by workers, the last one is handed over to the user
+        workers = []
+
+        try:
+            for alias, details, ports in pending[:-1]:
+                workers.append(automation.new_worker())
+                workers[-1].server_port_forwards(details, ports)
+
+            automation.server_port_forwards(pending[-1][1], pending[-1][2])
+        except ServerManagementError as error:
+            automation.log("🧊 %s" % error)
+            sys.exit(1)
+        finally:
+            automation.save_trace()
+
+        automation.report_forwards(forwards)
 
         # Run command if any
         if automation.COMMAND_TO_RUN:
             automation.controller.sendline(automation.COMMAND_TO_RUN)
 
+        import shutil
+        import signal
+
         # Get the window size and update the app controller
         column, row = shutil.get_terminal_size((80, 20))
         automation.controller.setwinsize(row, column)
 
         # Notify incase of a window size change
         signal.signal(signal.SIGWINCH, automation.sigwinch_pass_through)
-        automation.controller.interact()
+        automation.interact()
+    elif first_arg == automation.RUN:
+        # Handle all the options
+        automation.handle_run_options(short_options, long_options)
+
+        aliases = [arg for arg in other_args if not arg.startswith(automation.ARGS_SHORT_PREFIX)]
+
+        if not aliases or not automation.COMMAND_TO_RUN:
+            automation.log("🧊 Please pass the aliases and the command to run. "
+                           "Format \"./server_automation.py run alias [alias...] --command=command\"")
+            sys.exit(1)
+
+        servers = automation.resolve_aliases(aliases)
+
+        # The output of a single server is streamed as it arrives and its exit status is returned
+        if len(servers) == 1 and not automation.REUSE_SESSION:
+            from server_management import ServerManagementError
+
+            alias, details = servers[0]
+            automation.INTERACTIVE = False
+            automation.QUIET = True
+
+            try:
+                try:
+                    automation.server_login(details)
+                finally:
+                    automation.save_trace()
+
+                stream = automation.stream_command(automation.COMMAND_TO_RUN,
+                                                   details.get('timeout', automation.APP_TIMEOUT))
+
+                while True:
+                    try:
+                        sys.stdout.write(next(stream))
+                    except StopIteration as stop:
+                        sys.stdout.flush()
+                        sys.exit(stop.value)
+            except ServerManagementError as error:
+                sys.stdout.flush()
+                sys.stderr.write("🧊 {alias} ({server}): {error}\n".format(alias=alias, server=details['server'],
+                                                                           error=error))
+                sys.exit(1)
+
+        failed = 0
+
+        # Print every distinct output once, when the first server with it finishes
+        if automation.AGGREGATE:
+            import time
+
+            from output_aggregator import OutputAggregator
+
+            aggregator = OutputAggregator()
+            finished = 0
+            reported = time.monotonic()
+
+            try:
+                for result in automation.run_on_servers(aliases, automation.COMMAND_TO_RUN, automation.PARALLEL,
+                                                        aggregator):
+                    group = result['group']
+                    finished += 1
+
+                    if result['error'] is not None or result['exit_status'] != 0:
+                        failed += 1
+
+                    if result['first'] and result['error'] is not None:
+                        automation.log("🧊 #{number} {alias} ({server}): {error}".format(number=group.number,
+                                                                                        **result))
+                    elif result['first']:
+                        automation.log("🔥 #{number} {alias} ({server}) exited with {exit_status}:".format(
+                            number=group.number, **result))
+
+                        for chunk in group.chunks():
+                            sys.stdout.write(chunk)
+
+                        sys.stdout.flush()
+                        group.release()
+
+                    # The number of servers of every group so far
+                    if time.monotonic() - reported >= automation.AGGREGATE_INTERVAL and finished < len(servers):
+                        reported = time.monotonic()
+                        automation.log("🥁 {} of {} servers finished: {}".format(finished, len(servers), ', '.join(
+                            '#%d %d' % (group.number, len(group.hosts)) for group in aggregator.groups)))
+
+                automation.log("\n✨ {} servers gave {} different results:".format(finished, len(aggregator.groups)))
+
+                for group in aggregator.groups:
+                    automation.log("#{number} {result}, {count} server{s}: {hosts}".format(
+                        number=group.number, count=len(group.hosts), s='s' if len(group.hosts) > 1 else '',
+                        hosts=', '.join(group.hosts),
+                        result=group.error if group.error is not None else 'exited with {}, {}'.format(
+                            group.exit_status, format_size(group.size))))
+            finally:
+                aggregator.close()
+                automation.save_trace()
+
+            sys.exit(1 if failed else 0)
+
+        # Print the results as soon as every server finishes
+        for result in automation.run_on_servers(aliases, automation.COMMAND_TO_RUN, automation.PARALLEL):
+            if result['error'] is not None:
+                failed += 1
+                automation.log("🧊 {alias} ({server}): {error}\n".format(**result))
+            else:
+                if result['exit_status'] != 0:
+                    failed += 1
+
+                automation.log("🔥 {alias} ({server}) exited with {exit_status}:\n{output}".format(**result))
+
+        automation.save_trace()
+        sys.exit(1 if failed else 0)
+    elif first_arg == automation.WORKSPACE:
+        from workspace import Workspace
+
+        automation.handle_run_options(short_options, long_options)
+
+        aliases = [arg for arg in other_args if not is_option(arg, automation.ARGS_SHORT_PREFIX)]
+
+        if not aliases:
+            automation.log("🧊 Please pass the aliases. Format \"./server_automation.py workspace alias [alias...]\"")
+            sys.exit(1)
+
+        servers = automation.resolve_aliases(aliases)
+
+        workspace = Workspace(automation)
+        automation.log("🥁 Logging into %d servers" % len(servers))
+
+        try:
+            for alias, details, error in workspace.open(servers, automation.PARALLEL):
+                if error is not None:
+                    automation.log("🧊 {alias} ({server}): {error}".format(alias=alias, server=details['server'],
+                                                                        error=error))
+                else:
+                    automation.log("🔥 {alias} ({server}) is logged in".format(alias=alias, server=details['server']))
+        finally:
+            automation.save_trace()
+
+        if not workspace.sessions:
+            sys.exit(1)
+
+        workspace.run()
+        sys.exit(0)
+    elif first_arg in (automation.PUSH, automation.PULL):
+        import os
+
+        automation.handle_run_options(short_options, long_options)
+
+        arguments = [arg for arg in other_args if not arg.startswith(automation.ARGS_SHORT_PREFIX)]
+
+        if len(arguments) < 3:
+            automation.log("🧊 Please pass the files and the aliases. Format \"./server_automation.py push "
+                           "local_file remote_path alias [alias...]\" or \"./server_automation.py pull "
+                           "remote_file local_dir alias [alias...]\"")
+            sys.exit(1)
+
+        source, destination, aliases = arguments[0], arguments[1], arguments[2:]
+
+        if first_arg == automation.PUSH and not os.path.isfile(source):
+            automation.log("🧊 No such file: %s. Send folders as a tar file" % source)
+            sys.exit(1)
+
+        failed = 0
+
+        # Print the results as soon as every server finishes
+        for result in automation.transfer_on_servers(aliases, first_arg, source, destination, automation.PARALLEL):
+            if result['error'] is not None:
+                failed += 1
+                automation.log("🧊 {alias} ({server}): {error}".format(**result))
+            else:
+                automation.log("🔥 {alias} ({server}): {size} in {seconds:.1f}s ({rate}/s){resumed}".format(
+                    size=format_size(result['bytes'] + result['skipped']), rate=format_size(
+                        result['bytes'] / max(result['seconds'], 0.001)), resumed=', resumed after {}'.format(
+                        format_size(result['skipped'])) if result['skipped'] else '', **result))
+
+        sys.exit(1 if failed else 0)
+    elif first_arg == automation.PIPELINE:
+        from alias_registry import ConfigError
+        from pipeline import Pipeline
+
+        # The failure policy is only an option of pipeline, the other options are the ones of run
+        failure = [option.split("=", 1)[1] for option in long_options if option.startswith('failure=')]
+        automation.handle_run_options(short_options, [option for option in long_options
+                                                      if not option.startswith('failure=')])
+
+        arguments = [arg for arg in other_args if not is_option(arg, automation.ARGS_SHORT_PREFIX)]
+        jobs = automation.get_registry().config.get('jobs') or {}
+
+        if not arguments:
+            if not jobs:
+                automation.log("🧊 There are no jobs in the jobs section of the config file")
+                sys.exit(1)
+
+            automation.log("🔥 The jobs are: \n")
+
+            for name, job in jobs.items():
+                steps = (job.get('steps') or []) if isinstance(job, dict) else []
+                automation.log("✨ {name}: {steps}".format(name=name, steps=" -> ".join(
+                    str(step.get('name', position + 1)) for position, step in enumerate(steps)
+                    if isinstance(step, dict))))
+
+            sys.exit(0)
+
+        try:
+            pipeline = Pipeline.load(automation, arguments[0])
+        except ConfigError as error:
+            automation.log("🧊 %s" % error)
+            sys.exit(1)
+
+        if failure:
+            if failure[-1] not in Pipeline.FAILURE_POLICIES:
+                automation.log("🧊 The option --failure must be one of: %s" % ", ".join(Pipeline.FAILURE_POLICIES))
+                sys.exit(1)
+
+            pipeline.failure = failure[-1]
+
+        # The commands of the job are shown before they run
+        automation.log("🥁 Running the job {name} ({failure}):".format(name=pipeline.name, failure=pipeline.failure))
+
+        for step in pipeline.steps:
+            automation.log("\t{name}: `{command}` on {aliases}{needs}".format(
+                name=step['name'], command=step['command'], aliases=", ".join(step['aliases']),
+                needs=", after " + ", ".join(step['needs']) if step['needs'] else ""))
+
+        # Print the results as soon as every server finishes
+        for result in pipeline.run(automation.PARALLEL):
+            if not isinstance(result, dict):
+                name, state = result
+                automation.log("{icon} Step {name} {state}".format(
+                    icon="✨" if state == Pipeline.SUCCEEDED else "🧊", name=name, state=state))
+            elif result['error'] is not None:
+                automation.log("🧊 {step}: {alias} ({server}): {error}\n".format(**result))
+            else:
+                automation.log("🔥 {step}: {alias} ({server}) exited with {exit_status}:\n{output}".format(**result))
+
+        automation.save_trace()
+        sys.exit(1 if pipeline.failed() else 0)
+    elif first_arg == automation.BROKER:
+        from session_broker import SessionBroker
+
+        options = dict(map(lambda x: x.split("=", 1) if '=' in x else (x, ''), long_options))
+        idle_timeout = SessionBroker.IDLE_TIMEOUT
+        max_sessions = SessionBroker.MAX_SESSIONS
+
+        try:
+            for name, value in options.items():
+                if name == 'idle-timeout':
+                    idle_timeout = int(value)
+                elif name == 'max-sessions':
+                    max_sessions = int(value)
+                else:
+                    automation.log('🧊 Unknown option: {}{}'.format(automation.ARGS_LONG_PREFIX, name))
+                    sys.exit(1)
+        except ValueError:
+            automation.log('🧊 The options --idle-timeout and --max-sessions require a number')
+            sys.exit(1)
+
+        SessionBroker(automation.BROKER_SOCKET, automation.CONFIG_FILE, idle_timeout, max_sessions).serve()
+    elif first_arg == automation.SESSIONS:
+        from session_broker import BrokerClient
+
+        client = BrokerClient(automation.BROKER_SOCKET)
+
+        if other_args and other_args[0] == 'stop':
+            client.request({'op': 'stop'}, start=False)
+            automation.log("🔥 The session broker has been stopped")
+            sys.exit(0)
+
+        if other_args and other_args[0] == 'close':
+            try:
+                response = client.request({'op': 'close', 'id': int(other_args[1])}, start=False)
+            except (IndexError, ValueError):
+                automation.log("🧊 Please pass a session id. Format \"./server_automation.py sessions close id\"")
+                sys.exit(1)
+
+            if not response or not response.get('ok'):
+                automation.log("🧊 No session with the id: %s" % other_args[1])
+                sys.exit(1)
+
+            automation.log("🔥 Session %s has been closed" % other_args[1])
+            sys.exit(0)
+
+        response = client.request({'op': 'sessions'}, start=False)
+
+        if not response or not response['sessions']:
+            automation.log("🔥 There are no running sessions")
+            sys.exit(0)
+
+        automation.log("🔥 The running sessions are: \n")
+
+        for session in response['sessions']:
+            automation.log("✨ {id}: {kind} {alias} ({chain}), \tIDLE: {idle}s{state}".format(
+                state=', ATTACHED' if session['attached'] else '', **session))
+
+        sys.exit(0)
+    elif first_arg == automation.CHECK:
+        from reachability import Reachability
+
+        options = dict(map(lambda x: x.split("=", 1) if '=' in x else (x, ''), long_options))
+        timeout = Reachability.TIMEOUT
+        parallel = Reachability.CONCURRENCY
+
+        try:
+            for name, value in options.items():
+                if name == 'timeout':
+                    timeout = float(value)
+                elif name == 'parallel':
+                    parallel = max(1, int(value))
+                else:
+                    automation.log('🧊 Unknown option: {}{}'.format(automation.ARGS_LONG_PREFIX, name))
+                    sys.exit(1)
+        except ValueError:
+            automation.log('🧊 The options --timeout and --parallel require a number')
+            sys.exit(1)
+
+        if other_args:
+            servers = automation.resolve_aliases(other_args)
+        else:
+            servers = [(item['aliases'][0], item) for item in automation.get_registry().servers]
+
+        from server_management import ServerManagementError
+
+        # Servers with an invalid route are reported and the others checked
+        automation.INTERACTIVE = False
+        routes = []
+        states = {}
+
+        for alias, details in servers:
+            try:
+                routes.append((alias, automation.get_route(details)))
+            except ServerManagementError as error:
+                states['invalid'] = states.get('invalid', 0) + 1
+                automation.log("🧊 {alias} ({server}) is invalid: {error}".format(
+                    alias=alias, server=details['server'], error=error))
+
+        results = Reachability(automation.REACHABILITY_CACHE, automation.CHECK_TTL).check(routes, timeout, parallel)
+
+        for alias, details, result in results:
+            states[result['state']] = states.get(result['state'], 0) + 1
+
+            if result['state'] == Reachability.UP:
+                automation.log("🔥 {alias} ({server}) is up in {ms}ms: {banner}".format(
+                    alias=alias, server=details['server'], **result))
+            elif result['state'] == Reachability.UNVERIFIED:
+                automation.log("✨ {alias} ({server}) was not checked: {error}".format(
+                    alias=alias, server=details['server'], **result))
+            elif result['state'] == Reachability.UNRESOLVED:
+                automation.log("🙈 {alias} ({server}) could not be resolved here, ssh may still resolve it: "
+                               "{error}".format(alias=alias, server=details['server'], **result))
+            else:
+                automation.log("🧊 {alias} ({server}) is {state}: {error}".format(
+                    alias=alias, server=details['server'], **result))
+
+        automation.log("\n{} servers: {}".format(len(servers), ", ".join(
+            "{} {}".format(count, state) for state, count in sorted(states.items()))))
+
+        sys.exit(1 if set(states) - {Reachability.UP, Reachability.UNVERIFIED, Reachability.UNRESOLVED} else 0)
+    elif first_arg == automation.REPLAY:
+        from session_recorder import SessionReplay
+
+        options = dict(map(lambda x: x.split("=", 1) if '=' in x else (x, ''), long_options))
+        arguments = [arg for arg in other_args if not is_option(arg, automation.ARGS_SHORT_PREFIX)]
+        start, speed, idle_limit = 0, 1.0, None
+
+        try:
+            for name, value in options.items():
+                if name == 'from':
+                    start = float(value)
+                elif name == 'speed':
+                    speed = float(value)
+
+                    if speed <= 0:
+                        raise ValueError()
+                elif name == 'idle-limit':
+                    idle_limit = float(value)
+                else:
+                    automation.log('🧊 Unknown option: {}{}'.format(automation.ARGS_LONG_PREFIX, name))
+                    sys.exit(1)
+        except ValueError:
+            automation.log('🧊 The options --from, --speed and --idle-limit require a positive number')
+            sys.exit(1)
+
+        if not arguments:
+            automation.log("🧊 Please pass a recording. Format \"./server_automation.py replay file\"")
+            sys.exit(1)
+
+        try:
+            replay = SessionReplay(arguments[0])
+        except (OSError, ValueError) as error:
+            automation.log("🧊 Could not read the recording: %s" % error)
+            sys.exit(1)
+
+        try:
+            replay.play(start, speed, idle_limit)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            replay.close()
+
+        sys.exit(0)
+    elif first_arg == automation.COMPLETE:
+        from alias_completion import AliasCompletion
+        from alias_registry import ConfigError
+
+        try:
+            aliases = AliasCompletion(automation.CONFIG_FILE).complete(args[1] if len(args) > 1 else '')
+        except ConfigError as error:
+            automation.log('🧊 {}'.format(error))
+            sys.exit(1)
+
+        print("\n".join(aliases))
+        sys.exit(0)
+    elif first_arg == automation.TRACE:
+        import fnmatch
+        import os
+
+        from login_trace import Tracer
+
+        if not os.path.exists(automation.TRACE_HISTORY):
+            automation.log("🔥 No logins have been traced yet")
+            sys.exit(0)
+
+        rows = Tracer.summary(automation.TRACE_HISTORY)
+
+        if other_args:
+            rows = [row for row in rows if any(fnmatch.fnmatchcase(row['alias'], pattern) or
+                                               fnmatch.fnmatchcase(str(row['server']), pattern)
+                                               for pattern in other_args)]
+
+        automation.log("🔥 Login latency per server and phase in milliseconds: \n")
+
+        for row in rows:
+            if row['phase'] == 'total':
+                automation.log("✨ {alias} ({server}), \tLOGINS: {count}, \tP50: {p50}, \tP95: {p95}".format(**row))
+            else:
+                automation.log("    {phase}: \tP50: {p50}, \tP95: {p95}".format(**row))
+
+        sys.exit(0)
     else:
         automation.log('🧊 Unimplemented command {command} {accepted_commands}'.format(
             command=first_arg,
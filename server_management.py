@@ -1,16 +1,13 @@
 #!/usr/bin/env python3
-# Try to import the pyyaml, pexpect module
-import signal
-
-try:
-    import fcntl
-    import os
-    import struct
-    import sys
-    import termios
-    import yaml
-    import pexpect
-except ImportError:
+# Check that the pyyaml, pexpect modules are installed. They are only imported by the commands that use them
+# so that commands such as list start quickly
+from importlib.machinery import PathFinder
+import os
+import sys
+
+from alias_registry import CONFIG_ENVIRONMENT, DEFAULT_CONFIG_FILE, AliasRegistry, ConfigError
+
+if PathFinder.find_spec('yaml') is None or PathFinder.find_spec('pexpect') is None:
     print('Please install all required modules by running '
           '`python3 -m pip install -r requirements.txt `')
 
@@ -24,6 +21,10 @@ if sys.version_info.major < 3:
     sys.exit(1)
 
 
+class ServerManagementError(Exception):
+    """Raised instead of exiting when a non interactive operation fails"""
+
+
 class ServerManagement:
     # Define the constant to hold the special string that will be used as
     # the delimiter when splitting the arguments from the command line
@@ -36,15 +37,98 @@ class ServerManagement:
     PASSWORD_TEXT = 'assword:'
     COMMAND_TO_RUN = None
     FINAL_SERVER_DETAILS = None
+    PARALLEL = 10
+
+    # The run command groups the servers with the same output with --aggregate, printing how many servers are in
+    # every group every AGGREGATE_INTERVAL seconds
+    AGGREGATE = False
+    AGGREGATE_INTERVAL = 2
+
+    # Lines of command output longer than this are streamed in parts
+    STREAM_LINE_LIMIT = 65536
+    STREAM_READ_SIZE = 65536
+    REUSE_SESSION = False
+
+    # Port forwards that only log in while clients are connected, and the seconds without clients after which
+    # their chains are closed
+    LAZY_FORWARD = False
+    FORWARD_IDLE_TIMEOUT = 300
+
+    # Login modes. Jump logs into a chain of servers with a single ssh -J command while nested runs ssh
+    # inside the shell of every proxy server. Servers with `loginMode: nested` are always logged into nested
+    JUMP_LOGIN = 'jump'
+    NESTED_LOGIN = 'nested'
+    LOGIN_MODE = JUMP_LOGIN
+
+    # Interactive sessions that log in again when a connection is lost, with the seconds between the keepalives
+    # ssh sends to detect dead connections and the keepalives left unanswered before a connection is lost
+    RECONNECT = False
+    KEEPALIVE_INTERVAL = None
+    KEEPALIVE_COUNT = 3
+    RECONNECT_INTERVAL = 15
+    RECONNECT_ATTEMPTS = 10
+
+    # Asciicast file the interactive session is recorded to with --record
+    RECORD_FILE = None
+
+    # Interactive sessions copied by PtyRelay with large reads and writes instead of pexpect's interact(), with
+    # --relay
+    RELAY = False
+
+    # Options that do not take a value
+    FLAG_OPTIONS = ['reuse', 'nested', 'lazy', 'reconnect', 'record', 'relay']
+
+    # Non interactive sessions raise errors instead of handing the session over to the user
+    INTERACTIVE = True
+    QUIET = False
 
     # Commands that will be used through the command line
     CONNECT = 'connect'
     LIST = 'list'
     PORT_FORWARD = 'pf'
+    RUN = 'run'
+    BROKER = 'broker'
+    SESSIONS = 'sessions'
+    TRACE = 'trace'
+    CHECK = 'check'
+    COMPLETE = 'complete'
+    REPLAY = 'replay'
+    PIPELINE = 'pipeline'
+    PUSH = 'push'
+    PULL = 'pull'
+    WORKSPACE = 'workspace'
 
     # Config file
     # CONFIG_FILE = os.path.dirname(os.path.realpath(__file__)) + '/config.yaml'
-    CONFIG_FILE = '/Users/maxwellnderitu/Programs/server-automation/config.yaml'
+    CONFIG_FILE = os.environ.get(CONFIG_ENVIRONMENT, DEFAULT_CONFIG_FILE)
+
+    # Directory holding the state of the application such as the session broker socket
+    STATE_DIR = os.path.expanduser('~/.server_automation')
+    BROKER_SOCKET = os.path.join(STATE_DIR, 'broker.sock')
+    RECORDINGS_DIR = os.path.join(STATE_DIR, 'recordings')
+
+    # File the timing spans of the logins are written to with --trace, and the history of the hop and
+    # phase timings of every login used by the trace command
+    TRACE_FILE = None
+    TRACE_HISTORY = os.path.join(STATE_DIR, 'trace_history.jsonl')
+
+    # Results of the check command, logins stop early on servers found down within the last CHECK_TTL seconds
+    REACHABILITY_CACHE = os.path.join(STATE_DIR, 'reachability.json')
+    CHECK_TTL = 300
+
+    # The prompts of the servers learned at their first login, the next logins wait for them exactly
+    PROMPT_FINGERPRINTS = os.path.join(STATE_DIR, 'prompt_fingerprints.json')
+    PERMISSION_DENIED_TEXT = 'Permission denied'
+
+    # The TOTP secrets servers refer to with totpKey, the verification codes of servers with a secret are generated
+    TOTP_KEYRING = os.path.join(STATE_DIR, 'totp_keys.yaml')
+
+    # The time logins through every route took. Servers with candidate proxy servers are logged into through
+    # all their routes fastest first, starting the next route RACE_STAGGER seconds or RACE_FACTOR times the time
+    # the current one took at earlier logins after it
+    ROUTE_HISTORY = os.path.join(STATE_DIR, 'route_history.json')
+    RACE_STAGGER = 0.5
+    RACE_FACTOR = 2
 
     # Accepted commands
     ACCEPTED_COMMANDS = {
@@ -60,13 +144,40 @@ class ServerManagement:
                   
                   --verification-code, -vc - Passes the verification code for servers that require one
 
+                  --reuse - Attaches to a logged in session kept by the session broker instead of
+                            logging in again. Press Ctrl-] to detach and leave the session running
+
+                  --nested - Logs into every proxy server one after the other from the shell of
+                             the previous one instead of using a single ssh -J command
+
+                  --trace - Writes the time taken by every hop and login phase to a file as JSON lines
+
+                  --reconnect - Logs in again when a connection is lost. Nested logins only log into
+                                the servers from the lost one again
+
+                  --keepalive - Seconds between the keepalives used to find lost connections.
+                                Default 15 with --reconnect
+
+                  --record - Records the output of the session to an asciicast file, played with the
+                             replay command. Default ~/.server_automation/recordings/alias-time.cast
+
+                  --relay - Copies the session with large buffered reads and writes, for sessions printing
+                            a lot of output. Press Ctrl-] to leave the session
+
                   Example ./server_automation connect saved_alias
                   """,
             "options": [
-                {'logForm': 'timeout'},
+                {'longForm': 'timeout'},
                 {'longForm': 'test'},
                 {'longForm': 'command'},
-                {'longForm': 'verification-code', 'shortForm': 'v'}
+                {'longForm': 'verification-code', 'shortForm': 'v'},
+                {'longForm': 'reuse'},
+                {'longForm': 'nested'},
+                {'longForm': 'trace'},
+                {'longForm': 'reconnect'},
+                {'longForm': 'keepalive'},
+                {'longForm': 'record'},
+                {'longForm': 'relay'}
             ]
         },
         LIST: {
@@ -80,10 +191,275 @@ class ServerManagement:
         },
         PORT_FORWARD: {
             "desc": """
-                  Creates a port forwarding from the server specified.
-                  Format: ./server_automation pf local_port destination_alias:port  
+                  Creates port forwardings from the servers specified. All the ports of a server are
+                  forwarded over one chain of logins. Forward groups defined in the forwards section of
+                  the config file can be passed by name. Forwards to a server that is already being
+                  forwarded are added to the running chain without logging in again.
+                  Format: ./server_automation pf local_port destination_alias:port [local_port destination_alias:port...]
+
+                  OPTIONS
+                  --reuse - Hands the port forward over to the session broker which keeps it
+                            alive in the background
+
+                  --nested - Logs into every proxy server one after the other from the shell of
+                             the previous one instead of using a single ssh -J command
+
+                  --trace - Writes the time taken by every hop and login phase to a file as JSON lines
+
+                  --lazy - Listens on the local ports and only logs into the servers when a client connects.
+                           The clients share one chain per server
+
+                  --idle-timeout - Seconds without clients after which the chain of a --lazy forward is
+                                   closed. Default 300
+
+                  --relay - Copies the session with large buffered reads and writes, for sessions printing
+                            a lot of output. Press Ctrl-] to leave the session
+
+                  Example ./server_automation pf 1400 rebex:80 1443 rebex:443
+                  """,
+            "options": []
+        },
+        RUN: {
+            "desc": """
+                  Runs a command on many servers at once and prints the output of every server
+                  as soon as it finishes. Aliases can be glob patterns.
+                  Format: ./server_automation run alias [alias...] --command=command
+
+                  OPTIONS
+                  --command - Specifies the command you want to run on the servers
+
+                  --parallel - Specifies how many servers are logged into at the same time. Default 10
+
+                  --timeout - Specifies the time in seconds to wait for the command to finish when
+                              the server has no timeout configured
+
+                  --verification-code, -v - Passes the verification code for servers that require one
+
+                  --reuse - Runs the command over sessions kept by the session broker
+
+                  --nested - Logs into every proxy server one after the other from the shell of
+                             the previous one instead of using a single ssh -J command
+
+                  --trace - Writes the time taken by every hop and login phase to a file as JSON lines
+
+                  --aggregate - Groups the servers with the same output and exit status. Every output is
+                                printed once with the servers that gave it, large outputs are kept on disk
+
+                  Example ./server_automation run 'web*' db1 --command="uptime" --parallel=20
+                  """,
+            "options": [
+                {'longForm': 'command'},
+                {'longForm': 'parallel'},
+                {'longForm': 'timeout'},
+                {'longForm': 'verification-code', 'shortForm': 'v'},
+                {'longForm': 'reuse'},
+                {'longForm': 'nested'},
+                {'longForm': 'trace'},
+                {'longForm': 'aggregate'}
+            ]
+        },
+        WORKSPACE: {
+            "desc": """
+                  Logs into many servers at once and keeps all their sessions in one window with a status
+                  bar on the last row. Press Ctrl-] then n or p for the next or previous session, 1 to 9
+                  or 0 for a session by number, x to close the session shown and d to leave, closing all
+                  the sessions. Sessions marked with + have output not seen yet.
+                  Format: ./server_automation workspace alias [alias...]
+
+                  OPTIONS
+                  --parallel - Specifies how many servers are logged into at the same time. Default 10
+
+                  --timeout - Specifies the time in seconds to wait for every server to log in when
+                              the server has no timeout configured
+
+                  --verification-code, -v - Passes the verification code for servers that require one
+
+                  --nested - Logs into every proxy server one after the other from the shell of
+                             the previous one instead of using a single ssh -J command
+
+                  --trace - Writes the time taken by every hop and login phase to a file as JSON lines
+
+                  Example ./server_automation workspace 'web*' db1
+                  """,
+            "options": [
+                {'longForm': 'parallel'},
+                {'longForm': 'timeout'},
+                {'longForm': 'verification-code', 'shortForm': 'v'},
+                {'longForm': 'nested'},
+                {'longForm': 'trace'}
+            ]
+        },
+        PUSH: {
+            "desc": """
+                  Sends a file to many servers at once, streamed through the proxy servers without
+                  copying it to them. A file partly sent before is resumed from its first chunk that
+                  differs, and the checksum of the whole file is verified after the transfer.
+                  Format: ./server_automation push local_file remote_path alias [alias...]
+
+                  OPTIONS
+                  --parallel - Specifies how many servers are sent the file at the same time. Default 10
+
+                  --timeout - Specifies the time in seconds to wait for every server to log in when
+                              the server has no timeout configured
+
+                  --verification-code, -v - Passes the verification code for servers that require one
+
+                  Example ./server_automation push build.tar.gz /tmp/ 'web*'
+                  """,
+            "options": [
+                {'longForm': 'parallel'},
+                {'longForm': 'timeout'},
+                {'longForm': 'verification-code', 'shortForm': 'v'}
+            ]
+        },
+        PULL: {
+            "desc": """
+                  Fetches a file from many servers at once into local_dir/alias/file, streamed through
+                  the proxy servers without copying it to them. A file partly fetched before is resumed
+                  and the checksum of the whole file is verified after the transfer.
+                  Format: ./server_automation pull remote_file local_dir alias [alias...]
+
+                  OPTIONS
+                  --parallel - Specifies how many servers the file is fetched from at the same time. Default 10
+
+                  --timeout - Specifies the time in seconds to wait for every server to log in when
+                              the server has no timeout configured
+
+                  --verification-code, -v - Passes the verification code for servers that require one
+
+                  Example ./server_automation pull /var/log/syslog logs 'web*'
+                  """,
+            "options": [
+                {'longForm': 'parallel'},
+                {'longForm': 'timeout'},
+                {'longForm': 'verification-code', 'shortForm': 'v'}
+            ]
+        },
+        PIPELINE: {
+            "desc": """
+                  Runs a job from the jobs section of the config file. Every step of the job runs a command
+                  on the servers matching its aliases once the steps it needs succeeded, and steps that do
+                  not depend on each other run at the same time. Sessions are logged into once and shared by
+                  the steps. Without a job the jobs are listed.
+                  Format: ./server_automation pipeline [job]
+
+                  OPTIONS
+                  --parallel - Specifies how many servers are handled at the same time across all the
+                               steps. Default 10
+
+                  --failure - fail-fast stops starting commands once one fails, continue only skips the steps
+                              that need a failed one. Default the failure of the job or fail-fast
+
+                  --timeout - Specifies the time in seconds to wait for the commands of steps and servers
+                              with no timeout configured
+
+                  --verification-code, -v - Passes the verification code for servers that require one
+
+                  --reuse - Runs the commands over sessions kept by the session broker
+
+                  --nested - Logs into every proxy server one after the other from the shell of
+                             the previous one instead of using a single ssh -J command
+
+                  --trace - Writes the time taken by every hop and login phase to a file as JSON lines
+
+                  Example ./server_automation pipeline deploy --failure=continue
+                  """,
+            "options": [
+                {'longForm': 'parallel'},
+                {'longForm': 'failure'},
+                {'longForm': 'timeout'},
+                {'longForm': 'verification-code', 'shortForm': 'v'},
+                {'longForm': 'reuse'},
+                {'longForm': 'nested'},
+                {'longForm': 'trace'}
+            ]
+        },
+        BROKER: {
+            "desc": """
+                  Runs the session broker in the foreground. The broker keeps logged in sessions
+                  alive so that commands using --reuse do not log in again. It is started in the
+                  background automatically when needed.
+
+                  OPTIONS
+                  --idle-timeout - Seconds after which an unused session is closed. Default 600
+
+                  --max-sessions - Maximum number of sessions kept alive. Default 10
+
+                  Example ./server_automation broker --idle-timeout=1800
+                  """,
+            "options": [
+                {'longForm': 'idle-timeout'},
+                {'longForm': 'max-sessions'}
+            ]
+        },
+        SESSIONS: {
+            "desc": """
+                  Lists the sessions kept alive by the session broker.
+                  Format: ./server_automation sessions [close session_id | stop]
+
+                  Example ./server_automation sessions close 2
+                  """,
+            "options": []
+        },
+        CHECK: {
+            "desc": """
+                  Checks which servers are reachable by connecting to all of them at the same time and
+                  reading their SSH banner. Servers behind proxy servers are unreachable when a server of
+                  their route is down. Connecting to a server found down in the last 5 minutes fails
+                  right away.
+                  Format: ./server_automation check [alias...]
+
+                  OPTIONS
+                  --timeout - Seconds to wait for every server. Default 3
+
+                  --parallel - Maximum number of servers checked at the same time. Default 512
+
+                  Example ./server_automation check 'web*' --timeout=5
+                  """,
+            "options": [
+                {'longForm': 'timeout'},
+                {'longForm': 'parallel'}
+            ]
+        },
+        COMPLETE: {
+            "desc": """
+                  Prints the aliases completing a word, used by the bash and zsh completion scripts in
+                  the completion folder. Aliases starting with the word come first, then the aliases
+                  and servers containing it and then the ones containing its letters in order.
+                  Format: ./server_automation complete [word]
+
+                  Example ./server_automation complete web
+                  """,
+            "options": []
+        },
+        REPLAY: {
+            "desc": """
+                  Plays a session recorded with connect --record. Long recordings can be started from
+                  any time without reading them from the start.
+                  Format: ./server_automation replay file
+
+                  OPTIONS
+                  --from - Seconds from the start of the recording to play from
+
+                  --speed - Playback speed. Default 1
+
+                  --idle-limit - Longest pause in seconds between two outputs
+
+                  Example ./server_automation replay web1.cast --from=600 --speed=2
+                  """,
+            "options": [
+                {'longForm': 'from'},
+                {'longForm': 'speed'},
+                {'longForm': 'idle-limit'}
+            ]
+        },
+        TRACE: {
+            "desc": """
+                  Shows the p50 and p95 time in milliseconds taken by every server and login phase
+                  across the previous logins, slowest servers first.
+                  Format: ./server_automation trace [alias...]
 
-                  Example ./server_automation pf 1400 rebex:80
+                  Example ./server_automation trace 'bastion*'
                   """,
             "options": []
         },
@@ -92,20 +468,81 @@ class ServerManagement:
     # The controller object
     controller = None
 
-    @staticmethod
-    def log(result, other=None):
+    # The recorder of the interactive session
+    recorder = None
+
+    # The alias registry, loaded on first use
+    registry = None
+    planner = None
+    reachability = None
+    fingerprints = None
+    totp = None
+    route_history = None
+
+    # The route of the last login, and the logins racing through candidate routes that are cancelled once one
+    # of them is logged into
+    route = None
+    racing = False
+    cancelled = False
+
+    # The expect engine and the time in seconds taken by the last expected() call
+    expect_engine = None
+    last_expect_seconds = None
+
+    # The tracer collecting the timing spans of the logins, the server and hop number being logged into
+    tracer = None
+    traced_server = None
+    traced_hop = None
+    last_expect_span = None
+    hops_logged_in = 0
+
+    def log(self, result, other=None):
         """Logging the results into the console"""
+        if self.QUIET:
+            return
+
         if other is None:
             print(result)
         else:
             print(result, other)
 
-    def expected(self, expected_string, timeout=APP_TIMEOUT):
-        """Function to handle the expected output"""
+    def abort(self, message):
+        """
+        Stops the current operation. Interactive sessions exit the application while non interactive
+        ones (such as the workers of the run command) raise a ServerManagementError
+        :param message: The reason for stopping
+        """
+        if not self.INTERACTIVE:
+            raise ServerManagementError(message.lstrip('🧊 '))
+
+        self.log(message)
+        sys.exit(1)
+
+    def expected(self, expected_string, timeout=APP_TIMEOUT, retain=-1, phase=None, fail_on_timeout=True):
+        """
+        Function to handle the expected output
+        :param expected_string: The pattern or list of patterns expected
+        :param timeout: Time in seconds to wait for the patterns
+        :param retain: Bytes of the output before the match kept in controller.before, None keeps everything
+        :param phase: The login phase the wait is traced as, other waits are traced as expect spans
+        :param fail_on_timeout: Return None instead of failing when nothing matched within the timeout
+        :return: the pattern matched
+        """
+        import pexpect
+        from expect_engine import ExpectEngine
+
+        if self.expect_engine is None:
+            self.expect_engine = ExpectEngine()
+
+        patterns = expected_string if isinstance(expected_string, list) else [expected_string]
 
         # Check if the string passed is the expected string
         try:
-            index = self.controller.expect(expected_string, timeout=timeout)
+            try:
+                index = self.expect_engine.expect(self.controller, patterns, timeout, retain)
+            finally:
+                self.last_expect_seconds = self.expect_engine.last_match_seconds
+                self.trace_expect(phase, self.expect_engine.last_pattern)
 
             if isinstance(expected_string, list):
                 return expected_string[index]
@@ -113,163 +550,766 @@ class ServerManagement:
                 return expected_string
 
         except pexpect.EOF:
-            self.log("🧊 EOF, Failed to match expected string: ", expected_string)
-            self.log("\t🧊 Expected: ", expected_string)
-            self.log("\t🧊 Received: ", self.controller.before)
-            self.log("\t🧊 Error: ", self.controller.after)
-
-            signal.signal(signal.SIGWINCH, self.sigwinch_pass_through)
-            self.controller.interact()
-            sys.exit(1)
+            self.expected_failed("🧊 EOF, Failed to match expected string: ", expected_string)
         except pexpect.TIMEOUT:
-            self.log("🧊 TIMEOUT, Failed to match expected string: ", expected_string)
-            self.log("\t🧊 Expected: ", expected_string)
-            self.log("\t🧊 Received: ", self.controller.before)
-            self.log("\t🧊 Error: ", self.controller.after)
+            if not fail_on_timeout:
+                return None
 
-            signal.signal(signal.SIGWINCH, self.sigwinch_pass_through)
-            self.controller.interact()
-            sys.exit(1)
+            self.expected_failed("🧊 TIMEOUT, Failed to match expected string: ", expected_string)
         except:
-            self.log("🧊 Failed to match expected string: ", expected_string)
-            self.log("\t🧊 Expected: ", expected_string)
-            self.log("\t🧊 Received: ", self.controller.before)
-            self.log("\t🧊 Error: ", self.controller.after)
+            self.expected_failed("🧊 Failed to match expected string: ", expected_string)
 
-            signal.signal(signal.SIGWINCH, self.sigwinch_pass_through)
-            self.controller.interact()
-            sys.exit(1)
+    def expected_failed(self, reason, expected_string):
+        """
+        Reports a failed expect. Interactive sessions are handed over to the user before exiting
+        :param reason: The failure description
+        :param expected_string: The string(s) that were expected
+        """
+        import signal
+
+        if not self.INTERACTIVE:
+            raise ServerManagementError("%s%s, Received: %s" % (reason.lstrip('🧊 '), expected_string,
+                                                                 self.controller.before))
+
+        self.log(reason, expected_string)
+        self.log("\t🧊 Expected: ", expected_string)
+        self.log("\t🧊 Received: ", self.controller.before)
+        self.log("\t🧊 Error: ", self.controller.after)
+
+        signal.signal(signal.SIGWINCH, self.sigwinch_pass_through)
+        self.controller.interact()
+        sys.exit(1)
 
-    def ssh_log_in(self, server_ip, username, password, port=22, timeout=APP_TIMEOUT, require_verification_code=False):
+    def get_tracer(self):
         """
-        This function logs in into a server with the arguments passed
+        Get the tracer collecting the timing spans of the logins
+        :return: Tracer
+        """
+        if self.tracer is None:
+            from login_trace import Tracer
+
+            self.tracer = Tracer()
+
+        return self.tracer
+
+    def trace_expect(self, phase, matched):
+        """
+        Record the last expected() call as a phase of the server being logged into or as an expect span
+        :param phase: The login phase or None
+        :param matched: The pattern matched or None if nothing matched
+        """
+        import time
+
+        duration = self.last_expect_seconds
+
+        # The expect spans are only written to the trace file, without one they are only kept once they turn
+        # into a phase so that long sessions do not collect a span for every command
+        if phase is None:
+            self.last_expect_span = self.get_tracer().record('expect', time.time() - duration, duration,
+                                                             keep=self.TRACE_FILE is not None,
+                                                             server=self.traced_server, matched=matched)
+        else:
+            self.last_expect_span = self.get_tracer().record('phase', time.time() - duration, duration,
+                                                             server=self.traced_server, hop=self.traced_hop,
+                                                             phase=phase, matched=matched)
+
+    def relabel_phase(self, server, hop, phase):
+        """
+        Turn the last expect span into a phase span once the server that answered is known
+        """
+        if self.last_expect_span is not None and self.last_expect_span['name'] == 'expect':
+            self.last_expect_span.update(name='phase', server=server, hop=hop, phase=phase)
+
+            if self.TRACE_FILE is None:
+                self.get_tracer().add(self.last_expect_span)
+
+    def trace_dns(self, server_ip, port):
+        """
+        Time the name resolution of the first server when tracing to a file. ssh resolves the name again,
+        usually from the cache of the system
+        """
+        import socket
+
+        if self.TRACE_FILE is None or self.controller is not None:
+            return
+
+        with self.get_tracer().span('phase', server=server_ip, hop=self.traced_hop, phase='dns') as span:
+            try:
+                socket.getaddrinfo(server_ip, port, type=socket.SOCK_STREAM)
+            except (OSError, UnicodeError) as error:
+                span['error'] = str(error)
+
+    def spawn_or_send(self, command):
+        """
+        Spawns the ssh command, or runs it from the shell of the current session for nested logins
+        :param command: The ssh command
+        """
+        import pexpect
+
+        if self.cancelled:
+            raise ServerManagementError('The login was cancelled')
+
+        with self.get_tracer().span('phase', server=self.traced_server, hop=self.traced_hop, phase='spawn'):
+            if self.controller is None:
+                self.controller = pexpect.spawn(command)
+            else:
+                self.controller.sendline(command)
+
+    def save_trace(self):
+        """
+        Write the timing spans to the trace file if one was passed and add the hop and phase timings to
+        the trace history. Failing to write the history is not fatal
+        """
+        if self.tracer is None:
+            return
+
+        if self.TRACE_FILE:
+            self.tracer.write(self.TRACE_FILE)
+
+        try:
+            self.tracer.append_history(self.TRACE_HISTORY)
+        except OSError:
+            pass
+
+    def ssh_options(self, extra_options=''):
+        """
+        Get the options passed to every ssh command
+        :param extra_options: Other ssh options such as port forwards
+        """
+        options = []
+
+        if self.KEEPALIVE_INTERVAL:
+            options.append('-o ServerAliveInterval=%d -o ServerAliveCountMax=%d' % (self.KEEPALIVE_INTERVAL,
+                                                                                   self.KEEPALIVE_COUNT))
+
+        # A login racing others must not lose the ports it forwards to one of them
+        if self.racing:
+            options.append('-o ExitOnForwardFailure=yes')
+
+        if extra_options:
+            options.append(extra_options)
+
+        return ' '.join(options)
+
+    def get_fingerprints(self):
         """
+        Get the prompts of the servers learned at earlier logins
+        :return: PromptFingerprints
+        """
+        if self.fingerprints is None:
+            from prompt_fingerprints import PromptFingerprints
+
+            self.fingerprints = PromptFingerprints(self.PROMPT_FINGERPRINTS)
+
+        return self.fingerprints
+
+    def learnable_prompt(self, line):
+        """Check if the last line of the output after a login can be learned as the prompt of the server"""
+        from prompt_fingerprints import PromptFingerprints
+
+        return PromptFingerprints.looks_like_prompt(line) and not any(
+            text in line for text in [self.PASSWORD_TEXT, self.VERIFICATION_CODE_TEXT, self.PERMISSION_DENIED_TEXT])
+
+    def expect_shell_prompt(self, key, patterns, timeout, auth, server):
+        """
+        Wait for the shell prompt once the last password or verification code was sent. A prompt learned at an
+        earlier login is waited for exactly, for a few times the time it took then. Otherwise, or when it does
+        not come, the broad patterns are waited for and the prompt is learned
+        :param key: The cache key of the servers logged into
+        :param patterns: The patterns any logged in server shows
+        :param timeout: Time in seconds to wait for the prompt
+        :param auth: The prompts answered in order, such as ['password', 'verification']
+        :param server: The server logged into
+        """
+        import re
+        import time
+
+        from prompt_fingerprints import PromptFingerprints
+
+        fingerprints = self.get_fingerprints()
+        entry = fingerprints.get(key, auth)
+        started = time.monotonic()
+
+        if entry is not None:
+            matched = self.expected([re.escape(entry['prompt']), self.PERMISSION_DENIED_TEXT],
+                                    fingerprints.deadline(entry, timeout), retain=None, phase='shell_prompt',
+                                    fail_on_timeout=False)
+
+            if matched == self.PERMISSION_DENIED_TEXT:
+                self.abort("🧊 The password of the server: %s was not accepted" % server)
+
+            if matched is not None:
+                # Keep the prompt for an interactive session to show
+                self.controller.buffer = self.controller.after + self.controller.buffer
+
+                # The time of a prompt learned after a timeout is only known once it matched
+                if entry['seconds'] is None:
+                    fingerprints.learn(key, entry['prompt'], time.monotonic() - started, auth)
+
+                return
+
+            # The prompt changed, look for the broad patterns in the output received so far
+            self.log("🙈 The prompt of the server: %s changed, learning it again" % server)
 
+            fingerprints.forget(key)
+            self.controller.buffer = self.controller.before
+            timeout = max(0, timeout - (time.monotonic() - started))
+
+            # The new prompt may have come long before the deadline, its time is measured at the next login
+            started = None
+
+        matched = self.expected(patterns + [self.PERMISSION_DENIED_TEXT], timeout, phase='shell_prompt',
+                                fail_on_timeout=False)
+
+        if matched == self.PERMISSION_DENIED_TEXT:
+            self.abort("🧊 The password of the server: %s was not accepted" % server)
+
+        if matched is not None:
+            if fingerprints.learns(key):
+                prompt, received = PromptFingerprints.read_prompt(self.controller,
+                                                                  self.controller.before + self.controller.after)
+
+                if self.learnable_prompt(prompt):
+                    fingerprints.learn(key, prompt, None if started is None else received - started, auth)
+
+            return
+
+        # None of the patterns came, a server with an unusual prompt is logged in if it waits for a command
+        prompt = PromptFingerprints.last_line(self.controller.before)
+
+        if not self.controller.isalive() or not self.learnable_prompt(prompt):
+            self.expected_failed("🧊 TIMEOUT, Failed to match expected string: ", patterns)
+
+        self.log("🙈 Taking the last line as the prompt of the server: %s" % server)
+
+        self.controller.buffer = prompt.encode()
+
+        if fingerprints.learns(key):
+            fingerprints.learn(key, prompt, None, auth)
+
+    def ssh_log_in(self, server_ip, username, password, port=22, timeout=APP_TIMEOUT, require_verification_code=False,
+                   server_details=None):
+        """
+        This function logs in into a server with the arguments passed
+        :param server_details: The server details from the config file, used for the TOTP secret of the server
+        """
         # Spawn a ssh session
-        command = 'ssh %s@%s -p%d' % (username, server_ip, port)
+        command = ' '.join(filter(None, ['ssh', self.ssh_options(), '%s@%s -p%d' % (username, server_ip, port)]))
 
         # Log
         self.log("🥁 Logging in with the command: %s" % command)
 
         # Run the command
-        if self.controller is None:
-            self.controller = pexpect.spawn(command)
-        else:
-            self.controller.sendline(command)
+        self.traced_server, self.traced_hop = server_ip, self.hops_logged_in
+        self.trace_dns(server_ip, port)
+        self.spawn_or_send(command)
 
         accepted_login_strings = ['%s@' % username, '%s:' % username, 'bash',
                                   'successful login', 'Last login', 'Welcome to lshell']
+        key = self.get_fingerprints().key([{'username': username, 'server': server_ip, 'port': port}])
 
         # Expect the password
-        input_received = self.expected([self.PASSWORD_TEXT, self.VERIFICATION_CODE_TEXT], timeout)
+        input_received = self.expected([self.PASSWORD_TEXT, self.VERIFICATION_CODE_TEXT], timeout, phase='connect')
 
         if input_received == self.PASSWORD_TEXT:
             self.log("🙈 Providing password")
 
             self.controller.sendline(password)
+            auth = ['password']
 
             if require_verification_code:
-                self.expected(self.VERIFICATION_CODE_TEXT, timeout)
+                self.expected(self.VERIFICATION_CODE_TEXT, timeout, phase='verification_prompt')
 
-                self.log("🙈 Providing verification code: %s" % self.VERIFICATION_CODE)
+                code = self.verification_code(server_details)
+                self.log("🙈 Providing verification code")
 
-                self.controller.sendline(self.VERIFICATION_CODE)
+                self.controller.sendline(code)
+                auth.append('verification')
 
             # Expect the username and server display name
-            self.expected(['%s@' % username, '%s:' % username, 'bash'], timeout)
+            self.expect_shell_prompt(key, ['%s@' % username, '%s:' % username, 'bash'], timeout, auth, server_ip)
 
             self.log("🔥 Successfully logged into the server: " + server_ip + "\n")
 
         elif input_received == self.VERIFICATION_CODE_TEXT:
-            self.log("🙈 Providing verification code: %s" % self.VERIFICATION_CODE)
+            code = self.verification_code(server_details)
+            self.log("🙈 Providing verification code")
 
-            self.controller.sendline(self.VERIFICATION_CODE)
+            self.controller.sendline(code)
 
-            self.expected(self.PASSWORD_TEXT, timeout)
+            self.expected(self.PASSWORD_TEXT, timeout, phase='password_prompt')
 
             self.log("🙈 Providing password")
 
             self.controller.sendline(password)
 
             # Expect the username and server display name
-            self.expected(accepted_login_strings, timeout)
+            self.expect_shell_prompt(key, accepted_login_strings, timeout, ['verification', 'password'], server_ip)
 
             self.log("🔥 Successfully logged into the server: " + server_ip + "\n")
 
         else:
             self.log("🔥 Successfully logged into the server: " + server_ip + "\n")
 
-    def ssh_port_forward(self, server_ip, username, password, port, local_port,
-                         destination_port, require_verification_code):
+        self.hops_logged_in += 1
+
+    def ssh_jump_log_in(self, route, extra_options=''):
         """
-        This function logs in into a server with the arguments passed and port forwards
+        This function logs into the last server of a route with a single ssh -J command, answering the
+        password and verification code prompts of every server of the route in order
+        :param route: Route to the server
+        :param extra_options: Other ssh options such as port forwards
         """
+        import time
 
-        # Spawn a ssh session
-        command = f"ssh -p{port} -L localhost:{local_port}:localhost:{destination_port} {username}@{server_ip}"
+        command = route.ssh_command(self.ssh_options(extra_options))
 
         # Log
-        self.log("🥁 Port forwarding with the command: %s" % command)
+        self.log("🥁 Logging in with the command: %s" % command)
 
         # Run the command
-        if self.controller is None:
-            self.controller = pexpect.spawn(command)
-        else:
-            self.controller.sendline(command)
+        first_hop = self.hops_logged_in
+        self.traced_server, self.traced_hop = route.hops[0]['server'], first_hop
+        self.trace_dns(route.hops[0]['server'], int(route.hops[0].get('port', 22)))
+        self.spawn_or_send(command)
 
-        # Expect the password
-        self.expected('assword:')
+        hops = route.hops
+        username = route.target['username']
+        accepted_login_strings = ['%s@' % username, '%s:' % username, 'bash',
+                                  'successful login', 'Last login', 'Welcome to lshell']
 
-        # Insert the password
-        self.controller.sendline(password)
+        # The prompts naming a server come first so that they win over the generic ones
+        host_prompts = [route.password_prompt(hop) for hop in hops]
+        patterns = host_prompts + [self.PASSWORD_TEXT, self.VERIFICATION_CODE_TEXT] + accepted_login_strings
 
-        # Check if the server requires a verification code
-        if require_verification_code:
-            self.expected(self.VERIFICATION_CODE_TEXT)
+        passwords_sent = [False] * len(hops)
+        codes_sent = [False] * len(hops)
+        auth = []
+        current = 0
 
-            self.log("🙈 Providing verification code: %s" % self.VERIFICATION_CODE)
+        # Every hop is traced from the answer to the previous hop until its own last answer
+        hop_started = time.time(), time.perf_counter()
 
-            self.controller.sendline(self.VERIFICATION_CODE)
+        def trace_hop(position):
+            self.get_tracer().record('hop', hop_started[0], time.perf_counter() - hop_started[1],
+                                     alias=hops[position]['aliases'][0], server=hops[position]['server'],
+                                     hop=first_hop + position, mode=self.JUMP_LOGIN)
 
-        # Expect the username and server display name
-        self.expected(['%s@' % username, 'bash'])
+        def hop_done(position):
+            return passwords_sent[position] and (codes_sent[position] or not self.requires_verification_code(
+                hops[position]))
 
-        self.log("🔥 Successfully port forwarded to the server: " + server_ip + "\n")
+        while True:
+            timeout = hops[current].get('timeout', self.APP_TIMEOUT)
+            input_received = self.expected(patterns, timeout)
+            position = patterns.index(input_received)
+            previous = current
 
-    # Function to run command on the server
-    def run_command(self, command, expected_string=".*"):
-        self.log("🥁 Running the command %s" % command)
+            if position < len(hops) or input_received == self.PASSWORD_TEXT:
+                if position < len(hops):
+                    current = position
+                elif hop_done(current) and current < len(hops) - 1:
+                    current += 1
 
-        self.controller.sendline(command)
+                phase = 'connect' if current != previous or not (passwords_sent[current] or codes_sent[current]) \
+                    else 'password_prompt'
 
-        # Check if the string passed is the expected string
-        self.expected(expected_string)
+                if passwords_sent[current]:
+                    self.abort("🧊 The password of the server: %s was not accepted" % hops[current]['server'])
 
-    def get_server_details(self, server_alias):
-        """
-        Get the server details from the config file using the alias provided. The server details are username,
-        password, server, port, requiredServerLogIn
-        :param server_alias: String used to identify a server in the config file
-        :return: server details
-        """
-        found_alias = False
-        saved_aliases = []
-        server = None
+                self.log("🙈 Providing password for: %s" % hops[current]['server'])
 
-        with open(self.CONFIG_FILE, 'r') as file:
-            config = yaml.safe_load(file)
+                self.controller.sendline(hops[current]['password'])
+                passwords_sent[current] = True
+                auth.append('password')
 
-        # Get the username and password
-        for server_item in config['servers']:
-            saved_aliases.extend(server_item['aliases'])
+            elif input_received == self.VERIFICATION_CODE_TEXT:
+                if hop_done(current) and current < len(hops) - 1:
+                    current += 1
 
-            if server_alias in server_item['aliases']:
-                found_alias = True
-                server = server_item
-                break
+                phase = 'connect' if current != previous else 'verification_prompt'
 
-        if found_alias is False:
-            self.log('🧊 No alias with the name: \'{}\' does not exist. Get the available aliases using: '
+                code = self.verification_code(hops[current])
+                self.log("🙈 Providing verification code for %s" % hops[current]['server'])
+
+                self.controller.sendline(code)
+                codes_sent[current] = True
+                auth.append('verification')
+
+            else:
+                self.relabel_phase(hops[current]['server'], first_hop + current, 'shell_prompt')
+                trace_hop(current)
+                break
+
+            # The prompt of a new server ends the previous one
+            self.relabel_phase(hops[current]['server'], first_hop + current, phase)
+
+            if current != previous:
+                trace_hop(previous)
+                hop_started = time.time(), time.perf_counter()
+
+            # Every server of the route was answered, only the shell prompt of the last one is left
+            if current == len(hops) - 1 and hop_done(current):
+                self.traced_server, self.traced_hop = route.target['server'], first_hop + current
+                self.expect_shell_prompt(self.get_fingerprints().key(hops), accepted_login_strings,
+                                         route.target.get('timeout', self.APP_TIMEOUT), auth, route.target['server'])
+                trace_hop(current)
+                break
+
+        self.hops_logged_in += len(hops)
+        self.traced_server, self.traced_hop = route.target['server'], self.hops_logged_in - 1
+
+        self.log("🔥 Successfully logged into the server: " + route.target['server'] + "\n")
+
+    def ssh_port_forward(self, server_ip, username, password, port, forwards, require_verification_code,
+                         server_details=None):
+        """
+        This function logs in into a server with the arguments passed and port forwards
+        :param forwards: list of (local_port, destination_port) tuples
+        :param server_details: The server details from the config file, used for the TOTP secret of the server
+        """
+        # Spawn a ssh session
+        command = f"ssh -p{port} {self.ssh_options(self.forward_options(forwards))} {username}@{server_ip}"
+
+        # Log
+        self.log("🥁 Port forwarding with the command: %s" % command)
+
+        # Run the command
+        self.traced_server, self.traced_hop = server_ip, self.hops_logged_in
+        self.trace_dns(server_ip, port)
+        self.spawn_or_send(command)
+
+        # Expect the password
+        self.expected('assword:', phase='connect')
+
+        # Insert the password
+        self.controller.sendline(password)
+        auth = ['password']
+
+        # Check if the server requires a verification code
+        if require_verification_code:
+            self.expected(self.VERIFICATION_CODE_TEXT, phase='verification_prompt')
+
+            code = self.verification_code(server_details)
+            self.log("🙈 Providing verification code")
+
+            self.controller.sendline(code)
+            auth.append('verification')
+
+        # Expect the username and server display name
+        key = self.get_fingerprints().key([{'username': username, 'server': server_ip, 'port': port}])
+        self.expect_shell_prompt(key, ['%s@' % username, 'bash'], self.APP_TIMEOUT, auth, server_ip)
+
+        self.hops_logged_in += 1
+
+        self.log("🔥 Successfully port forwarded to the server: " + server_ip + "\n")
+
+    # Function to run command on the server
+    def run_command(self, command, expected_string=".*"):
+        self.log("🥁 Running the command %s" % command)
+
+        self.controller.sendline(command)
+
+        # Check if the string passed is the expected string
+        self.expected(expected_string)
+
+    def stream_command(self, command, timeout=APP_TIMEOUT, total_timeout=None, chunks=False):
+        """
+        Runs a command and yields its output line by line as it arrives. The command is wrapped with a
+        start and an end marker carrying its exit status, which is the return value of the generator.
+        Only the line being received is kept in memory so the output can be of any size.
+        :param command: The command to run
+        :param timeout: Time in seconds to wait for more output
+        :param total_timeout: Time in seconds to wait for the command to finish, None waits forever
+        :param chunks: Yield all the complete lines of every read at once instead of one line at a time
+        :return: generator of output lines, returning the exit status
+        """
+        import codecs
+        import re
+        import time
+        import uuid
+        import pexpect
+
+        marker = uuid.uuid4().hex
+        end_marker = ('END%s:' % marker).encode()
+        deadline = None if total_timeout is None else time.monotonic() + total_timeout
+
+        # The markers are split with '' so that the echoed command line does not match them. The command is on
+        # lines of its own inside a group, so that a trailing & or # comment does not swallow the end marker, and
+        # the shell reads the whole group, echoing it, before the start marker is printed
+        self.controller.sendline("echo START''%s; {\n%s\n}; echo END''%s:$?" % (marker, command, marker))
+
+        self.expected('START%s\r?\n' % marker, timeout)
+
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        pending = bytearray(self.controller.buffer)
+        self.controller.buffer = b''
+
+        while True:
+            # Yield the complete lines received
+            end = pending.find(end_marker)
+            limit = len(pending) if end < 0 else end
+            line_end = pending.rfind(b'\n', 0, limit)
+
+            if line_end >= 0:
+                text = decoder.decode(bytes(pending[:line_end + 1])).replace('\r\n', '\n')
+
+                if chunks:
+                    yield text
+                else:
+                    for line in text.split('\n')[:-1]:
+                        yield line + '\n'
+
+                del pending[:line_end + 1]
+                limit -= line_end + 1
+                end = end if end < 0 else limit
+
+            if end >= 0:
+                exit_status = re.match(rb'(\d+)\r?\n', bytes(pending[end + len(end_marker):]))
+
+                if exit_status is not None:
+                    # Output that does not end with a new line is followed by the end marker
+                    if end:
+                        yield decoder.decode(bytes(pending[:end]), final=True)
+
+                    self.controller.buffer = bytes(pending[end + len(end_marker) + exit_status.end():])
+                    return int(exit_status.group(1))
+
+            elif len(pending) > self.STREAM_LINE_LIMIT:
+                # Very long lines are yielded in parts, keeping enough to find a split end marker
+                part = len(pending) - len(end_marker)
+                yield decoder.decode(bytes(pending[:part]))
+                del pending[:part]
+
+            remaining = timeout if deadline is None else min(timeout, deadline - time.monotonic())
+
+            try:
+                if remaining <= 0:
+                    raise pexpect.TIMEOUT('Timeout exceeded.')
+
+                pending += self.controller.read_nonblocking(self.STREAM_READ_SIZE, remaining)
+            except pexpect.TIMEOUT:
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.abort("🧊 TIMEOUT, The command did not finish within %s seconds: %s" % (total_timeout,
+                                                                                                 command))
+
+                self.abort("🧊 TIMEOUT, No output received for %s seconds from the command: %s" % (timeout, command))
+            except pexpect.EOF:
+                self.abort("🧊 EOF, The connection closed while running the command: %s" % command)
+
+    def run_command_with_status(self, command, timeout=APP_TIMEOUT, output=None):
+        """
+        Runs a command and waits for it to finish
+        :param command: The command to run
+        :param timeout: Time in seconds to wait for the command to finish
+        :param output: Object with a write method the output is passed to as it arrives instead of being kept
+        :return: tuple of the exit status and the output of the command, empty with an output object
+        """
+        lines = []
+        write = lines.append if output is None else output.write
+        stream = self.stream_command(command, timeout, timeout, chunks=output is not None)
+
+        while True:
+            try:
+                write(next(stream))
+            except StopIteration as stop:
+                return stop.value, ''.join(lines)
+
+    def resolve_aliases(self, patterns):
+        """
+        Gets the servers matching the aliases passed. Aliases can be glob patterns
+        :param patterns: list of aliases or glob patterns
+        :return: list of (alias, server details) with every server appearing once
+        """
+        import fnmatch
+
+        registry = self.get_registry()
+        matched = []
+        seen = set()
+
+        for pattern in patterns:
+            if pattern in registry.aliases:
+                aliases = [pattern]
+            else:
+                aliases = [alias for alias in registry.aliases if fnmatch.fnmatchcase(str(alias), pattern)]
+
+            if not aliases:
+                self.log('🧊 No alias matches: \'{}\'. Get the available aliases using: '
+                         ' `./server_automation.py list`'.format(pattern))
+                sys.exit(1)
+
+            for alias in aliases:
+                server = registry.get(alias)
+
+                if id(server) not in seen:
+                    seen.add(id(server))
+                    matched.append((alias, server))
+
+        return matched
+
+    def new_worker(self):
+        """
+        Get a non interactive session with the same settings, used to log into other servers at the same time
+        :return: ServerManagement
+        """
+        worker = ServerManagement()
+        worker.CONFIG_FILE = self.CONFIG_FILE
+        worker.registry = self.get_registry()
+        worker.VERIFICATION_CODE = self.VERIFICATION_CODE
+        worker.APP_TIMEOUT = self.APP_TIMEOUT
+        worker.LOGIN_MODE = self.LOGIN_MODE
+        worker.KEEPALIVE_INTERVAL = self.KEEPALIVE_INTERVAL
+        worker.tracer = self.get_tracer()
+        worker.TRACE_FILE = self.TRACE_FILE
+        worker.fingerprints = self.get_fingerprints()
+        worker.totp = self.get_totp()
+        worker.route_history = self.get_route_history()
+        worker.INTERACTIVE = False
+        worker.QUIET = True
+
+        return worker
+
+    def run_on_server(self, alias, server_details, command, aggregator=None):
+        """
+        Logs into a server with a new non interactive session and runs a command
+        :param aggregator: OutputAggregator the output is grouped by instead of being returned
+        :return: dictionary with the alias, server, exit status, output and error if any. With an aggregator the
+                 group of the output and if the server is the first one of the group instead of the output
+        """
+        collector = None if aggregator is None else aggregator.collector(alias, server_details['server'])
+
+        try:
+            if self.REUSE_SESSION:
+                result = self.run_on_broker(alias, server_details, command)
+
+                if collector is not None:
+                    collector.write(result['output'])
+                    result['output'] = ''
+            else:
+                worker = self.new_worker()
+                result = {'alias': alias, 'server': server_details['server'], 'exit_status': None, 'output': '',
+                          'error': None}
+                timeout = server_details.get('timeout', self.APP_TIMEOUT)
+
+                try:
+                    worker.server_login(server_details)
+                    result['exit_status'], result['output'] = worker.run_command_with_status(command, timeout,
+                                                                                             collector)
+                except ServerManagementError as error:
+                    result['error'] = str(error)
+                except Exception as error:
+                    result['error'] = repr(error)
+                finally:
+                    if worker.controller is not None:
+                        worker.controller.close(force=True)
+
+            if aggregator is not None:
+                result['group'], result['first'] = aggregator.finish(collector, result['exit_status'],
+                                                                     result['error'])
+        finally:
+            # Removes the spilled output of a server that failed before it was grouped
+            if collector is not None:
+                collector.close()
+
+        return result
+
+    def run_on_broker(self, alias, server_details, command):
+        """
+        Runs a command over a session kept by the session broker
+        :return: dictionary with the alias, server, exit status, output and error if any
+        """
+        from session_broker import BrokerClient
+
+        response = BrokerClient(self.BROKER_SOCKET).request({
+            'op': 'run',
+            'alias': alias,
+            'command': command,
+            'timeout': server_details.get('timeout', self.APP_TIMEOUT),
+            'verification_code': self.VERIFICATION_CODE,
+        })
+
+        return {'alias': alias, 'server': server_details['server'], 'exit_status': response.get('exit_status'),
+                'output': response.get('output', ''), 'error': response.get('error')}
+
+    def run_on_servers(self, patterns, command, parallel=PARALLEL, aggregator=None):
+        """
+        Runs a command on all the servers matching the aliases passed
+        :param patterns: list of aliases or glob patterns
+        :param command: The command to run
+        :param parallel: The number of servers handled at the same time
+        :param aggregator: OutputAggregator the outputs are grouped by instead of being returned
+        :return: generator of results in the order the servers finish
+        """
+        import concurrent.futures
+
+        servers = self.resolve_aliases(patterns)
+
+        # The workers share the tracer, create it before they start
+        self.get_tracer()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            futures = [executor.submit(self.run_on_server, alias, server, command, aggregator)
+                       for alias, server in servers]
+
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+
+    def transfer_on_servers(self, patterns, direction, source, destination, parallel=PARALLEL):
+        """
+        Pushes a file to or pulls a file from all the servers matching the aliases passed
+        :param patterns: list of aliases or glob patterns
+        :param direction: PUSH or PULL
+        :param source: The local file of a push or the remote file of a pull
+        :param destination: The remote path of a push or the local directory of a pull. The file of every
+                            server is pulled to destination/alias/name
+        :param parallel: The number of servers handled at the same time
+        :return: generator of results in the order the servers finish
+        """
+        import concurrent.futures
+
+        from file_transfer import FileTransfer
+
+        servers = self.resolve_aliases(patterns)
+
+        def transfer(alias, server_details):
+            worker = FileTransfer(self.new_worker(), alias, server_details)
+
+            if direction == self.PUSH:
+                return worker.push(source, destination)
+
+            return worker.pull(source, os.path.join(destination, str(alias), os.path.basename(source.rstrip('/'))))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            futures = [executor.submit(transfer, alias, server) for alias, server in servers]
+
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+
+    def get_registry(self):
+        """
+        Get the alias registry, loading it on the first call
+        :return: AliasRegistry
+        """
+        if self.registry is None:
+            try:
+                self.registry = AliasRegistry(self.CONFIG_FILE).load()
+            except ConfigError as error:
+                self.log('🧊 %s' % error)
+                sys.exit(1)
+
+        return self.registry
+
+    def get_server_details(self, server_alias):
+        """
+        Get the server details from the config file using the alias provided. The server details are username,
+        password, server, port, requiredServerLogIn
+        :param server_alias: String used to identify a server in the config file
+        :return: server details
+        """
+        server = self.get_registry().get(server_alias)
+
+        if server is None:
+            self.log('🧊 No alias with the name: \'{}\' does not exist. Get the available aliases using: '
                      ' `./server_automation.py list`'.format(server_alias))
 
             sys.exit(1)
@@ -277,27 +1317,380 @@ class ServerManagement:
         return server
 
     def sigwinch_pass_through(self, sig, data):
+        import fcntl
+        import struct
+        import termios
+
         s = struct.pack("HHHH", 0, 0, 0, 0)
         a = struct.unpack('hhhh', fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, s))
         # global controller
         self.controller.setwinsize(a[0], a[1])
 
-    def server_login(self, server_details):
+        if self.recorder is not None:
+            self.recorder.resize(a[1], a[0])
+
+    def interact(self, output_filter=None):
         """
-        Logs into the server specified and any required servers
+        Hands the session over to the user, recording its output when a recorder was started. The session is
+        copied by PtyRelay with RELAY
+        :param output_filter: Called with the output of the session before it is shown
         """
-        if 'requiredServerLogIn' in server_details:
-            # Connect to the server
-            self.server_login(self.get_server_details(server_details['requiredServerLogIn']))
+        recorder = self.recorder
 
-        if 'requireVerificationCode' in server_details and server_details['requireVerificationCode']:
-            require_verification_code = True
+        if recorder is not None:
+            def record(data):
+                recorder.output(data)
+
+                return data if output_filter is None else output_filter(data)
         else:
-            require_verification_code = False
+            record = output_filter
 
-        if require_verification_code and self.VERIFICATION_CODE is None:
-            self.log("🧊 Please pass a verification code for server: %s" % server_details['server'])
-            sys.exit(1)
+        if self.RELAY:
+            from pty_relay import PtyRelay
+
+            PtyRelay(self.controller, output_filter=record).run()
+        else:
+            self.controller.interact(output_filter=record)
+
+    def start_recording(self, alias):
+        """
+        Start recording the output of the interactive session to RECORD_FILE, or to a new file in
+        RECORDINGS_DIR when no file was passed
+        :param alias: The alias of the server
+        """
+        import shutil
+        import time
+
+        from session_recorder import SessionRecorder
+
+        path = self.RECORD_FILE
+
+        if not path:
+            os.makedirs(self.RECORDINGS_DIR, mode=0o700, exist_ok=True)
+            path = os.path.join(self.RECORDINGS_DIR, '%s-%s.cast' % (alias, time.strftime('%Y%m%d-%H%M%S')))
+
+        column, row = shutil.get_terminal_size((80, 20))
+
+        try:
+            self.recorder = SessionRecorder(path, column, row, title=str(alias))
+        except OSError as error:
+            self.abort('🧊 Could not record the session: %s' % error)
+
+        self.RECORD_FILE = path
+
+    def stop_recording(self):
+        """Write the rest of the recording"""
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+            self.log('✨ The session was recorded to {}. Play it using: `./server_automation.py replay {}`'.format(
+                self.RECORD_FILE, self.RECORD_FILE))
+
+    def get_route(self, server_details):
+        """
+        Get the route to a server through all its required servers
+        :param server_details: The server details from the config file
+        :return: Route
+        """
+        from route_planner import RoutePlanner
+
+        if self.planner is None:
+            self.planner = RoutePlanner(self.get_registry())
+
+        try:
+            return self.planner.plan(server_details)
+        except ConfigError as error:
+            self.abort('🧊 %s' % error)
+
+    def get_routes(self, server_details):
+        """
+        Get the routes to a server through its candidate proxy servers, fastest at earlier logins first
+        :param server_details: The server details from the config file
+        :return: list of Route
+        """
+        from route_planner import RoutePlanner
+
+        if self.planner is None:
+            self.planner = RoutePlanner(self.get_registry())
+
+        try:
+            routes = self.planner.plan_candidates(server_details)
+        except ConfigError as error:
+            self.abort('🧊 %s' % error)
+
+        return routes if len(routes) == 1 else self.get_route_history().order(routes)
+
+    def get_route_history(self):
+        """
+        Get the time logins through every route took at earlier logins
+        :return: RouteHistory
+        """
+        if self.route_history is None:
+            from route_planner import RouteHistory
+
+            self.route_history = RouteHistory(self.ROUTE_HISTORY)
+
+        return self.route_history
+
+    def race_login(self, routes, log_in):
+        """
+        Logs into a server through all its routes at the same time, keeping the first one logged into. The
+        routes are started one after the other RACE_STAGGER seconds apart, or RACE_FACTOR times the time the
+        previous one took at earlier logins, and right away once the previous ones failed. The logins through
+        the other routes are cancelled
+        :param routes: list of Route, fastest first
+        :param log_in: Called with a worker and the route it logs in through
+        """
+        import queue
+        import threading
+        import time
+
+        history = self.get_route_history()
+        pending = list(routes)
+        results = queue.Queue()
+        lock = threading.Lock()
+        workers = []
+        finished = []
+        errors = []
+
+        # The workers share the tracer, create it before they start
+        self.get_tracer()
+
+        def attempt(worker, route):
+            start = time.monotonic()
+
+            try:
+                log_in(worker, route)
+            except (Exception, SystemExit) as error:
+                if worker.controller is not None:
+                    worker.controller.close(force=True)
+
+                results.put((worker, route, str(error) if isinstance(error, ServerManagementError) else repr(error),
+                             None))
+                return
+
+            # A login finished after another one was kept is closed
+            with lock:
+                if worker.cancelled:
+                    worker.controller.close(force=True)
+                else:
+                    results.put((worker, route, None, time.monotonic() - start))
+
+        self.log("🥁 Logging into {} through {} routes: {}".format(
+            routes[0].target['server'], len(routes), ', '.join(' -> '.join(route.servers) for route in routes)))
+
+        running = 0
+        next_start = time.monotonic()
+
+        while pending or running:
+            now = time.monotonic()
+
+            if pending and now >= next_start:
+                route = pending.pop(0)
+                worker = self.new_worker()
+                worker.racing = True
+                workers.append((worker, route, now))
+                threading.Thread(target=attempt, args=(worker, route), daemon=True).start()
+                running += 1
+
+                entry = history.get(route) or {}
+                next_start = now + max(self.RACE_STAGGER, entry.get('seconds', 0) * self.RACE_FACTOR)
+                continue
+
+            try:
+                worker, route, error, seconds = results.get(timeout=max(0, next_start - now) if pending else None)
+            except queue.Empty:
+                continue
+
+            running -= 1
+            finished.append(worker)
+
+            if error is None:
+                break
+
+            history.record(route)
+            errors.append('%s: %s' % (' -> '.join(route.servers), error))
+            self.log("🙈 Could not log in through %s: %s" % (' -> '.join(route.servers), error))
+
+            # The next route is started right away
+            next_start = time.monotonic()
+        else:
+            # The errors were logged as they came unless the session is quiet
+            self.abort("🧊 Could not log into {} through any of its routes{}".format(
+                routes[0].target['server'], ': ' + '; '.join(errors) if self.QUIET else ''))
+
+        # The routes cancelled are at least as slow as the time they ran for
+        with lock:
+            for other, other_route, started in workers:
+                if other is not worker and other not in finished:
+                    other.cancel()
+                    history.record(other_route, time.monotonic() - started, finished=False)
+
+        # Logins that finished at the same time as the one kept
+        while True:
+            try:
+                other, _, other_error, _ = results.get_nowait()
+            except queue.Empty:
+                break
+
+            if other_error is None:
+                other.controller.close(force=True)
+
+        history.record(route, seconds)
+
+        self.controller = worker.controller
+        self.hops_logged_in = worker.hops_logged_in
+        self.route = route
+
+        self.log("🔥 Successfully logged into the server: %s through %s in %.2fs\n" % (
+            route.target['server'], ' -> '.join(route.servers[:-1]), seconds))
+
+    def cancel(self):
+        """Cancel a login running in another thread, its ssh process is stopped"""
+        import signal
+
+        self.cancelled = True
+
+        if self.controller is not None:
+            try:
+                os.kill(self.controller.pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def use_jump_route(self, route):
+        """
+        Check if a route is logged into with a single ssh -J command
+        :param route: Route to the server
+        :return: bool
+        """
+        return self.LOGIN_MODE == self.JUMP_LOGIN and len(route.hops) > 1 \
+            and not any(hop.get('loginMode') == self.NESTED_LOGIN for hop in route.hops)
+
+    def check_reachable(self, route):
+        """
+        Stop if the first server of a route was found down by the check command within the last CHECK_TTL seconds
+        :param route: Route to the server
+        """
+        if not os.path.exists(self.REACHABILITY_CACHE):
+            return
+
+        import time
+
+        from reachability import Reachability
+
+        if self.reachability is None:
+            self.reachability = Reachability(self.REACHABILITY_CACHE, self.CHECK_TTL)
+
+        result = self.reachability.get(route.hops[0])
+
+        if result is not None and result['state'] in Reachability.FAILED:
+            self.abort("🧊 {server} was found {state} {age}s ago: {error}. Check it again using: "
+                       "`./server_automation.py check {alias}`".format(
+                           server=route.hops[0]['server'], state=result['state'], error=result['error'],
+                           age=int(time.time() - result['checked']), alias=route.hops[0]['aliases'][0]))
+
+    def mark_reachable(self, route):
+        """
+        Forget the cached check of the first server of a route that was logged into, it is reachable
+        :param route: Route to the server
+        """
+        if self.reachability is not None:
+            self.reachability.forget(route.hops[0])
+
+    def requires_verification_code(self, server_details):
+        """
+        Check if a server requires a verification code, stopping if none was passed and the server has no
+        TOTP secret to generate it
+        :param server_details: The server details from the config file
+        :return: bool
+        """
+        if not server_details.get('requireVerificationCode'):
+            return False
+
+        from totp import TotpGenerator
+
+        if self.VERIFICATION_CODE is None and not TotpGenerator.has_secret(server_details):
+            self.abort("🧊 Please pass a verification code for server: %s" % server_details['server'])
+
+        return True
+
+    def get_totp(self):
+        """
+        Get the generator of the verification codes of the servers with a TOTP secret
+        :return: TotpGenerator
+        """
+        if self.totp is None:
+            from totp import TotpGenerator
+
+            self.totp = TotpGenerator(self.TOTP_KEYRING)
+
+        return self.totp
+
+    def verification_code(self, server_details):
+        """
+        Get the verification code of a server, generated from its TOTP secret when it has one. A code about to
+        expire is not used, the next one is waited for
+        :param server_details: The server details from the config file, None for the code passed
+        """
+        from alias_registry import ConfigError
+
+        totp = self.get_totp()
+
+        if server_details is None or not totp.has_secret(server_details):
+            return self.VERIFICATION_CODE
+
+        delay = totp.wait(server_details)
+
+        if delay:
+            self.log("🥁 Waiting %.1fs for the next verification code of: %s" % (delay, server_details['server']))
+
+        try:
+            return totp.code(server_details)
+        except ConfigError as error:
+            self.abort("🧊 %s" % error)
+
+    def server_login(self, server_details, route=None):
+        """
+        Logs into the server specified and any required servers. A server with candidate proxy servers is logged
+        into through all its routes at the same time, keeping the first one logged into
+        :param route: The route to the server, the one of the required servers when None
+        """
+        if route is None:
+            routes = self.get_routes(server_details)
+
+            if len(routes) > 1 and self.controller is None:
+                self.race_login(routes, lambda worker, candidate: worker.server_login(candidate.target, candidate))
+                return
+
+            route = routes[0]
+
+        if self.controller is None:
+            self.check_reachable(route)
+
+        if self.use_jump_route(route):
+            for hop in route.hops:
+                self.requires_verification_code(hop)
+
+            self.ssh_jump_log_in(route)
+            self.route = route
+            self.mark_reachable(route)
+            return
+
+        if len(route.hops) > 1:
+            from route_planner import Route
+
+            # Connect to the server
+            self.server_login(route.hops[-2], Route(route.hops[:-1]))
+
+        self.hop_log_in(server_details)
+        self.route = route
+        self.mark_reachable(route)
+
+    def hop_log_in(self, server_details):
+        """
+        Logs into a server from the shell of the current session, or from this machine if there is none
+        """
+        require_verification_code = self.requires_verification_code(server_details)
 
         if 'timeout' in server_details:
             timeout = server_details['timeout']
@@ -305,47 +1698,243 @@ class ServerManagement:
             timeout = self.APP_TIMEOUT
 
         # Connect to the server
-        self.ssh_log_in(server_details['server'],
-                        server_details['username'],
-                        server_details['password'],
-                        server_details['port'],
-                        timeout,
-                        require_verification_code)
+        with self.get_tracer().span('hop', alias=server_details['aliases'][0], server=server_details['server'],
+                                    hop=self.hops_logged_in, mode=self.NESTED_LOGIN):
+            self.ssh_log_in(server_details['server'],
+                            server_details['username'],
+                            server_details['password'],
+                            server_details['port'],
+                            timeout,
+                            require_verification_code,
+                            server_details)
+
+    def resume_login(self, route, position):
+        """
+        Logs into the servers of a route again from the shell of the server before the given position, which
+        is still logged into after the connection to the server at the position was lost
+        :param route: Route to the server
+        :param position: The position of the first server to log into again
+        """
+        previous = route.hops[position - 1]
+
+        # Interrupt what runs in the shell, such as an ssh still trying to connect
+        self.controller.sendintr()
+        self.expected(['%s@' % previous['username'], '%s:' % previous['username'], 'bash'],
+                      previous.get('timeout', self.APP_TIMEOUT))
+
+        self.hops_logged_in = position
+
+        for hop in route.hops[position:]:
+            self.hop_log_in(hop)
 
     def server_port_forward(self, server_details, local_port, destination_port):
         """
         Logs into the server specified and any required servers and creates a port forwarding connection
         """
+        self.server_port_forwards(server_details, [(local_port, destination_port)])
+
+    def server_port_forwards(self, server_details, forwards, control=True, route=None):
+        """
+        Logs into the server specified and any required servers and forwards all the ports over the same chain.
+        A server with candidate proxy servers is logged into through all its routes at the same time, the first
+        one logged into keeps the ports
+        :param forwards: list of (local_port, destination_port) tuples
+        :param control: Make the ssh process the control master that later forwards are added to
+        :param route: The route to the server, the one of the required servers when None
+        """
         require_verification_code = False
 
+        if route is None:
+            routes = self.get_routes(server_details)
+
+            if len(routes) > 1 and self.controller is None and self.FINAL_SERVER_DETAILS is None:
+                control_socket = self.forward_control_socket(server_details)
+
+                # The routes do not remove the control socket of each other
+                if control and os.path.exists(control_socket):
+                    os.remove(control_socket)
+
+                self.race_login(routes, lambda worker, candidate: worker.server_port_forwards(
+                    candidate.target, forwards, control, candidate))
+                return
+
+            route = routes[0]
+
+        if self.controller is None:
+            self.check_reachable(route)
+
+        if self.FINAL_SERVER_DETAILS is None and (self.use_jump_route(route) or len(route.hops) == 1):
+            for hop in route.hops:
+                self.requires_verification_code(hop)
+
+            # Only the last server of the route needs to forward the ports. The ssh process is the control
+            # master of its connection so that forwards can be added without logging in again
+            options = self.forward_options(forwards)
+
+            if control:
+                control_socket = self.forward_control_socket(route.target)
+                os.makedirs(os.path.dirname(control_socket), mode=0o700, exist_ok=True)
+
+                if os.path.exists(control_socket) and not self.racing:
+                    os.remove(control_socket)
+
+                options = '-o ControlMaster=yes -o ControlPath=%s %s' % (control_socket, options)
+
+            self.ssh_jump_log_in(route, options)
+            self.route = route
+            self.mark_reachable(route)
+            return
+
         if self.FINAL_SERVER_DETAILS is None:
-            server_details['destination_port'] = destination_port
+            self.FINAL_SERVER_DETAILS = dict(server_details, forwards=forwards)
 
-            self.FINAL_SERVER_DETAILS = server_details
+        if len(route.hops) > 1:
+            from route_planner import Route
 
-        if 'requiredServerLogIn' in server_details:
             # Connect to the server
-            self.server_port_forward(self.get_server_details(
-                server_details['requiredServerLogIn']), local_port, destination_port)
+            self.server_port_forwards(route.hops[-2], forwards, control, Route(route.hops[:-1]))
 
-        # Get the local and destination ports
-        local_port = local_port
-        destination_port = local_port
+        # The proxy servers forward the local ports to the same ports on the next server
+        hop_forwards = [(local_port, local_port) for local_port, _ in forwards]
 
         if self.FINAL_SERVER_DETAILS['server'] == server_details['server']:
-            destination_port = self.FINAL_SERVER_DETAILS['destination_port']
+            hop_forwards = self.FINAL_SERVER_DETAILS['forwards']
 
         if 'requireVerificationCode' in server_details and server_details['requireVerificationCode']:
             require_verification_code = True
 
         # Connect to the server
-        self.ssh_port_forward(server_details['server'],
-                              server_details['username'],
-                              server_details['password'],
-                              server_details['port'],
-                              local_port,
-                              destination_port,
-                              require_verification_code)
+        with self.get_tracer().span('hop', alias=server_details['aliases'][0], server=server_details['server'],
+                                    hop=self.hops_logged_in, mode=self.NESTED_LOGIN):
+            self.ssh_port_forward(server_details['server'],
+                                  server_details['username'],
+                                  server_details['password'],
+                                  server_details['port'],
+                                  hop_forwards,
+                                  require_verification_code,
+                                  server_details)
+
+        self.route = route
+        self.mark_reachable(route)
+
+    @staticmethod
+    def forward_options(forwards):
+        """
+        Get the ssh -L options of a list of (local_port, destination_port) tuples
+        """
+        return ' '.join('-L localhost:%s:localhost:%s' % (local_port, destination_port)
+                        for local_port, destination_port in forwards)
+
+    def forward_control_socket(self, server_details):
+        """
+        Get the control socket of the ssh process forwarding the ports of a server
+        """
+        import hashlib
+
+        # Unix socket paths are limited to about 100 characters
+        name = hashlib.sha1(str(server_details['server']).encode()).hexdigest()[:16]
+
+        return os.path.join(self.STATE_DIR, 'pf-%s.sock' % name)
+
+    def add_running_forwards(self, server_details, forwards):
+        """
+        Add forwards to the ssh process already forwarding the ports of a server, without logging in again
+        :param forwards: list of (local_port, destination_port) tuples
+        :return: True if a forwarding ssh process is running for the server
+        """
+        import subprocess
+
+        control_socket = self.forward_control_socket(server_details)
+
+        def control(*arguments):
+            return subprocess.run(['ssh', '-S', control_socket] + list(arguments) + [str(server_details['server'])],
+                                  stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                  universal_newlines=True)
+
+        if not os.path.exists(control_socket) or control('-O', 'check').returncode != 0:
+            return False
+
+        for local_port, destination_port in forwards:
+            if self.forward_is_live(local_port):
+                continue
+
+            result = control('-O', 'forward', '-L', 'localhost:%s:localhost:%s' % (local_port, destination_port))
+
+            if result.returncode != 0:
+                self.log("🧊 Could not forward localhost:{}: {}".format(local_port, result.stderr.strip()))
+
+        return True
+
+    @staticmethod
+    def forward_is_live(local_port, timeout=1):
+        """
+        Check if a local port accepts connections
+        """
+        import socket
+
+        try:
+            socket.create_connection(('localhost', int(local_port)), timeout).close()
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def report_forwards(self, forwards):
+        """
+        Log which port forwards accept connections
+        :param forwards: list of (local_port, alias, destination_port) tuples
+        :return: the number of forwards that are not live
+        """
+        failed = 0
+
+        for local_port, alias, destination_port in forwards:
+            if self.forward_is_live(local_port):
+                self.log("🔥 localhost:{} -> {}:{} is live".format(local_port, alias, destination_port))
+            else:
+                failed += 1
+                self.log("🧊 localhost:{} -> {}:{} is not accepting connections".format(
+                    local_port, alias, destination_port))
+
+        return failed
+
+    def get_forwards(self, arguments):
+        """
+        Get the port forwards from the pf arguments. The arguments are pairs of local_port alias:port or the
+        names of forward groups from the forwards section of the config file, optionally followed by the
+        verification code
+        :param arguments: list of arguments
+        :return: list of (local_port, alias, destination_port) tuples
+        """
+        groups = self.get_registry().config.get('forwards') or {}
+        specifications = []
+        position = 0
+
+        while position < len(arguments):
+            if arguments[position] in groups:
+                specifications += [str(item).split() for item in groups[arguments[position]]]
+                position += 1
+            elif position == len(arguments) - 1:
+                # An argument left after the pairs is the verification code
+                self.VERIFICATION_CODE = arguments[position]
+                position += 1
+            else:
+                specifications.append(arguments[position:position + 2])
+                position += 2
+
+        forwards = []
+
+        for specification in specifications:
+            try:
+                local_port, destination = specification
+                alias, destination_port = destination.rsplit(':', 1)
+                int(local_port), int(destination_port)
+            except ValueError:
+                self.abort('🧊 Invalid port forward: "{}", use the format: local_port alias:port'.format(
+                    ' '.join(specification)))
+
+            self.get_server_details(alias)
+            forwards.append((local_port, alias, destination_port))
+
+        return forwards
 
     def handle_connect_options(self, passed_options):
         """
@@ -355,11 +1944,73 @@ class ServerManagement:
         """
         for passed_option in passed_options:
             if passed_option['name'] == 'timeout':
-                self.APP_TIMEOUT = passed_option['value']
+                self.APP_TIMEOUT = int(passed_option['value'])
             elif passed_option['name'] == 'command':
                 self.COMMAND_TO_RUN = passed_option['value']
             elif passed_option['name'] == 'verification-code' or passed_option['name'] == 'v':
                 self.VERIFICATION_CODE = passed_option['value']
+            elif passed_option['name'] == 'reuse':
+                self.REUSE_SESSION = True
+            elif passed_option['name'] == 'nested':
+                self.LOGIN_MODE = self.NESTED_LOGIN
+            elif passed_option['name'] == 'trace':
+                self.TRACE_FILE = passed_option['value']
+            elif passed_option['name'] == 'reconnect':
+                self.RECONNECT = True
+            elif passed_option['name'] == 'keepalive':
+                self.KEEPALIVE_INTERVAL = int(passed_option['value'])
+            elif passed_option['name'] == 'record':
+                self.RECORD_FILE = passed_option.get('value') or ''
+            elif passed_option['name'] == 'relay':
+                self.RELAY = True
+
+        if self.RECONNECT and self.KEEPALIVE_INTERVAL is None:
+            self.KEEPALIVE_INTERVAL = self.RECONNECT_INTERVAL
+
+    def handle_run_options(self, short_options, long_options):
+        """
+        Performs the operations needed for the run options
+        :param short_options:
+        :param long_options:
+        :return:
+        """
+        options = list(map(lambda x: dict(zip(['name', 'value'], x.split("=", 1))), long_options))
+        options += list(map(lambda x: dict(zip(['name', 'value'], [x[0], x[1:]])), short_options))
+
+        for passed_option in options:
+            if passed_option['name'] == 'reuse':
+                self.REUSE_SESSION = True
+                continue
+            elif passed_option['name'] == 'nested':
+                self.LOGIN_MODE = self.NESTED_LOGIN
+                continue
+            elif passed_option['name'] == 'aggregate':
+                self.AGGREGATE = True
+                continue
+
+            if not passed_option.get('value'):
+                self.log('🧊 Undefined value for option: {prefix}{option},'
+                         ' Use the format: {prefix}{option}=value'
+                         .format(prefix=self.ARGS_LONG_PREFIX, option=passed_option['name']))
+                sys.exit(1)
+
+            try:
+                if passed_option['name'] == 'timeout':
+                    self.APP_TIMEOUT = int(passed_option['value'])
+                elif passed_option['name'] == 'parallel':
+                    self.PARALLEL = int(passed_option['value'])
+                elif passed_option['name'] == 'command':
+                    self.COMMAND_TO_RUN = passed_option['value']
+                elif passed_option['name'] == 'verification-code' or passed_option['name'] == 'v':
+                    self.VERIFICATION_CODE = passed_option['value']
+                elif passed_option['name'] == 'trace':
+                    self.TRACE_FILE = passed_option['value']
+                else:
+                    self.log('🧊 Unknown option: {}{}'.format(self.ARGS_LONG_PREFIX, passed_option['name']))
+                    sys.exit(1)
+            except ValueError:
+                self.log('🧊 The option {}{} requires a number'.format(self.ARGS_LONG_PREFIX, passed_option['name']))
+                sys.exit(1)
 
     def handle_port_forward_options(self, short_options, long_options):
         """
@@ -368,16 +2019,28 @@ class ServerManagement:
         :param passed_options:
         :return:
         """
-        options = list(map(lambda x: dict(zip(['name', 'value'], x.split("="))), long_options))
+        options = list(map(lambda x: dict(zip(['name', 'value'], x.split("=", 1))), long_options))
         options += list(map(lambda x: dict(zip(['name', 'value'], [x[0], x[1:]])), short_options))
 
         for passed_option in options:
             if passed_option['name'] == 'timeout':
-                self.APP_TIMEOUT = passed_option['value']
+                self.APP_TIMEOUT = int(passed_option['value'])
             elif passed_option['name'] == 'command':
                 self.COMMAND_TO_RUN = passed_option['value']
             elif passed_option['name'] == 'verification-code' or passed_option['name'] == 'v':
                 self.VERIFICATION_CODE = passed_option['value']
+            elif passed_option['name'] == 'reuse':
+                self.REUSE_SESSION = True
+            elif passed_option['name'] == 'nested':
+                self.LOGIN_MODE = self.NESTED_LOGIN
+            elif passed_option['name'] == 'trace':
+                self.TRACE_FILE = passed_option['value']
+            elif passed_option['name'] == 'lazy':
+                self.LAZY_FORWARD = True
+            elif passed_option['name'] == 'idle-timeout':
+                self.FORWARD_IDLE_TIMEOUT = int(passed_option['value'])
+            elif passed_option['name'] == 'relay':
+                self.RELAY = True
 
     def validate_arguments(self, options, available_options):
         """
@@ -388,7 +2051,7 @@ class ServerManagement:
         """
         for option in options:
             try:
-                option_name, option_value = option.split("=")
+                option_name, option_value = option.split("=", 1)
                 assert option_name in available_options
                 assert type(option_name) is str
                 if len(option_value) < 1:
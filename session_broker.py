@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from server_management import ServerManagement, ServerManagementError
+
+
+class BrokerSession:
+    """A logged in session kept alive by the broker"""
+
+    SHELL = 'shell'
+    FORWARD = 'forward'
+
+    def __init__(self, number, kind, alias, chain, management, description=None):
+        self.number = number
+        self.kind = kind
+        self.alias = alias
+        self.chain = chain
+        self.management = management
+        self.description = description or ' -> '.join(chain)
+        self.created = time.time()
+        self.last_used = self.created
+        self.lock = threading.Lock()
+        self.attached = False
+
+    @property
+    def controller(self):
+        return self.management.controller
+
+    def is_alive(self):
+        return self.controller is not None and self.controller.isalive()
+
+    def close(self):
+        if self.controller is not None:
+            self.controller.close(force=True)
+
+    def to_dict(self):
+        return {
+            'id': self.number,
+            'kind': self.kind,
+            'alias': self.alias,
+            'chain': self.description,
+            'attached': self.attached,
+            'age': int(time.time() - self.created),
+            'idle': int(time.time() - self.last_used),
+        }
+
+
+class SessionBroker:
+    """
+    Background process that keeps logged in sessions alive per alias chain and serves them over a
+    local Unix socket. Messages are JSON objects, one per line.
+
+    Shell sessions are evicted once they have been idle for longer than the idle timeout and the least
+    recently used idle session is evicted when the maximum number of sessions is reached. Port forwards
+    stay up until they are closed or the connection drops.
+    """
+    IDLE_TIMEOUT = 600
+    MAX_SESSIONS = 10
+    MAINTENANCE_INTERVAL = 5
+
+    def __init__(self, socket_path, config_file, idle_timeout=IDLE_TIMEOUT, max_sessions=MAX_SESSIONS):
+        self.socket_path = socket_path
+        self.config_file = config_file
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions = []
+        self.sessions_lock = threading.Lock()
+        self.next_number = 1
+        self.running = False
+        self.server = None
+
+    def new_management(self, verification_code=None):
+        management = ServerManagement()
+        management.CONFIG_FILE = self.config_file
+        management.VERIFICATION_CODE = verification_code
+        management.INTERACTIVE = False
+        management.QUIET = True
+
+        return management
+
+    def chain_for(self, management, alias):
+        """
+        Get the list of servers that are logged into to reach an alias
+        """
+        return management.get_route(management.get_server_details(alias)).servers
+
+    def serve(self):
+        """Listen on the socket until a stop request is received"""
+        socket_dir = os.path.dirname(self.socket_path)
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self.server.listen(16)
+        self.running = True
+
+        threading.Thread(target=self.maintain, daemon=True).start()
+
+        try:
+            while self.running:
+                try:
+                    connection, _ = self.server.accept()
+                except OSError:
+                    break
+
+                threading.Thread(target=self.handle_connection, args=(connection,), daemon=True).start()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self.running = False
+
+        with self.sessions_lock:
+            for session in self.sessions:
+                session.close()
+
+            self.sessions = []
+
+        try:
+            self.server.close()
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+    def maintain(self):
+        """Drain the idle sessions, drop the dead ones and evict the ones idle for too long"""
+        while self.running:
+            time.sleep(self.MAINTENANCE_INTERVAL)
+
+            with self.sessions_lock:
+                sessions = list(self.sessions)
+
+            for session in sessions:
+                if session.attached or not session.lock.acquire(blocking=False):
+                    continue
+
+                try:
+                    self.drain(session)
+
+                    expired = session.kind == BrokerSession.SHELL \
+                        and time.time() - session.last_used > self.idle_timeout
+
+                    if expired or not session.is_alive():
+                        self.remove(session)
+                finally:
+                    session.lock.release()
+
+    @staticmethod
+    def drain(session):
+        """Discard the pending output of a session so the remote side never blocks on a full pty"""
+        import pexpect
+
+        try:
+            while True:
+                session.controller.read_nonblocking(65536, timeout=0)
+        except pexpect.TIMEOUT:
+            pass
+        except pexpect.EOF:
+            pass
+
+    def remove(self, session):
+        with self.sessions_lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+
+        session.close()
+
+    def make_room(self):
+        """Evict the least recently used idle shell session when the maximum number of sessions is reached"""
+        with self.sessions_lock:
+            if len(self.sessions) < self.max_sessions:
+                return
+
+            idle = sorted((session for session in self.sessions
+                           if session.kind == BrokerSession.SHELL and not session.attached),
+                          key=lambda session: session.last_used)
+
+            victim = None
+
+            # A session handed to a client holds its lock until it is attached, the one evicted is locked so that
+            # it cannot be handed out before it is removed
+            for session in idle:
+                if session.lock.acquire(blocking=False):
+                    if not session.attached:
+                        victim = session
+                        break
+
+                    session.lock.release()
+
+            if victim is None:
+                raise ServerManagementError('The maximum of %d sessions is reached and all of them are in use'
+                                            % self.max_sessions)
+
+            self.sessions.remove(victim)
+
+        try:
+            victim.close()
+        finally:
+            victim.lock.release()
+
+    def add(self, kind, alias, chain, management, description=None):
+        with self.sessions_lock:
+            session = BrokerSession(self.next_number, kind, alias, chain, management, description)
+            self.next_number += 1
+            self.sessions.append(session)
+
+        return session
+
+    def acquire_shell(self, alias, verification_code=None):
+        """
+        Get an idle logged in session for the alias chain, logging in if there is none
+        :return: the session with its lock held
+        """
+        management = self.new_management(verification_code)
+        chain = self.chain_for(management, alias)
+
+        with self.sessions_lock:
+            candidates = [session for session in self.sessions
+                          if session.kind == BrokerSession.SHELL and session.chain == chain and not session.attached]
+
+        for session in candidates:
+            if session.lock.acquire(blocking=False):
+                if session.is_alive():
+                    session.last_used = time.time()
+                    return session
+
+                session.lock.release()
+                self.remove(session)
+
+        self.make_room()
+
+        try:
+            management.server_login(management.get_server_details(alias))
+        except Exception:
+            if management.controller is not None:
+                management.controller.close(force=True)
+            raise
+
+        session = self.add(BrokerSession.SHELL, alias, chain, management)
+        session.lock.acquire()
+
+        return session
+
+    def handle_connection(self, connection):
+        with connection:
+            reader = connection.makefile('r')
+
+            for line in reader:
+                try:
+                    request = json.loads(line)
+                    response = self.handle_request(request, connection, reader)
+                except ServerManagementError as error:
+                    response = {'ok': False, 'error': str(error)}
+                except SystemExit:
+                    response = {'ok': False, 'error': 'Unknown alias or invalid config file'}
+                except Exception as error:
+                    response = {'ok': False, 'error': repr(error)}
+
+                if response is not None:
+                    connection.sendall((json.dumps(response) + '\n').encode())
+
+                if not self.running:
+                    # Closing the socket does not wake up the accept() of the serving thread, shutting it down does
+                    try:
+                        self.server.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+
+                    self.server.close()
+                    return
+
+    def handle_request(self, request, connection, reader):
+        operation = request.get('op')
+
+        if operation == 'sessions':
+            with self.sessions_lock:
+                return {'ok': True, 'sessions': [session.to_dict() for session in self.sessions]}
+
+        elif operation == 'run':
+            session = self.acquire_shell(request['alias'], request.get('verification_code'))
+
+            try:
+                timeout = request.get('timeout') or ServerManagement.APP_TIMEOUT
+                exit_status, output = session.management.run_command_with_status(request['command'], timeout)
+            except ServerManagementError:
+                self.remove(session)
+                raise
+            finally:
+                session.last_used = time.time()
+                session.lock.release()
+
+            return {'ok': True, 'exit_status': exit_status, 'output': output, 'session': session.number}
+
+        elif operation == 'attach':
+            return self.attach(request, connection, reader)
+
+        elif operation == 'forward':
+            return self.forward(request)
+
+        elif operation == 'close':
+            with self.sessions_lock:
+                sessions = [session for session in self.sessions if session.number == request.get('id')]
+
+            for session in sessions:
+                self.remove(session)
+
+            return {'ok': bool(sessions)}
+
+        elif operation == 'stop':
+            self.running = False
+            return {'ok': True}
+
+        return {'ok': False, 'error': 'Unknown operation: %s' % operation}
+
+    def attach(self, request, connection, reader):
+        """
+        Pass the pty of a logged in session to the client. The session stays reserved until the client
+        sends a detach message or disconnects
+        """
+        session = self.acquire_shell(request['alias'], request.get('verification_code'))
+        session.attached = True
+        session.lock.release()
+
+        try:
+            message = (json.dumps({'ok': True, 'session': session.number}) + '\n').encode()
+            send_fds(connection, [message], [session.controller.child_fd])
+
+            # Wait for the client to detach
+            reader.readline()
+        finally:
+            session.attached = False
+            session.last_used = time.time()
+
+            if not session.is_alive():
+                self.remove(session)
+
+        return None
+
+    def forward(self, request):
+        """Start port forwards to a server that are kept alive by the broker"""
+        management = self.new_management(request.get('verification_code'))
+        chain = self.chain_for(management, request['alias'])
+        forwards = [tuple(ports) for ports in request['forwards']] if 'forwards' in request \
+            else [(request['local_port'], request['destination_port'])]
+        description = '%s -> %s' % (', '.join('localhost:%s:%s' % ports for ports in forwards), ' -> '.join(chain))
+
+        with self.sessions_lock:
+            for session in self.sessions:
+                if session.kind == BrokerSession.FORWARD and session.description == description \
+                        and session.is_alive():
+                    return {'ok': True, 'session': session.number}
+
+        self.make_room()
+
+        try:
+            management.server_port_forwards(management.get_server_details(request['alias']), forwards)
+        except Exception:
+            if management.controller is not None:
+                management.controller.close(force=True)
+            raise
+
+        session = self.add(BrokerSession.FORWARD, request['alias'], chain, management, description)
+
+        return {'ok': True, 'session': session.number}
+
+
+class BrokerClient:
+    """Client side of the session broker. Starts the broker in the background when it is not running"""
+
+    START_TIMEOUT = 5
+
+    def __init__(self, socket_path, script=None):
+        self.socket_path = socket_path
+        self.script = script or os.path.join(os.path.dirname(os.path.realpath(__file__)), 'server_automation.py')
+
+    def connect(self, start=True):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+            connection.connect(self.socket_path)
+            return connection
+        except OSError:
+            connection.close()
+
+            if not start:
+                return None
+
+        self.start_broker()
+
+        deadline = time.time() + self.START_TIMEOUT
+
+        while time.time() < deadline:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+            try:
+                connection.connect(self.socket_path)
+                return connection
+            except OSError:
+                connection.close()
+                time.sleep(0.05)
+
+        raise ServerManagementError('The session broker did not start on: %s' % self.socket_path)
+
+    def start_broker(self):
+        subprocess.Popen([sys.executable, self.script, ServerManagement.BROKER],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+
+    def request(self, message, start=True):
+        connection = self.connect(start)
+
+        if connection is None:
+            return None
+
+        with connection:
+            connection.sendall((json.dumps(message) + '\n').encode())
+            return json.loads(connection.makefile('r').readline())
+
+    def attach(self, alias, verification_code=None, command=None):
+        """
+        Attach the terminal to a logged in session of the broker until the remote shell exits or the
+        escape character (Ctrl-]) is pressed
+        """
+        connection = self.connect()
+
+        with connection:
+            connection.sendall((json.dumps({'op': 'attach', 'alias': alias,
+                                            'verification_code': verification_code}) + '\n').encode())
+
+            message, fds = recv_fds(connection, 65536, 1)
+            response = json.loads(message.decode())
+
+            if not response.get('ok') or not fds:
+                raise ServerManagementError(response.get('error', 'The broker did not pass a session'))
+
+            try:
+                relay_terminal(fds[0], command)
+            finally:
+                os.close(fds[0])
+                connection.sendall(b'{"op": "detach"}\n')
+
+            return response['session']
+
+
+def send_fds(connection, buffers, fds):
+    """Send file descriptors over a unix socket, with SCM_RIGHTS on Python versions without socket.send_fds"""
+    if hasattr(socket, 'send_fds'):
+        return socket.send_fds(connection, buffers, fds)
+
+    import array
+
+    return connection.sendmsg(buffers, [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+
+
+def recv_fds(connection, size, max_fds):
+    """
+    Receive file descriptors sent over a unix socket, with SCM_RIGHTS on Python versions without socket.recv_fds
+    :return: the message and the list of file descriptors
+    """
+    if hasattr(socket, 'recv_fds'):
+        message, fds, _, _ = socket.recv_fds(connection, size, max_fds)
+        return message, fds
+
+    import array
+
+    fds = array.array('i')
+    message, ancillary, _, _ = connection.recvmsg(size, socket.CMSG_LEN(max_fds * fds.itemsize))
+
+    for level, kind, data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+
+    return message, list(fds)
+
+
+def set_window_size(fd):
+    """Copy the size of the local terminal to the pty"""
+    import fcntl
+    import termios
+
+    try:
+        size = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, b'\0' * 8)
+        fcntl.ioctl(fd, termios.TIOCSWINSZ, size)
+    except OSError:
+        pass
+
+
+def relay_terminal(fd, command=None, escape_character=b'\x1d'):
+    """Copy data between the local terminal and a pty until the pty closes or the escape character is typed"""
+    import termios
+    import tty
+
+    stdin = sys.stdin.fileno()
+    stdout = sys.stdout.fileno()
+    terminal_mode = termios.tcgetattr(stdin) if os.isatty(stdin) else None
+    previous_handler = signal.signal(signal.SIGWINCH, lambda sig, data: set_window_size(fd))
+
+    set_window_size(fd)
+
+    if command:
+        os.write(fd, command.encode() + b'\r')
+    else:
+        # Redraw the prompt of the reused session
+        os.write(fd, b'\r')
+
+    try:
+        if terminal_mode is not None:
+            tty.setraw(stdin)
+
+        while True:
+            try:
+                readable, _, _ = select.select([fd, stdin], [], [])
+            except InterruptedError:
+                continue
+
+            if fd in readable:
+                try:
+                    data = os.read(fd, 65536)
+                except OSError:
+                    data = b''
+
+                if not data:
+                    break
+
+                os.write(stdout, data)
+
+            if stdin in readable:
+                data = os.read(stdin, 1024)
+
+                if not data:
+                    break
+
+                if escape_character in data:
+                    data = data[:data.index(escape_character)]
+
+                    if data:
+                        os.write(fd, data)
+                    break
+
+                os.write(fd, data)
+    finally:
+        if terminal_mode is not None:
+            termios.tcsetattr(stdin, termios.TCSAFLUSH, terminal_mode)
+
+        signal.signal(signal.SIGWINCH, previous_handler)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+
+class SessionRecorder:
+    """
+    Records the output of an interactive session to an asciicast v2 file without writing to the disk on the
+    interactive path. The output is copied into a ring buffer in memory, read by a background thread which
+    writes it to the file. When the disk is so slow that the buffer fills up the output is dropped instead of
+    stalling the session, and a marker with the number of bytes lost is written to the recording.
+    """
+    # Header of every record in the ring buffer: the seconds since the start and the size of the data
+    RECORD = struct.Struct('=dI')
+
+    BUFFER_SIZE = 4 * 1024 * 1024
+
+    # Seconds between the writes of the background thread
+    FLUSH_INTERVAL = 0.2
+
+    def __init__(self, path, width, height, title=None, buffer_size=BUFFER_SIZE, file=None):
+        """
+        :param path: The asciicast file, created or replaced
+        :param width: Columns of the terminal
+        :param height: Rows of the terminal
+        :param title: Title of the recording
+        :param buffer_size: Bytes of the ring buffer
+        :param file: Binary file object to write to instead of path
+        """
+        self.path = path
+        self.buffer = mmap.mmap(-1, buffer_size)
+        self.size = buffer_size
+
+        # Bytes ever written to and read from the buffer. The session only moves written and the background
+        # thread only moves read, a record is visible once written includes it
+        self.written = 0
+        self.read = 0
+        self.dropped = 0
+        self.dropped_reported = 0
+        self.resized = None
+
+        self.start = time.monotonic()
+        self.file = file if file is not None else open(path, 'wb')
+        self.closed = threading.Event()
+
+        header = {'version': 2, 'width': width, 'height': height, 'timestamp': int(time.time()),
+                  'env': {'TERM': os.environ.get('TERM', 'xterm'), 'SHELL': os.environ.get('SHELL', '')}}
+
+        if title:
+            header['title'] = title
+
+        self.file.write(json.dumps(header).encode() + b'\n')
+
+        self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flusher.start()
+
+    def output(self, data):
+        """
+        Copy output of the session into the ring buffer, dropping it when the buffer is full
+        :param data: bytes shown on the terminal
+        """
+        size = self.RECORD.size + len(data)
+
+        if size > self.size - (self.written - self.read):
+            self.dropped += len(data)
+            return
+
+        record = self.RECORD.pack(time.monotonic() - self.start, len(data)) + data
+        position = self.written % self.size
+        first = min(size, self.size - position)
+
+        self.buffer[position:position + first] = record[:first]
+
+        if first < size:
+            self.buffer[:size - first] = record[first:]
+
+        self.written += size
+
+    def resize(self, width, height):
+        """Record a change of the terminal size"""
+        self.resized = (time.monotonic() - self.start, width, height)
+
+    def take(self, size):
+        """Read bytes from the ring buffer"""
+        position = self.read % self.size
+        first = min(size, self.size - position)
+        data = self.buffer[position:position + first]
+
+        if first < size:
+            data += self.buffer[:size - first]
+
+        self.read += size
+
+        return data
+
+    def flush(self, decoder):
+        """
+        Write the records in the ring buffer to the file
+        :param decoder: Incremental UTF-8 decoder keeping characters split between records
+        """
+        written = self.written
+        lines = []
+        resized, self.resized = self.resized, None
+
+        while self.read < written:
+            seconds, size = self.RECORD.unpack(self.take(self.RECORD.size))
+            data = decoder.decode(self.take(size))
+
+            if resized is not None and resized[0] <= seconds:
+                lines.append([round(resized[0], 6), 'r', '%dx%d' % resized[1:]])
+                resized = None
+
+            if data:
+                lines.append([round(seconds, 6), 'o', data])
+
+        if resized is not None:
+            lines.append([round(resized[0], 6), 'r', '%dx%d' % resized[1:]])
+
+        dropped = self.dropped
+
+        if dropped > self.dropped_reported:
+            lines.append([round(time.monotonic() - self.start, 6), 'm',
+                          '%d bytes of output were dropped' % (dropped - self.dropped_reported)])
+            self.dropped_reported = dropped
+
+        if lines:
+            self.file.write(b''.join(json.dumps(line).encode() + b'\n' for line in lines))
+            self.file.flush()
+
+    def flush_loop(self):
+        import codecs
+
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+        while not self.closed.wait(self.FLUSH_INTERVAL):
+            self.flush(decoder)
+
+        self.flush(decoder)
+
+    def close(self):
+        """Write the rest of the recording and close the file"""
+        if self.closed.is_set():
+            return
+
+        self.closed.set()
+        self.flusher.join()
+        self.file.close()
+        self.buffer.close()
+
+
+class SessionReplay:
+    """
+    Plays an asciicast v2 recording on the terminal. Starting from a time finds the event with a binary search
+    on the offsets of the file, the events are ordered by time, so that long recordings are not read from the
+    start
+    """
+    # Bytes left to the binary search before reading the events one after the other
+    SCAN_SIZE = 4096
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.header = json.loads(self.file.readline())
+        self.events_start = self.file.tell()
+        self.file.seek(0, os.SEEK_END)
+        self.end = self.file.tell()
+
+        if self.header.get('version') != 2:
+            raise ValueError('Only asciicast v2 recordings are supported')
+
+    def event_after(self, offset):
+        """
+        Read the first event starting after an offset of the file
+        :return: the offset and the event, None if there is none
+        """
+        self.file.seek(offset)
+
+        if offset > self.events_start:
+            self.file.readline()
+
+        return self.next_event()
+
+    def next_event(self):
+        """
+        Read the event at the current offset of the file
+        :return: the offset and the event, None if there is none
+        """
+        while True:
+            position = self.file.tell()
+            line = self.file.readline()
+
+            if not line:
+                return position, None
+
+            if line.strip():
+                return position, json.loads(line)
+
+    def seek(self, seconds):
+        """
+        Find the offset of the first event at or after a time
+        :param seconds: The time from the start of the recording
+        :return: the offset
+        """
+        low, high = self.events_start, self.end
+
+        while high - low > self.SCAN_SIZE:
+            middle = (low + high) // 2
+            _, event = self.event_after(middle)
+
+            if event is None or event[0] >= seconds:
+                high = middle
+            else:
+                low = middle
+
+        position, event = self.event_after(low)
+
+        while event is not None and event[0] < seconds:
+            position, event = self.next_event()
+
+        return position
+
+    def events(self, seconds=0):
+        """Get the events from a time"""
+        self.file.seek(self.seek(seconds) if seconds > 0 else self.events_start)
+
+        for line in self.file:
+            if line.strip():
+                yield json.loads(line)
+
+    def play(self, seconds=0, speed=1.0, idle_limit=None, output=None):
+        """
+        Write the output of the recording with its timing
+        :param seconds: The time to start from
+        :param speed: Playback speed
+        :param idle_limit: Longest pause in seconds between two events
+        :param output: Binary file to write to, the terminal by default
+        """
+        output = output or sys.stdout.buffer
+        previous = seconds
+        start = time.monotonic()
+        clock = 0
+
+        for event in self.events(seconds):
+            pause = max(0, event[0] - previous)
+            previous = event[0]
+
+            if idle_limit is not None:
+                pause = min(pause, idle_limit)
+
+            clock += pause / speed
+            delay = clock - (time.monotonic() - start)
+
+            if delay > 0:
+                time.sleep(delay)
+
+            if event[1] == 'o':
+                output.write(event[2].encode())
+                output.flush()
+
+    def close(self):
+        self.file.close()
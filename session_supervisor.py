@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import time
+
+from server_management import ServerManagementError
+
+
+class ConnectionLost(Exception):
+    """Raised by the output filter of the session when ssh reports that a connection was lost"""
+
+    def __init__(self, host):
+        super().__init__(host)
+        self.host = host
+
+
+class SessionSupervisor:
+    """
+    Hands an interactive session over to the user and logs in again when a connection of its route is lost.
+
+    ssh sends keepalives (ServerAliveInterval) so that dead connections are found, and reports them with
+    messages naming the lost server. Nested logins run the ssh of every server from the shell of the previous
+    one, so when an inner connection is lost the shells of the servers before it are still logged into and
+    only the servers from the lost one are logged into again. Losing the first connection, or the ssh -J
+    process of a jump login, logs into the whole route again. Failed logins are retried with an exponential
+    backoff.
+    """
+    # Messages of ssh when a connection is lost. A session closed with exit prints "Connection to server closed."
+    LOST_PATTERN = re.compile(rb"Connection to (\S+) closed by remote host|Timeout, server (\S+) not responding|"
+                              rb"packet_write_wait: Connection to (\S+) port")
+
+    # Bytes of the output searched for the messages, which can be split between reads
+    TAIL_SIZE = 256
+
+    # Seconds to wait before the first login attempt, doubled after every failed one
+    BACKOFF = 1
+    BACKOFF_MAX = 60
+
+    # Seconds to wait for ssh to exit after a message about the first connection
+    EXIT_TIMEOUT = 2
+
+    def __init__(self, management, server_details, attempts=None):
+        """
+        :param management: ServerManagement logged into the server
+        :param server_details: The server details from the config file
+        :param attempts: Login attempts after a connection is lost before giving up
+        """
+        self.management = management
+        self.server_details = server_details
+        self.attempts = management.RECONNECT_ATTEMPTS if attempts is None else attempts
+        self.route = None
+        self.tail = b''
+        self.reconnects = 0
+
+    def run(self):
+        """
+        Log into the server and hand the session over to the user until it is closed
+        :return: the exit status of the session
+        """
+        management = self.management
+
+        # Servers with candidate proxy servers are logged into through the fastest of their routes
+        management.server_login(self.server_details)
+        self.route = management.route
+
+        if management.COMMAND_TO_RUN:
+            management.controller.sendline(management.COMMAND_TO_RUN)
+
+        # Failed logins from now on are retried instead of handing the session over
+        management.INTERACTIVE = False
+
+        while True:
+            try:
+                self.interact()
+            except ConnectionLost as lost:
+                if not self.recover(self.lost_position(lost.host)):
+                    return 255
+
+                continue
+
+            # The session ended without a message about a lost connection
+            management.controller.close()
+
+            if management.controller.exitstatus != 255 or not self.recover(0):
+                return management.controller.exitstatus or 0
+
+    def interact(self):
+        """Hand the session over to the user until ssh exits or reports a lost connection"""
+        import shutil
+        import signal
+
+        management = self.management
+        column, row = shutil.get_terminal_size((80, 20))
+        management.controller.setwinsize(row, column)
+
+        signal.signal(signal.SIGWINCH, management.sigwinch_pass_through)
+        self.tail = b''
+        management.interact(output_filter=self.watch)
+
+    def watch(self, data):
+        """Output filter of the session raising ConnectionLost when ssh reports a lost connection"""
+        self.tail = (self.tail + data)[-self.TAIL_SIZE:]
+        match = self.LOST_PATTERN.search(self.tail)
+
+        if match is None:
+            return data
+
+        # The message is shown before leaving the session
+        os.write(sys.stdout.fileno(), data)
+
+        raise ConnectionLost(next(host for host in match.groups() if host).decode('utf-8', 'replace'))
+
+    def lost_position(self, host):
+        """
+        Get the position in the route of the lost server
+        :return: the position, None if the server is not part of the route
+        """
+        for position in range(len(self.route.hops) - 1, -1, -1):
+            if str(self.route.hops[position]['server']) == host:
+                return position
+
+        return None
+
+    def recover(self, position):
+        """
+        Log into the servers of the route from the lost one, retrying with an exponential backoff. The whole
+        route is logged into again when ssh exited
+        :param position: Position in the route of the lost server, None if it is not part of the route
+        :return: True if the session was recovered or does not need to be
+        """
+        management = self.management
+
+        if position is None:
+            # A connection opened by the user from the server was lost, the session is still logged into it
+            if management.controller.isalive():
+                return True
+
+            position = 0
+
+        management.log("\n🧊 The connection to {} was lost".format(self.route.hops[position]['server']))
+
+        # A jump login is a single ssh process which exits when any connection of the route is lost
+        if management.use_jump_route(self.route) or not management.controller.isalive():
+            position = 0
+
+        if position == 0:
+            self.wait_exit()
+
+        for attempt in range(self.attempts):
+            delay = min(self.BACKOFF_MAX, self.BACKOFF * 2 ** attempt)
+
+            management.log("🥁 Logging in again in {delay}s (attempt {attempt} of {attempts})".format(
+                delay=delay, attempt=attempt + 1, attempts=self.attempts))
+
+            time.sleep(delay)
+
+            try:
+                if position > 0 and management.controller.isalive():
+                    management.log("🔥 {} is still logged into, logging in from it".format(
+                        self.route.hops[position - 1]['server']))
+
+                    management.resume_login(self.route, position)
+                else:
+                    position = 0
+                    self.close()
+                    management.server_login(self.server_details)
+                    self.route = management.route
+            except ServerManagementError as error:
+                management.log("🧊 {}".format(error))
+
+                # The next attempt logs in from the same server unless servers after it were logged into
+                if management.hops_logged_in != position:
+                    position = 0
+
+                continue
+
+            self.reconnects += 1
+            return True
+
+        management.log("🧊 Could not log into {} again after {} attempts".format(
+            self.route.target['server'], self.attempts))
+
+        return False
+
+    def wait_exit(self):
+        """Wait for ssh to exit after the first connection was lost"""
+        controller = self.management.controller
+        deadline = time.time() + self.EXIT_TIMEOUT
+
+        while controller.isalive() and time.time() < deadline:
+            time.sleep(0.05)
+
+    def close(self):
+        """Close the session so that the route can be logged into from this machine again"""
+        import signal
+
+        management = self.management
+
+        # Spawning the new session resizes the terminal, which must not be passed through to the closed one
+        signal.signal(signal.SIGWINCH, signal.SIG_DFL)
+
+        if management.controller is not None:
+            management.controller.close(force=True)
+
+        management.controller = None
+        management.hops_logged_in = 0
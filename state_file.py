@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+
+
+def hops_key(hops):
+    """
+    Get the key of a list of servers in the state files, such as the servers logged into with one ssh command
+    :return: String such as demo@bastion:22,demo@web1:22
+    """
+    return ','.join('%s@%s:%s' % (hop['username'], hop['server'], hop.get('port', 22)) for hop in hops)
+
+
+class StateFile:
+    """
+    A dictionary kept in a JSON file of the state folder, such as the learned prompts or the route history.
+
+    Only the entries changed by this process are written, merged with the ones other processes wrote in the
+    meantime, and the file is replaced atomically so that it is never read half written. Failing to read or
+    write the file is not fatal, the entries are learned again.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.entries = None
+        self.changed = {}
+        self.lock = threading.Lock()
+
+    def read(self):
+        """
+        Read the file
+        :return: dictionary of the entries, empty if the file does not exist or is not valid
+        """
+        try:
+            with open(self.cache_file) as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+        return entries if isinstance(entries, dict) else {}
+
+    def load(self):
+        if self.entries is None:
+            self.entries = self.read()
+
+        return self.entries
+
+    def save(self, keep=None):
+        """
+        Write the changed entries to the file, keeping the ones written by other processes. Changed entries
+        set to None are removed
+        :param keep: Function telling if an entry is kept, such as the ones not expired, all are kept if None
+        """
+        with self.lock:
+            entries = self.read()
+            entries.update(self.changed)
+            entries = {key: entry for key, entry in entries.items()
+                       if entry is not None and (keep is None or keep(entry))}
+            temp_file = '%s.%d.%d.tmp' % (self.cache_file, os.getpid(), threading.get_ident())
+
+            try:
+                os.makedirs(os.path.dirname(self.cache_file), mode=0o700, exist_ok=True)
+
+                with open(temp_file, 'w') as file:
+                    json.dump(entries, file)
+
+                os.replace(temp_file, self.cache_file)
+            except OSError:
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+
+                return
+
+            self.changed = {}
@@ -0,0 +1,105 @@
+"""
+Fixtures running the code against the fake ssh in benchmarks/fake_ssh. Every server is the local machine, the
+config file, the settings of the fake ssh and the state folder are written to a temporary folder.
+"""
+import json
+import os
+import sys
+
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FAKE_SSH = os.path.join(ROOT, 'benchmarks', 'fake_ssh')
+sys.path.insert(0, ROOT)
+
+from server_management import ServerManagement  # noqa: E402
+
+# Files of the state folder, the tests never touch the one of the user
+STATE_FILES = {
+    'BROKER_SOCKET': 'broker.sock',
+    'RECORDINGS_DIR': 'recordings',
+    'TRACE_HISTORY': 'trace_history.jsonl',
+    'REACHABILITY_CACHE': 'reachability.json',
+    'PROMPT_FINGERPRINTS': 'prompt_fingerprints.json',
+    'TOTP_KEYRING': 'totp_keys.yaml',
+    'ROUTE_HISTORY': 'route_history.json',
+}
+
+
+class FakeSsh:
+    """Writes the config file and the settings of the fake ssh, and creates the sessions logging in with them"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.config_file = os.path.join(directory, 'config.yaml')
+        self.fake_config = os.path.join(directory, 'fake_ssh.json')
+
+    @staticmethod
+    def server(alias, required=None, **details):
+        """
+        Get the config of a server named <alias>.example.net
+        :param required: The requiredServerLogIn of the server
+        """
+        server = {'aliases': [alias], 'server': '%s.example.net' % alias, 'username': 'demo',
+                  'password': 'password', 'port': 22}
+
+        if required is not None:
+            server['requiredServerLogIn'] = required
+
+        server.update(details)
+
+        return server
+
+    def configure(self, servers, hosts=None, **default):
+        """
+        Write the config file and the settings of the fake ssh
+        :param servers: list of server configs
+        :param hosts: dictionary of server -> settings of the fake ssh for that server
+        :param default: settings of the fake ssh for every server, no latency unless given
+        :return: the config file
+        """
+        with open(self.config_file, 'w') as file:
+            yaml.safe_dump({'servers': servers}, file)
+
+        with open(self.fake_config, 'w') as file:
+            json.dump({'default': dict({'latency': 0}, **default), 'hosts': hosts or {}}, file)
+
+        return self.config_file
+
+    def management(self, login_mode=ServerManagement.JUMP_LOGIN):
+        """Get a non interactive session of the config file"""
+        management = ServerManagement()
+        management.CONFIG_FILE = self.config_file
+        management.LOGIN_MODE = login_mode
+        management.INTERACTIVE = False
+        management.QUIET = True
+
+        return management
+
+
+@pytest.fixture
+def fake_ssh(tmp_path, monkeypatch):
+    state_dir = str(tmp_path / 'state')
+
+    monkeypatch.setenv('PATH', FAKE_SSH + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('FAKE_SSH_CONFIG', str(tmp_path / 'fake_ssh.json'))
+    monkeypatch.setattr(ServerManagement, 'STATE_DIR', state_dir)
+
+    for name, file_name in STATE_FILES.items():
+        monkeypatch.setattr(ServerManagement, name, os.path.join(state_dir, file_name))
+
+    return FakeSsh(str(tmp_path))
+
+
+@pytest.fixture
+def logged_in():
+    """Close the sessions a test logged into"""
+    sessions = []
+
+    yield sessions.append
+
+    for management in sessions:
+        if management.controller is not None:
+            management.controller.close(force=True)
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+import yaml
+
+from alias_completion import AliasCompletion
+
+
+def write_config(path, aliases):
+    with open(path, 'w') as file:
+        yaml.safe_dump({'servers': [{'aliases': names, 'server': '%s.example.net' % names[0], 'username': 'demo',
+                                     'password': 'password'} for names in aliases]}, file)
+
+    os.chmod(path, 0o600)
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = str(tmp_path / 'config.yaml')
+    write_config(path, [['web-eu-1', 'Front'], ['web-eu-2'], ['web-us-1'], ['db-eu-2'], ['cache']])
+
+    return path
+
+
+def complete(config_file, word, limit=AliasCompletion.LIMIT):
+    return AliasCompletion(config_file).complete(word, limit)
+
+
+def test_prefix(config_file):
+    assert complete(config_file, 'web-eu') == ['web-eu-1', 'web-eu-2']
+    assert complete(config_file, 'WEB-U') == ['web-us-1']
+    assert complete(config_file, 'front') == ['Front']
+
+
+def test_every_alias(config_file):
+    assert sorted(complete(config_file, '')) == ['Front', 'cache', 'db-eu-2', 'web-eu-1', 'web-eu-2', 'web-us-1']
+    assert complete(config_file, 'web', limit=1) == ['web-eu-1']
+
+
+def test_server_completes_to_its_first_alias(config_file):
+    assert complete(config_file, 'cache.example') == ['cache']
+
+
+def test_substring_after_the_prefixes(config_file):
+    # The aliases where the word ends first come first
+    assert complete(config_file, 'eu-2') == ['db-eu-2', 'web-eu-2']
+
+
+def test_subsequence_when_nothing_else_matches(config_file):
+    assert complete(config_file, 'wbeu') == ['web-eu-1', 'web-eu-2']
+    assert complete(config_file, 'deu') == ['db-eu-2']
+    assert complete(config_file, 'zz') == []
+
+
+def test_fuzzy_search_over_many_blocks(tmp_path):
+    path = str(tmp_path / 'config.yaml')
+    write_config(path, [['host%04d' % number] for number in range(1000)] + [['zebra-queue']])
+
+    assert complete(path, 'bq') == ['zebra-queue']
+    assert complete(path, 'st0999') == ['host0999']
+
+
+def test_index_is_rebuilt_when_the_config_changes(config_file):
+    assert complete(config_file, 'cache') == ['cache']
+
+    write_config(config_file, [['web-eu-1'], ['queue']])
+
+    assert complete(config_file, 'cache') == []
+    assert complete(config_file, 'qu') == ['queue']
+
+
+def test_lines_that_did_not_change_are_kept(config_file):
+    AliasCompletion(config_file).open()
+    write_config(config_file, [['web-eu-1'], ['alpha'], ['zulu']])
+
+    completion = AliasCompletion(config_file).open()
+
+    assert completion.lines() == sorted(AliasCompletion.candidates(yaml.safe_load(open(config_file))['servers']))
@@ -0,0 +1,104 @@
+import os
+import stat
+
+import pytest
+import yaml
+
+from alias_registry import AliasRegistry, ConfigError
+
+
+def write_config(path, servers):
+    with open(path, 'w') as file:
+        yaml.safe_dump({'servers': servers}, file)
+
+    os.chmod(path, 0o600)
+
+
+def server(number, *aliases):
+    return {'aliases': list(aliases) or ['host%d' % number], 'server': 'host%d.example.net' % number,
+            'username': 'demo', 'password': 'password%d' % number, 'port': 22}
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = str(tmp_path / 'config.yaml')
+    write_config(path, [server(1), server(2, 'host2', 'db')])
+
+    return path
+
+
+def test_lookup(config_file):
+    registry = AliasRegistry(config_file).load()
+
+    assert registry.get('db')['server'] == 'host2.example.net'
+    assert registry.get('host1')['password'] == 'password1'
+    assert registry.get('missing') is None
+
+
+def test_warm_load_does_not_parse_the_config(config_file, monkeypatch):
+    AliasRegistry(config_file).load()
+    assert os.path.exists(config_file + AliasRegistry.INDEX_SUFFIX)
+
+    def parse_config(registry):
+        raise AssertionError('The config file was parsed')
+
+    monkeypatch.setattr(AliasRegistry, 'parse_config', parse_config)
+
+    assert AliasRegistry(config_file).load().get('db')['server'] == 'host2.example.net'
+
+
+def test_index_is_rebuilt_when_the_config_changes(config_file):
+    AliasRegistry(config_file).load()
+
+    write_config(config_file, [server(1), server(3, 'db')])
+
+    # The size alone tells the index is stale when the modification time did not change
+    registry = AliasRegistry(config_file).load()
+
+    assert registry.get('db')['server'] == 'host3.example.net'
+    assert registry.get('host2') is None
+
+
+def test_index_is_only_readable_by_its_owner(config_file):
+    previous = os.umask(0o022)
+
+    try:
+        AliasRegistry(config_file).load()
+    finally:
+        os.umask(previous)
+
+    assert stat.S_IMODE(os.stat(config_file + AliasRegistry.INDEX_SUFFIX).st_mode) == 0o600
+
+
+def test_index_readable_by_others_is_rebuilt(config_file):
+    registry = AliasRegistry(config_file).load()
+    index_file = config_file + AliasRegistry.INDEX_SUFFIX
+    os.chmod(index_file, 0o644)
+
+    assert not AliasRegistry(config_file).load_index(registry.config_signature())
+
+    AliasRegistry(config_file).load()
+
+    assert stat.S_IMODE(os.stat(index_file).st_mode) == 0o600
+
+
+def test_corrupt_index_is_rebuilt(config_file):
+    AliasRegistry(config_file).load()
+
+    with open(config_file + AliasRegistry.INDEX_SUFFIX, 'wb') as file:
+        file.write(b'not an index')
+
+    assert AliasRegistry(config_file).load().get('db')['server'] == 'host2.example.net'
+
+
+def test_duplicate_alias(tmp_path):
+    path = str(tmp_path / 'config.yaml')
+    write_config(path, [server(1, 'web'), server(2, 'web')])
+
+    with pytest.raises(ConfigError, match="'web' is used by both"):
+        AliasRegistry(path).load()
+
+
+def test_missing_config(tmp_path):
+    with pytest.raises(ConfigError, match='does not exist'):
+        AliasRegistry(str(tmp_path / 'missing.yaml')).load()
@@ -0,0 +1,70 @@
+"""
+Benchmarks of the login path against the fake ssh, run with pytest-benchmark when it is installed:
+    python -m pytest tests/test_benchmarks.py --benchmark-only
+The scripts of the benchmarks folder measure the same paths at a larger scale and compare them with the old code.
+"""
+import pytest
+
+from alias_registry import AliasRegistry
+from server_management import ServerManagement
+
+pytest.importorskip('pytest_benchmark')
+
+# Seconds slept by the fake ssh before every prompt, like a network round trip
+LATENCY = 0.02
+ROUNDS = 5
+
+
+@pytest.fixture
+def servers(fake_ssh):
+    fake_ssh.configure([fake_ssh.server('hop0'), fake_ssh.server('hop1', required='hop0'),
+                        fake_ssh.server('hop2', required='hop1')] +
+                       [fake_ssh.server('fan%d' % number) for number in range(20)], latency=LATENCY)
+
+    return fake_ssh
+
+
+def log_in(fake_ssh, alias, login_mode):
+    management = fake_ssh.management(login_mode)
+
+    try:
+        management.server_login(management.get_server_details(alias))
+        assert management.run_command_with_status('true', 5) == (0, '')
+    finally:
+        if management.controller is not None:
+            management.controller.close(force=True)
+
+
+@pytest.mark.parametrize('alias', ['hop0', 'hop2'])
+@pytest.mark.parametrize('login_mode', [ServerManagement.JUMP_LOGIN, ServerManagement.NESTED_LOGIN])
+def test_login(benchmark, servers, alias, login_mode):
+    benchmark.pedantic(log_in, (servers, alias, login_mode), rounds=ROUNDS)
+
+
+def test_run_on_servers(benchmark, servers):
+    def run():
+        management = servers.management()
+        results = list(management.run_on_servers(['fan*'], 'true', 10))
+
+        assert [result['exit_status'] for result in results] == [0] * 20
+
+    benchmark.pedantic(run, rounds=ROUNDS)
+
+
+def test_stream_command_throughput(benchmark, servers, logged_in):
+    management = servers.management()
+    logged_in(management)
+    management.server_login(management.get_server_details('fan0'))
+
+    def stream():
+        exit_status, output = management.run_command_with_status('seq 1 200000', 10)
+
+        assert exit_status == 0 and len(output) == 1288895
+
+    benchmark.pedantic(stream, rounds=ROUNDS)
+
+
+def test_alias_lookup_warm(benchmark, servers):
+    AliasRegistry(servers.config_file).load()
+
+    benchmark(lambda: AliasRegistry(servers.config_file).load().get('fan19'))
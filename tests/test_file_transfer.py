@@ -0,0 +1,137 @@
+import hashlib
+import os
+
+import pytest
+
+from file_transfer import FileTransfer
+
+CHUNK_SIZE = 65536
+
+
+@pytest.fixture
+def transfer(fake_ssh):
+    """Get a transfer through bastion -> web1, comparing the files in small chunks"""
+    fake_ssh.configure([fake_ssh.server('bastion'), fake_ssh.server('web1', required='bastion')])
+    management = fake_ssh.management()
+
+    return lambda: FileTransfer(management.new_worker(), 'web1', management.get_server_details('web1'),
+                                CHUNK_SIZE)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / 'source.bin')
+
+    # Every chunk differs so that a wrong offset is found by the checksums
+    with open(path, 'wb') as file:
+        for number in range(10):
+            file.write(number.to_bytes(8, 'big') + os.urandom(CHUNK_SIZE - 8))
+
+        file.write(b'partial chunk')
+
+    return path
+
+
+def sha256(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def check(result):
+    assert result['error'] is None
+
+    return result
+
+
+def test_push(transfer, source, tmp_path):
+    remote = str(tmp_path / 'remote.bin')
+
+    result = check(transfer().push(source, remote))
+
+    assert (result['bytes'], result['skipped']) == (os.path.getsize(source), 0)
+    assert result['checksum'] == sha256(remote) == sha256(source)
+
+
+def test_push_to_a_folder(transfer, source, tmp_path):
+    folder = tmp_path / 'releases'
+    folder.mkdir()
+
+    check(transfer().push(source, str(folder) + '/'))
+
+    assert sha256(str(folder / 'source.bin')) == sha256(source)
+
+
+def test_push_resumes_from_the_first_chunk_that_differs(transfer, source, tmp_path):
+    remote = str(tmp_path / 'remote.bin')
+    check(transfer().push(source, remote))
+
+    # Half of the fifth chunk is lost
+    os.truncate(remote, CHUNK_SIZE * 4 + CHUNK_SIZE // 2)
+    result = check(transfer().push(source, remote))
+
+    assert result['skipped'] == CHUNK_SIZE * 4
+    assert result['bytes'] == os.path.getsize(source) - CHUNK_SIZE * 4
+    assert sha256(remote) == sha256(source)
+
+
+def test_push_sends_the_chunks_that_changed(transfer, source, tmp_path):
+    remote = str(tmp_path / 'remote.bin')
+    check(transfer().push(source, remote))
+
+    with open(remote, 'r+b') as file:
+        file.seek(CHUNK_SIZE * 2 + 100)
+        file.write(b'changed')
+
+    result = check(transfer().push(source, remote))
+
+    assert result['skipped'] == CHUNK_SIZE * 2
+    assert sha256(remote) == sha256(source)
+
+
+def test_push_unchanged_file(transfer, source, tmp_path):
+    remote = str(tmp_path / 'remote.bin')
+    check(transfer().push(source, remote))
+
+    result = check(transfer().push(source, remote))
+
+    # Only the partial chunk at the end is sent again
+    assert result['skipped'] == CHUNK_SIZE * 10
+    assert sha256(remote) == sha256(source)
+
+
+def test_pull(transfer, source, tmp_path):
+    pulled = str(tmp_path / 'pulled' / 'source.bin')
+
+    result = check(transfer().pull(source, pulled))
+
+    assert (result['bytes'], result['skipped']) == (os.path.getsize(source), 0)
+    assert result['checksum'] == sha256(pulled) == sha256(source)
+
+
+def test_pull_resumes_from_the_first_chunk_that_differs(transfer, source, tmp_path):
+    pulled = str(tmp_path / 'pulled.bin')
+    check(transfer().pull(source, pulled))
+
+    os.truncate(pulled, CHUNK_SIZE * 6 + 10)
+    result = check(transfer().pull(source, pulled))
+
+    assert result['skipped'] == CHUNK_SIZE * 6
+    assert sha256(pulled) == sha256(source)
+
+
+def test_pull_replaces_a_longer_local_file(transfer, source, tmp_path):
+    pulled = str(tmp_path / 'pulled.bin')
+    check(transfer().pull(source, pulled))
+
+    with open(pulled, 'ab') as file:
+        file.write(b'x' * CHUNK_SIZE * 3)
+
+    check(transfer().pull(source, pulled))
+
+    assert sha256(pulled) == sha256(source)
+
+
+def test_pull_missing_file(transfer, tmp_path):
+    result = transfer().pull(str(tmp_path / 'missing.bin'), str(tmp_path / 'pulled.bin'))
+
+    assert 'No such file' in result['error']
@@ -0,0 +1,91 @@
+import pytest
+
+from server_management import ServerManagement, ServerManagementError
+
+CHAIN = ['hop0', 'hop1', 'hop2']
+
+
+@pytest.fixture
+def chain(fake_ssh):
+    """Three servers, each one reached through the one before it. The last one has its own user and password"""
+    fake_ssh.configure([fake_ssh.server('hop0'),
+                        fake_ssh.server('hop1', required='hop0'),
+                        fake_ssh.server('hop2', required='hop1', username='ops', password='secret')],
+                       hosts={'hop2.example.net': {'password': 'secret'}})
+
+    return fake_ssh
+
+
+def spawned_commands(management, monkeypatch):
+    """Record the ssh commands a session spawns or sends to its shell"""
+    commands = []
+    spawn_or_send = management.spawn_or_send
+
+    def record(command):
+        commands.append(command)
+        spawn_or_send(command)
+
+    monkeypatch.setattr(management, 'spawn_or_send', record)
+
+    return commands
+
+
+def test_single_server(chain, logged_in):
+    management = chain.management()
+    logged_in(management)
+
+    management.server_login(management.get_server_details('hop0'))
+
+    assert management.hops_logged_in == 1
+    assert management.run_command_with_status('echo "$PS1"', 5) == (0, 'demo@hop0.example.net:~$ \n')
+
+
+def test_jump_login_uses_one_ssh_command(chain, logged_in, monkeypatch):
+    management = chain.management(ServerManagement.JUMP_LOGIN)
+    logged_in(management)
+    commands = spawned_commands(management, monkeypatch)
+
+    management.server_login(management.get_server_details('hop2'))
+
+    assert len(commands) == 1
+    assert '-J demo@hop0.example.net:22,demo@hop1.example.net:22' in commands[0]
+    assert management.hops_logged_in == 3
+    assert management.route.servers == ['%s.example.net' % alias for alias in CHAIN]
+    assert management.run_command_with_status('echo "$PS1"', 5) == (0, 'ops@hop2.example.net:~$ \n')
+
+
+def test_nested_login_logs_into_every_server(chain, logged_in, monkeypatch):
+    management = chain.management(ServerManagement.NESTED_LOGIN)
+    logged_in(management)
+    commands = spawned_commands(management, monkeypatch)
+
+    management.server_login(management.get_server_details('hop2'))
+
+    assert len(commands) == 3
+    assert all('-J' not in command for command in commands)
+    assert management.hops_logged_in == 3
+    assert management.run_command_with_status('echo "$PS1"', 5) == (0, 'ops@hop2.example.net:~$ \n')
+
+
+@pytest.mark.parametrize('login_mode', [ServerManagement.JUMP_LOGIN, ServerManagement.NESTED_LOGIN])
+def test_denied_password_fails(fake_ssh, logged_in, login_mode):
+    fake_ssh.configure([fake_ssh.server('hop0'), fake_ssh.server('hop1', required='hop0')],
+                       hosts={'hop1.example.net': {'fail': 'deny'}})
+    management = fake_ssh.management(login_mode)
+    logged_in(management)
+    management.APP_TIMEOUT = 2
+
+    with pytest.raises(ServerManagementError):
+        management.server_login(management.get_server_details('hop1'))
+
+
+def test_verification_code(fake_ssh, logged_in):
+    fake_ssh.configure([fake_ssh.server('hop0', requireVerificationCode=True)],
+                       hosts={'hop0.example.net': {'verification_code': '123456'}})
+    management = fake_ssh.management()
+    logged_in(management)
+    management.VERIFICATION_CODE = '123456'
+
+    management.server_login(management.get_server_details('hop0'))
+
+    assert management.run_command_with_status('true', 5) == (0, '')
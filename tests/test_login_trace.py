@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from login_trace import Tracer
+
+
+@pytest.mark.parametrize('values, percent, expected', [
+    ([5], 50, 5),
+    ([5], 95, 5),
+    ([1, 2], 50, 1),
+    ([1, 2], 95, 2),
+    ([1, 2, 3, 4, 5, 6], 50, 3),
+    (list(range(1, 11)), 50, 5),
+    (list(range(1, 11)), 95, 10),
+    (list(range(1, 21)), 95, 19),
+    (list(range(1, 101)), 95, 95),
+    (list(range(1, 101)), 0, 1),
+])
+def test_percentile_nearest_rank(values, percent, expected):
+    assert Tracer.percentile(values, percent) == expected
+
+
+def test_expect_spans_are_not_kept_in_the_history(tmp_path):
+    tracer = Tracer()
+    tracer.record('hop', 0, 0.1, alias='web1', server='web1.example.net')
+    tracer.record('expect', 0, 0.05, server='web1.example.net')
+    tracer.record('phase', 0, 0.02, keep=False, server='web1.example.net', phase='password')
+
+    path = str(tmp_path / 'state' / 'history.jsonl')
+    tracer.append_history(path)
+
+    with open(path) as file:
+        assert [json.loads(line)['name'] for line in file] == ['hop']
+
+
+def test_summary(tmp_path):
+    path = str(tmp_path / 'history.jsonl')
+
+    with open(path, 'w') as file:
+        for duration in range(1, 11):
+            file.write(json.dumps({'name': 'hop', 'duration_ms': duration, 'alias': 'web1',
+                                   'server': 'web1.example.net'}) + '\n')
+            file.write(json.dumps({'name': 'phase', 'duration_ms': duration / 10.0, 'server': 'web1.example.net',
+                                   'phase': 'password'}) + '\n')
+
+        file.write(json.dumps({'name': 'hop', 'duration_ms': 50, 'alias': 'db1', 'server': 'db1.example.net'}) + '\n')
+        file.write('not a span\n')
+
+    rows = [(row['alias'], row['phase'], row['count'], row['p50'], row['p95']) for row in Tracer.summary(path)]
+
+    # The slowest server first, its total before its phases
+    assert rows == [('db1', 'total', 1, 50, 50), ('web1', 'total', 10, 5, 10), ('web1', 'password', 10, 0.5, 1.0)]
@@ -0,0 +1,96 @@
+import pytest
+
+from alias_registry import ConfigError
+from pipeline import Pipeline
+
+
+@pytest.fixture
+def servers(fake_ssh):
+    fake_ssh.configure([fake_ssh.server('web%d' % number) for number in range(1, 4)] + [fake_ssh.server('db1')])
+
+    return fake_ssh
+
+
+def step(name, aliases, command, needs=None, concurrency=None):
+    return {'name': name, 'aliases': aliases, 'command': command, 'needs': needs or [], 'concurrency': concurrency}
+
+
+def run(servers, steps, failure=Pipeline.FAIL_FAST, parallel=4):
+    """Run a pipeline, the commands append their step to a log file"""
+    management = servers.management()
+    management.APP_TIMEOUT = 5
+    pipeline = Pipeline(management, 'deploy', Pipeline.validate('deploy', steps), failure)
+    events = [event for event in pipeline.run(parallel) if isinstance(event, tuple)]
+
+    return pipeline, dict(events), events
+
+
+def log(tmp_path):
+    with open(str(tmp_path / 'log')) as file:
+        return file.read().split()
+
+
+def test_steps_are_ordered_by_their_needs():
+    steps = Pipeline.validate('deploy', [step('release', ['web*'], 'true', ['drain', 'migrate']),
+                                         step('migrate', ['db1'], 'true'), step('drain', ['web*'], 'true')])
+
+    assert [item['name'] for item in steps] == ['migrate', 'drain', 'release']
+
+
+def test_cycle():
+    with pytest.raises(ConfigError, match='create a cycle: a, b'):
+        Pipeline.validate('deploy', [step('a', ['web1'], 'true', ['b']), step('b', ['web1'], 'true', ['a']),
+                                     step('c', ['web1'], 'true')])
+
+
+def test_missing_need():
+    with pytest.raises(ConfigError, match="needs the step 'missing'"):
+        Pipeline.validate('deploy', [step('a', ['web1'], 'true', ['missing'])])
+
+
+def test_steps_run_after_their_needs(servers, tmp_path):
+    path = str(tmp_path / 'log')
+    pipeline, states, _ = run(servers, [
+        step('drain', ['web*'], 'sleep 0.2; echo drain >> %s' % path, concurrency=1),
+        step('migrate', ['db1'], 'echo migrate >> %s' % path),
+        step('release', ['web*'], 'echo release >> %s' % path, ['drain', 'migrate'])])
+
+    assert states == {'drain': Pipeline.SUCCEEDED, 'migrate': Pipeline.SUCCEEDED, 'release': Pipeline.SUCCEEDED}
+    assert not pipeline.failed()
+    assert len(pipeline.results) == 7
+
+    lines = log(tmp_path)
+
+    # migrate does not wait for drain, release waits for both
+    assert lines.index('migrate') < lines.index('drain')
+    assert lines[-3:] == ['release'] * 3 and lines.count('drain') == 3
+
+
+def test_fail_fast(servers, tmp_path):
+    path = str(tmp_path / 'log')
+    pipeline, states, _ = run(servers, [
+        step('check', ['web*'], 'echo check >> %s; false' % path, concurrency=1),
+        step('release', ['web*'], 'echo release >> %s' % path, ['check'])])
+
+    assert states == {'check': Pipeline.FAILED, 'release': Pipeline.SKIPPED}
+    assert pipeline.failed()
+    assert log(tmp_path) == ['check']
+
+
+def test_continue_skips_only_the_steps_needing_a_failed_one(servers, tmp_path):
+    path = str(tmp_path / 'log')
+    _, states, events = run(servers, [
+        step('check', ['web1'], 'false'),
+        step('release', ['web*'], 'echo release >> %s' % path, ['check']),
+        step('migrate', ['db1'], 'echo migrate >> %s' % path)], Pipeline.CONTINUE)
+
+    assert states == {'check': Pipeline.FAILED, 'release': Pipeline.SKIPPED, 'migrate': Pipeline.SUCCEEDED}
+    assert events.index(('check', Pipeline.FAILED)) < events.index(('release', Pipeline.SKIPPED))
+    assert log(tmp_path) == ['migrate']
+
+
+def test_sessions_are_reused_by_the_next_step(servers, tmp_path):
+    pipeline, _, _ = run(servers, [step('first', ['web1'], 'echo $$'), step('second', ['web1'], 'echo $$', ['first'])])
+
+    # Both commands ran in the same shell
+    assert pipeline.results[0]['output'] == pipeline.results[1]['output']
@@ -0,0 +1,126 @@
+import pytest
+
+from output_aggregator import OutputAggregator
+
+
+@pytest.fixture
+def servers(fake_ssh):
+    fake_ssh.configure([fake_ssh.server('web%d' % number) for number in range(1, 5)] +
+                       [fake_ssh.server('down')], hosts={'down.example.net': {'fail': 'refuse'}})
+
+    return fake_ssh
+
+
+@pytest.fixture
+def session(servers, logged_in):
+    management = servers.management()
+    logged_in(management)
+    management.server_login(management.get_server_details('web1'))
+
+    return management
+
+
+def stream(management, command):
+    """Get the lines streamed by a command and its exit status"""
+    lines = []
+    generator = management.stream_command(command, 5, 10)
+
+    while True:
+        try:
+            lines.append(next(generator))
+        except StopIteration as stop:
+            return lines, stop.value
+
+
+@pytest.mark.parametrize('exit_status', [0, 1, 7, 255])
+def test_run_command_with_status(session, exit_status):
+    assert session.run_command_with_status('echo out; (exit %d)' % exit_status, 5) == (exit_status, 'out\n')
+
+
+def test_stream_command_lines_and_exit_status(session):
+    assert stream(session, 'printf "one\\ntwo\\nthree"; false') == (['one\n', 'two\n', 'three'], 1)
+
+
+def test_stream_command_output_like_the_markers(session):
+    # The markers carry a random id, output looking like them does not end the command
+    lines, exit_status = stream(session, 'echo START; echo END:0; echo done; (exit 3)')
+
+    assert lines[-1] == 'done\n'
+    assert exit_status == 3
+
+
+def test_stream_command_in_the_background(session):
+    # The interactive shell prints the job number of the command
+    lines, exit_status = stream(session, 'sleep 0.1 &')
+
+    assert exit_status == 0
+    assert all(line.startswith('[1]') for line in lines)
+
+    exit_status, output = session.run_command_with_status('wait; echo waited', 5)
+
+    assert exit_status == 0
+    assert output.endswith('waited\n')
+
+
+def test_stream_command_with_a_comment(session):
+    assert stream(session, 'echo kept; (exit 4) # the end marker is not commented out') == (['kept\n'], 4)
+
+
+def test_stream_command_on_many_lines(session):
+    assert stream(session, 'echo one\nif true; then\n  echo two\nfi\n(exit 5)') == (['one\n', 'two\n'], 5)
+
+
+def test_stream_command_large_output(session):
+    lines, exit_status = stream(session, 'seq 1 100000')
+
+    assert exit_status == 0
+    assert len(lines) == 100000
+    assert lines[-1] == '100000\n'
+
+
+def test_commands_after_each_other(session):
+    for number in range(5):
+        assert session.run_command_with_status('echo %d; (exit %d)' % (number, number), 5) == (number, '%d\n' % number)
+
+
+def test_run_on_servers(servers):
+    management = servers.management()
+    management.APP_TIMEOUT = 5
+
+    results = {result['alias']: result
+               for result in management.run_on_servers(['web*', 'down'], 'echo "$PS1"; (exit 2)', 3)}
+
+    assert sorted(results) == ['down', 'web1', 'web2', 'web3', 'web4']
+
+    for number in range(1, 5):
+        result = results['web%d' % number]
+        assert (result['exit_status'], result['output'], result['error']) == \
+            (2, 'demo@web%d.example.net:~$ \n' % number, None)
+
+    assert results['down']['exit_status'] is None
+    assert results['down']['error']
+
+
+def test_run_on_servers_aggregate(servers, tmp_path):
+    management = servers.management()
+    management.APP_TIMEOUT = 5
+    aggregator = OutputAggregator(str(tmp_path), memory_limit=1024)
+
+    try:
+        # web1 and web2 print 100 KB more than the others, which is spilled to disk
+        results = list(management.run_on_servers(
+            ['web*'], 'case "$PS1" in *@web[12].*) head -c 102400 /dev/zero | tr "\\0" x;; esac; echo end', 4,
+            aggregator))
+
+        assert len(results) == 4
+        assert sum(result['first'] for result in results) == 2
+        assert sorted((sorted(group.hosts), group.size) for group in aggregator.groups) == \
+            [(['web1', 'web2'], 102404), (['web3', 'web4'], 4)]
+
+        large = next(group for group in aggregator.groups if group.size > 1024)
+        assert ''.join(large.chunks()) == 'x' * 102400 + 'end\n'
+
+        large.release()
+        assert large.path is None
+    finally:
+        aggregator.close()
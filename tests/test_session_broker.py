@@ -0,0 +1,88 @@
+import pytest
+
+from server_management import ServerManagementError
+from session_broker import SessionBroker
+
+
+@pytest.fixture
+def broker(fake_ssh, tmp_path):
+    fake_ssh.configure([fake_ssh.server('web%d' % number) for number in range(1, 4)])
+    broker = SessionBroker(str(tmp_path / 'broker.sock'), fake_ssh.config_file, max_sessions=2)
+
+    yield broker
+
+    for session in list(broker.sessions):
+        session.close()
+
+
+def release(session, last_used):
+    session.last_used = last_used
+    session.lock.release()
+
+
+def test_idle_session_is_reused(broker):
+    session = broker.acquire_shell('web1')
+    release(session, 1)
+
+    assert broker.acquire_shell('web1') is session
+    assert len(broker.sessions) == 1
+
+
+def test_least_recently_used_idle_session_is_evicted(broker):
+    first = broker.acquire_shell('web1')
+    release(first, 1)
+    second = broker.acquire_shell('web2')
+    release(second, 2)
+
+    third = broker.acquire_shell('web3')
+
+    assert broker.sessions == [second, third]
+    assert not first.is_alive()
+    assert not first.lock.locked()
+
+
+def test_sessions_in_use_are_not_evicted(broker):
+    first = broker.acquire_shell('web1')
+    release(first, 1)
+    second = broker.acquire_shell('web2')
+    release(second, 2)
+
+    # The oldest session was handed to a client, the next one is evicted instead
+    assert first.lock.acquire(blocking=False)
+    broker.acquire_shell('web3')
+
+    assert first in broker.sessions and first.is_alive()
+    assert second not in broker.sessions and not second.is_alive()
+
+
+def test_attached_sessions_are_not_evicted(broker):
+    for alias in ['web1', 'web2']:
+        session = broker.acquire_shell(alias)
+        session.attached = True
+        session.lock.release()
+
+    with pytest.raises(ServerManagementError, match='all of them are in use'):
+        broker.acquire_shell('web3')
+
+    assert all(session.is_alive() for session in broker.sessions)
+
+
+def test_evicted_session_cannot_be_handed_out(broker, monkeypatch):
+    first = broker.acquire_shell('web1')
+    release(first, 1)
+    second = broker.acquire_shell('web2')
+    release(second, 2)
+
+    # A client asking for the session while it is closed finds it neither listed nor free
+    seen = []
+    close = first.close
+
+    def closing():
+        seen.append((first in broker.sessions, first.lock.acquire(blocking=False)))
+        close()
+
+    monkeypatch.setattr(first, 'close', closing)
+    broker.make_room()
+
+    assert seen == [(False, False)]
+    assert broker.acquire_shell('web1') is not first
@@ -0,0 +1,119 @@
+import io
+import json
+
+import pytest
+
+from session_recorder import SessionRecorder, SessionReplay
+
+
+def read(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+def write_recording(path, events):
+    with open(path, 'w') as file:
+        file.write(json.dumps({'version': 2, 'width': 80, 'height': 24}) + '\n')
+
+        for event in events:
+            file.write(json.dumps(event) + '\n')
+
+
+def test_record(tmp_path):
+    path = str(tmp_path / 'session.cast')
+    recorder = SessionRecorder(path, 80, 24, title='web1')
+    recorder.output(b'hello ')
+    recorder.output('wörld'.encode()[:2])
+    recorder.output('wörld'.encode()[2:])
+    recorder.resize(120, 40)
+    recorder.close()
+
+    header, *events = read(path)
+
+    assert (header['version'], header['width'], header['height'], header['title']) == (2, 80, 24, 'web1')
+    assert ''.join(event[2] for event in events if event[1] == 'o') == 'hello wörld'
+    assert [event[2] for event in events if event[1] == 'r'] == ['120x40']
+    assert [event[0] for event in events] == sorted(event[0] for event in events)
+
+
+def test_full_buffer_drops_the_output(tmp_path, monkeypatch):
+    # The flusher only runs when it is woken up by close
+    monkeypatch.setattr(SessionRecorder, 'FLUSH_INTERVAL', 60)
+    path = str(tmp_path / 'session.cast')
+    recorder = SessionRecorder(path, 80, 24, buffer_size=64)
+    recorder.output(b'x' * 40)
+    recorder.output(b'y' * 40)
+    recorder.close()
+
+    events = read(path)[1:]
+
+    assert [event[1:] for event in events] == [['o', 'x' * 40], ['m', '40 bytes of output were dropped']]
+
+
+def test_ring_buffer_wraps(tmp_path, monkeypatch):
+    monkeypatch.setattr(SessionRecorder, 'FLUSH_INTERVAL', 0.01)
+    path = str(tmp_path / 'session.cast')
+    recorder = SessionRecorder(path, 80, 24, buffer_size=100)
+    chunks = [('%02d' % number).encode() * 10 for number in range(20)]
+
+    for chunk in chunks:
+        while recorder.size - (recorder.written - recorder.read) < recorder.RECORD.size + len(chunk):
+            recorder.closed.wait(0.01)
+
+        recorder.output(chunk)
+
+    recorder.close()
+
+    assert ''.join(event[2] for event in read(path)[1:]) == b''.join(chunks).decode()
+    assert recorder.dropped == 0
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = str(tmp_path / 'long.cast')
+    write_recording(path, [[number / 10.0, 'o', '%d\n' % number] for number in range(5000)])
+
+    replay = SessionReplay(path)
+    yield replay
+    replay.close()
+
+
+@pytest.mark.parametrize('seconds, first', [(0, 0), (0.05, 1), (123.4, 1234), (250, 2500), (499.9, 4999)])
+def test_seek(recording, seconds, first):
+    assert next(recording.events(seconds))[2] == '%d\n' % first
+
+
+def test_seek_after_the_end(recording):
+    assert list(recording.events(1000)) == []
+
+
+def test_seek_reads_a_few_events(recording, monkeypatch):
+    reads = []
+    next_event = SessionReplay.next_event
+
+    def counting(replay):
+        reads.append(1)
+        return next_event(replay)
+
+    monkeypatch.setattr(SessionReplay, 'next_event', counting)
+    recording.seek(400)
+
+    # The binary search stops with SCAN_SIZE bytes left, a few hundred short events, instead of 4000
+    assert len(reads) < 500
+
+
+def test_play(recording):
+    output = io.BytesIO()
+    recording.play(seconds=499.5, speed=1000, output=output)
+
+    assert output.getvalue() == b''.join(b'%d\n' % number for number in range(4995, 5000))
+
+
+def test_only_version_2(tmp_path):
+    path = str(tmp_path / 'old.cast')
+
+    with open(path, 'w') as file:
+        file.write(json.dumps({'version': 1}) + '\n')
+
+    with pytest.raises(ValueError, match='asciicast v2'):
+        SessionReplay(path)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+import base64
+import hashlib
+import hmac
+import os
+import struct
+import threading
+import time
+
+from alias_registry import ConfigError
+
+
+class TotpGenerator:
+    """
+    Generates the verification codes of servers from their TOTP secrets (RFC 6238), like an authenticator app.
+    A server has its base32 secret in the config file or the name of a secret kept in a keyring file that only
+    the user can read:
+
+    servers:
+      - aliases: [bastion]
+        requireVerificationCode: true
+        totpKey: bastion            # or totpSecret: JBSWY3DPEHPK3PXP
+
+    ~/.server_automation/totp_keys.yaml:
+      bastion: JBSWY3DPEHPK3PXP
+
+    The code of a time window is generated once and shared by all the logins of the window. A code is only
+    given out while it stays valid for MARGIN more seconds, closer to the end of its window the next window is
+    waited for, so that a code never expires on its way to the server and the login does not need a retry.
+    """
+    PERIOD = 30
+    DIGITS = 6
+
+    # Seconds a code must stay valid after it is given out
+    MARGIN = 3
+
+    def __init__(self, keyring_file, margin=MARGIN):
+        """
+        :param keyring_file: YAML file of name: secret pairs
+        :param margin: Seconds a code must stay valid after it is given out
+        """
+        self.keyring_file = keyring_file
+        self.margin = margin
+        self.keys = None
+        self.codes = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def has_secret(server_details):
+        return bool(server_details.get('totpSecret') or server_details.get('totpKey'))
+
+    def load_keys(self):
+        """
+        Read the keyring file, which must only be readable by the user like ssh keys
+        :raise ConfigError: if it cannot be read
+        """
+        import stat
+
+        import yaml
+
+        try:
+            mode = os.stat(self.keyring_file).st_mode
+
+            if mode & (stat.S_IRWXG | stat.S_IRWXO):
+                raise ConfigError('The TOTP keyring: {0} can be read by other users, make it private using: '
+                                  '`chmod 600 {0}`'.format(self.keyring_file))
+
+            with open(self.keyring_file) as file:
+                keys = yaml.safe_load(file) or {}
+        except (OSError, yaml.YAMLError) as error:
+            raise ConfigError('Could not read the TOTP keyring: {}: {}'.format(self.keyring_file, error))
+
+        if not isinstance(keys, dict):
+            raise ConfigError('The TOTP keyring: {} must map names to secrets'.format(self.keyring_file))
+
+        return {str(name): str(secret) for name, secret in keys.items()}
+
+    def secret(self, server_details):
+        """
+        Get the decoded secret of a server
+        :raise ConfigError: if the secret is missing or not valid base32
+        """
+        secret = server_details.get('totpSecret')
+
+        if not secret:
+            with self.lock:
+                if self.keys is None:
+                    self.keys = self.load_keys()
+
+            name = str(server_details['totpKey'])
+
+            if name not in self.keys:
+                raise ConfigError('No TOTP secret named \'{}\' in {}'.format(name, self.keyring_file))
+
+            secret = self.keys[name]
+
+        # Secrets are shown in groups and without padding by most services
+        secret = str(secret).replace(' ', '').upper()
+
+        try:
+            return base64.b32decode(secret + '=' * (-len(secret) % 8))
+        except ValueError:
+            raise ConfigError('The TOTP secret of {} is not valid base32'.format(server_details['server']))
+
+    @staticmethod
+    def generate(key, counter, digits=DIGITS):
+        """Get the code of a time window"""
+        digest = hmac.new(key, struct.pack('>Q', counter), hashlib.sha1).digest()
+        offset = digest[-1] & 0x0f
+        value = struct.unpack('>I', digest[offset:offset + 4])[0] & 0x7fffffff
+
+        return str(value % 10 ** digits).zfill(digits)
+
+    def wait(self, server_details):
+        """
+        Get the seconds to wait for the code of a server to stay valid for the margin
+        :return: 0 if the code of the current window can be used
+        """
+        period = int(server_details.get('totpPeriod', self.PERIOD))
+        remaining = period - time.time() % period
+
+        return remaining if remaining < self.margin else 0
+
+    def code(self, server_details):
+        """
+        Get the verification code of a server, waiting for the next window when the current one is ending
+        :raise ConfigError: if the secret of the server cannot be read
+        """
+        key = self.secret(server_details)
+        period = int(server_details.get('totpPeriod', self.PERIOD))
+        digits = int(server_details.get('totpDigits', self.DIGITS))
+
+        delay = self.wait(server_details)
+
+        if delay:
+            time.sleep(delay)
+
+        counter = int(time.time() // period)
+
+        with self.lock:
+            code = self.codes.get((key, period, digits, counter))
+
+            if code is None:
+                code = self.generate(key, counter, digits)
+
+                # Only the codes of the current windows are kept
+                self.codes = {cached: value for cached, value in self.codes.items() if cached[3] >= counter - 1}
+                self.codes[(key, period, digits, counter)] = code
+
+        return code
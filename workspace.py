@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+import os
+import selectors
+import signal
+import sys
+import time
+
+from server_management import ServerManagementError
+
+
+class WorkspaceSession:
+    """A logged in session of the workspace and the end of its output, shown again when it is switched to"""
+
+    def __init__(self, alias, worker):
+        self.alias = alias
+        self.worker = worker
+        self.controller = worker.controller
+        self.tail = bytearray(worker.controller.buffer)
+        self.unseen = False
+
+    def output(self, data, size):
+        """Keep the last size bytes of the output, from the start of a line"""
+        self.tail += data
+
+        # Trimmed once it is twice the size so that the output is not moved on every read
+        if len(self.tail) > size * 2:
+            start = self.tail.find(b'\n', len(self.tail) - size)
+            del self.tail[:start + 1 if start >= 0 else len(self.tail) - size]
+
+    def close(self):
+        self.controller.close(force=True)
+
+
+class Workspace:
+    """
+    Holds the sessions of many servers in one process and shows one of them at a time, with a status bar on
+    the last row of the terminal naming the sessions. The terminal and the output of every session are waited
+    for with one selector, so idle sessions take no CPU, and only the end of the output of the sessions not
+    shown is kept. Changes of the terminal size are passed to every session.
+
+    Keys, pressed after Ctrl-]:
+        n, p    next and previous session
+        1-9, 0  session 1 to 10
+        x       close the session shown
+        d       leave the workspace, closing all the sessions
+        Ctrl-]  send Ctrl-] to the session
+    """
+    PREFIX = b'\x1d'
+
+    # Bytes of the output of every session shown again when it is switched to
+    TAIL_SIZE = 16384
+
+    READ_SIZE = 65536
+
+    # Seconds between the redraws of the status bar while sessions not shown have output
+    BAR_INTERVAL = 0.5
+
+    HELP = 'Ctrl-] n/p/1-9 switch, x close, d leave'
+
+    def __init__(self, management, stdin=None, stdout=None):
+        """
+        :param management: ServerManagement the sessions are logged in with
+        :param stdin: File descriptor of the terminal keys are read from
+        :param stdout: File descriptor of the terminal written to
+        """
+        self.management = management
+        self.stdin = sys.stdin.fileno() if stdin is None else stdin
+        self.stdout = sys.stdout.fileno() if stdout is None else stdout
+        self.sessions = []
+        self.current = None
+        self.selector = None
+        self.rows, self.columns = 24, 80
+        self.prefixed = False
+        self.leaving = False
+        self.resized = False
+        self.message = ''
+        self.bar_drawn = 0
+        self.bar_dirty = False
+
+    def open(self, servers, parallel):
+        """
+        Log into servers at the same time
+        :param servers: list of (alias, server_details) tuples
+        :param parallel: The number of servers logged into at the same time
+        :return: generator of (alias, server_details, error) tuples in the order the logins finish
+        """
+        import concurrent.futures
+
+        # The workers share the tracer, create it before they start
+        self.management.get_tracer()
+        sessions = [None] * len(servers)
+
+        def log_in(position, alias, server_details):
+            worker = self.management.new_worker()
+
+            try:
+                worker.server_login(server_details)
+            except Exception as error:
+                if worker.controller is not None:
+                    worker.controller.close(force=True)
+
+                return str(error) if isinstance(error, ServerManagementError) else repr(error)
+
+            sessions[position] = WorkspaceSession(alias, worker)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            futures = {executor.submit(log_in, position, alias, server_details): (alias, server_details)
+                       for position, (alias, server_details) in enumerate(servers)}
+
+            for future in concurrent.futures.as_completed(futures):
+                alias, server_details = futures[future]
+                yield alias, server_details, future.result()
+
+        # The sessions are kept in the order the servers were passed
+        self.sessions = [session for session in sessions if session is not None]
+
+    def write(self, data):
+        while data:
+            data = data[os.write(self.stdout, data):]
+
+    def send(self, data):
+        """Send keys to the session shown"""
+        if data and self.current is not None:
+            try:
+                os.write(self.current.controller.child_fd, data)
+            except OSError:
+                pass
+
+    def status_bar(self):
+        """Get the text of the status bar, the sessions around the one shown when they do not all fit"""
+        names = []
+
+        for number, session in enumerate(self.sessions, 1):
+            mark = '*' if session is self.current else '+' if session.unseen else ' '
+            names.append('%d%s%s' % (number, mark, session.alias))
+
+        right = ' %s ' % (self.message or self.HELP)
+        width = max(0, self.columns - len(right))
+        position = self.sessions.index(self.current) if self.current in self.sessions else 0
+        start, end = position, position + 1
+
+        # Add the sessions on both sides of the one shown while they fit
+        while start > 0 or end < len(names):
+            if end < len(names) and len(' '.join(names[start:end + 1])) + 1 <= width:
+                end += 1
+            elif start > 0 and len(' '.join(names[start - 1:end])) + 1 <= width:
+                start -= 1
+            else:
+                break
+
+        left = ' ' + ' '.join(names[start:end])
+
+        return (left[:width].ljust(width) + right)[:self.columns]
+
+    def draw_bar(self):
+        """Draw the status bar on the last row, keeping the cursor of the session"""
+        self.write(b'\x1b7\x1b[%d;1H\x1b[7m%s\x1b[0m\x1b8' % (self.rows, self.status_bar().encode()))
+        self.bar_drawn = time.monotonic()
+        self.bar_dirty = False
+
+    def show(self, session):
+        """Switch to a session, drawing the end of its output above the status bar"""
+        self.current = session
+        session.unseen = False
+
+        # The rows above the status bar scroll, the bar stays
+        self.write(b'\x1b[1;%dr\x1b[2J\x1b[H' % (self.rows - 1) + bytes(session.tail))
+        self.draw_bar()
+
+    def switch(self, position):
+        if 0 <= position < len(self.sessions):
+            self.message = ''
+            self.show(self.sessions[position])
+
+    def resize(self):
+        """Pass the size of the terminal, without the status bar, to every session"""
+        try:
+            self.columns, self.rows = os.get_terminal_size(self.stdout)
+        except OSError:
+            pass
+
+        for session in self.sessions:
+            try:
+                session.controller.setwinsize(max(1, self.rows - 1), self.columns)
+            except OSError:
+                pass
+
+        if self.current is not None:
+            self.show(self.current)
+
+    def remove(self, session, message):
+        """Close a session and show the next one"""
+        position = self.sessions.index(session)
+        self.sessions.remove(session)
+        self.selector.unregister(session.controller.child_fd)
+        session.close()
+        self.message = message
+
+        if not self.sessions:
+            self.leaving = True
+        elif session is self.current:
+            self.show(self.sessions[min(position, len(self.sessions) - 1)])
+        else:
+            self.draw_bar()
+
+    def command(self, key):
+        """Handle a key pressed after the prefix"""
+        position = self.sessions.index(self.current)
+
+        if key == b'n':
+            self.switch((position + 1) % len(self.sessions))
+        elif key == b'p':
+            self.switch((position - 1) % len(self.sessions))
+        elif key.isdigit():
+            self.switch((int(key) - 1) % 10)
+        elif key == b'x':
+            self.remove(self.current, '%s closed' % self.current.alias)
+        elif key == b'd':
+            self.leaving = True
+
+    def keys(self, data):
+        """Send the keys typed to the session shown, handling the ones pressed after the prefix"""
+        while data and not self.leaving:
+            if self.prefixed:
+                self.prefixed = False
+                key, data = data[:1], data[1:]
+
+                if key == self.PREFIX:
+                    self.send(key)
+                else:
+                    self.command(key)
+
+                continue
+
+            position = data.find(self.PREFIX)
+
+            if position < 0:
+                self.send(data)
+                break
+
+            self.send(data[:position])
+            data = data[position + 1:]
+            self.prefixed = True
+
+    def output(self, session):
+        """Read the output of a session, showing it if it is the session shown"""
+        try:
+            data = os.read(session.controller.child_fd, self.READ_SIZE)
+        except OSError:
+            data = b''
+
+        if not data:
+            self.remove(session, '%s exited' % session.alias)
+            return
+
+        session.output(data, self.TAIL_SIZE)
+
+        if session is self.current:
+            self.write(data)
+        elif not session.unseen:
+            session.unseen = True
+            self.bar_dirty = True
+
+    def on_sigwinch(self, sig, data):
+        self.resized = True
+
+    def run(self):
+        """Hand the sessions over to the user until all of them are closed or the workspace is left"""
+        import termios
+        import tty
+
+        if not self.sessions:
+            return
+
+        attributes = termios.tcgetattr(self.stdin)
+        wake_read, wake_write = os.pipe()
+        os.set_blocking(wake_read, False)
+        os.set_blocking(wake_write, False)
+
+        # The signal handler only sets a flag, the byte written to the pipe wakes the selector up
+        previous_wakeup = signal.set_wakeup_fd(wake_write)
+        previous_handler = signal.signal(signal.SIGWINCH, self.on_sigwinch)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.stdin, selectors.EVENT_READ)
+        self.selector.register(wake_read, selectors.EVENT_READ)
+
+        for session in self.sessions:
+            self.selector.register(session.controller.child_fd, selectors.EVENT_READ, session)
+
+        try:
+            tty.setraw(self.stdin)
+            self.current = self.sessions[0]
+            self.resize()
+
+            while not self.leaving:
+                timeout = None
+
+                # The bar is redrawn at most every BAR_INTERVAL seconds for the output of the other sessions
+                if self.bar_dirty:
+                    timeout = max(0, self.bar_drawn + self.BAR_INTERVAL - time.monotonic())
+
+                for key, _ in self.selector.select(timeout):
+                    if key.data is not None:
+                        if key.data in self.sessions:
+                            self.output(key.data)
+                    elif key.fd == wake_read:
+                        while True:
+                            try:
+                                if not os.read(wake_read, 512):
+                                    break
+                            except BlockingIOError:
+                                break
+                    else:
+                        data = os.read(self.stdin, self.READ_SIZE)
+
+                        if not data:
+                            self.leaving = True
+                        else:
+                            self.keys(data)
+
+                    if self.leaving:
+                        break
+
+                if self.resized:
+                    self.resized = False
+                    self.resize()
+
+                if self.bar_dirty and time.monotonic() - self.bar_drawn >= self.BAR_INTERVAL:
+                    self.draw_bar()
+        finally:
+            # Give the whole terminal back and clear the status bar
+            self.write(b'\x1b[r\x1b[%d;1H\x1b[2K\r\n' % self.rows)
+            termios.tcsetattr(self.stdin, termios.TCSAFLUSH, attributes)
+            signal.signal(signal.SIGWINCH, previous_handler)
+            signal.set_wakeup_fd(previous_wakeup)
+            self.selector.close()
+            os.close(wake_read)
+            os.close(wake_write)
+
+            for session in self.sessions:
+                session.close()
+
+            self.sessions = []